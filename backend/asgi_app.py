@@ -0,0 +1,354 @@
+"""
+Async (ASGI) entry point for the read-heavy endpoints and the book streams.
+
+Serves the book listing and the AI endpoints with AsyncSession, so one worker
+can keep many slow queries in flight instead of blocking a thread per query,
+and the SSE streams GET /api/books/stream and /api/admin/books/stream, where
+an open stream is a coroutine rather than a gunicorn thread (book_events.py).
+Writes, auth and admin stay on the Flask app (library_app.py); both processes
+share the database, config and JWT secret. Handlers use the same service
+helpers as the Flask views and, like @read_replica, read from
+REPLICA_DATABASE_URL when set, unless the client's read_primary cookie says
+it just wrote.
+
+    uvicorn --factory asgi_app:create_asgi_app --port 5002 --workers 2
+
+Requires aiomysql (MySQL) or aiosqlite (SQLite).
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+import jwt as pyjwt
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header, parse_cookie
+
+import book_events
+import compression
+import json_provider
+from config import config_by_name, config_name_from_env, configure_database
+from db_routing import REPLICA_BIND, STICKY_COOKIE, cookie_wrote_recently
+from repositories import async_book_repo
+from repositories.async_user_repo import get_user_by_id
+from routes.book_routes import serialize_book, serialize_book_page
+from services import async_ai_service
+from services.ai_service import AIError
+from services.book_service import FACET_VALUES, BookError, _normalize_filters, book_page, page_bounds, parse_facets
+from sharding import shard_urls
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: Tuple[Tuple[bytes, bytes], ...] = ()):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers
+
+
+class Request:
+    def __init__(self, scope, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        # blank values kept, as Flask's request.args does
+        self.args = {k: v[0] for k, v in parse_qs(scope["query_string"].decode(), keep_blank_values=True).items()}
+        self.headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+        self.cookies = parse_cookie(self.headers.get("cookie"))
+        self.body = body
+
+    def get_int(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        """Like request.args.get(name, type=int): the default when missing or not a number."""
+        try:
+            return int(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+    def get_json(self) -> dict:
+        try:
+            data = json_provider.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Invalid JSON body.")
+        return data if isinstance(data, dict) else {}
+
+
+def _async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def _load_config(config_name: str, overrides: dict = None) -> dict:
+    cls = config_by_name[config_name]
+    config = {k: getattr(cls, k) for k in dir(cls) if k.isupper()}
+    config.update(overrides or {})
+    configure_database(config)
+    return config
+
+
+class AsyncLibraryApp:
+    def __init__(self, config: dict):
+        if shard_urls(config):
+            # async_book_repo has no scatter-gather; sharded books are WSGI-only
+            raise RuntimeError("BOOK_SHARD_URLS is not supported by the ASGI app.")
+        self.config = config
+        self.engine = create_async_engine(
+            _async_url(config["SQLALCHEMY_DATABASE_URI"]),
+            **config["SQLALCHEMY_ENGINE_OPTIONS"],
+        )
+        self.session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.replica_engine = None
+        self.replica_session = None
+        replica = config["SQLALCHEMY_BINDS"].get(REPLICA_BIND)
+        if replica is not None:
+            options = {k: v for k, v in replica.items() if k != "url"}
+            self.replica_engine = create_async_engine(_async_url(replica["url"]), **options)
+            self.replica_session = async_sessionmaker(self.replica_engine, expire_on_commit=False)
+        self.book_events = book_events.Broadcaster(
+            book_events.AsyncChangeLogBackend(
+                self.session,
+                float(config.get("BOOK_EVENTS_POLL_MS", 500.0)),
+                float(config.get("BOOK_CHANGES_SETTLE_SECONDS", 2.0)),
+            ),
+            max_clients=int(config.get("ASGI_STREAM_MAX_CLIENTS", 1000)),
+            buffer=int(config.get("BOOK_STREAM_BUFFER", 1000)),
+            subscription_class=book_events.AsyncSubscription,
+        )
+        self.routes: Dict[Tuple[str, str], Callable[[Request], Awaitable[Any]]] = {
+            ("GET", "/api/health"): self.health,
+            ("GET", "/api/books/"): self.list_books,
+            ("GET", "/api/books/stream"): self.stream_books,
+            ("GET", "/api/admin/books/stream"): self.admin_stream_books,
+            ("POST", "/api/ai/query"): self.ai_query,
+            ("GET", "/api/ai/recommendations"): self.ai_recommendations,
+            ("GET", "/api/ai/insights"): self.ai_insights,
+        }
+
+    # ------------------------------------------------------------------
+    # ASGI plumbing
+    # ------------------------------------------------------------------
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        request = Request(scope, body)
+        handler = self.routes.get((request.method, request.path))
+        extra_headers = ()
+        try:
+            if handler is None:
+                raise HTTPError(404, "Not found.")
+            status, payload = await handler(request)
+        except HTTPError as e:
+            status, payload, extra_headers = e.status, {"message": str(e)}, e.headers
+        except Exception:
+            # answer rather than drop the connection
+            logger.exception("Unhandled error on %s %s", request.method, request.path)
+            status, payload = 500, {"message": "Internal server error."}
+
+        if isinstance(payload, book_events.Subscription):
+            await self._send_events(payload, receive, send)
+            return
+
+        accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+        if json_provider.wants_msgpack(accept):
+            data, mimetype = json_provider.packb(payload), json_provider.MSGPACK_MIMETYPE
+        else:
+            data, mimetype = json_provider.dumps_bytes(payload), "application/json"
+
+        vary = b"Accept, Accept-Encoding" if json_provider.msgpack else b"Accept-Encoding"
+        headers = [(b"content-type", mimetype.encode()), (b"vary", vary), *extra_headers]
+        encoding = compression.choose_encoding(
+            parse_accept_header(request.headers.get("accept-encoding"))
+        )
+        if encoding and self.config.get("COMPRESS_ENABLED", True) \
+                and len(data) >= self.config.get("COMPRESS_MIN_SIZE", 1024):
+            data = compression.compress(data, encoding)
+            headers.append((b"content-encoding", encoding.encode()))
+        headers.append((b"content-length", str(len(data)).encode()))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _send_events(self, subscription, receive, send):
+        """Stream a subscription's events until it ends, falls behind or the client goes away."""
+        async def disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        gone = asyncio.ensure_future(disconnect())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + float(self.config.get("BOOK_STREAM_MAX_SECONDS", 300.0))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            await send({"type": "http.response.body", "body": book_events.RETRY_EVENT, "more_body": True})
+            while not subscription.dropped:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                change = asyncio.ensure_future(subscription.queue.get())
+                await asyncio.wait(
+                    {change, gone}, timeout=min(book_events.KEEPALIVE_SECONDS, remaining),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if gone.done():
+                    change.cancel()
+                    return
+                if change.done():
+                    event = book_events.sse_event(change.result())
+                else:
+                    change.cancel()
+                    event = book_events.KEEPALIVE_EVENT
+                await send({"type": "http.response.body", "body": event, "more_body": True})
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            gone.cancel()
+            self.book_events.unsubscribe(subscription)
+
+    async def dispose(self):
+        self.book_events.stop()
+        await self.engine.dispose()
+        if self.replica_engine is not None:
+            await self.replica_engine.dispose()
+
+    def _identity(self, request: Request) -> str:
+        """Same access tokens as flask_jwt_extended issues on /api/auth/login."""
+        auth = request.headers.get("authorization", "")
+        if not auth.startswith("Bearer "):
+            raise HTTPError(401, "Missing Authorization Header")
+        try:
+            claims = pyjwt.decode(
+                auth[len("Bearer "):],
+                self.config["JWT_SECRET_KEY"],
+                algorithms=["HS256"],
+            )
+        except pyjwt.PyJWTError:
+            raise HTTPError(401, "Invalid token")
+        if claims.get("type") != "access":
+            raise HTTPError(401, "Only access tokens are allowed")
+        return claims["sub"]
+
+    def _reads(self, request: Request):
+        """A session for a read handler: the replica, unless the client just wrote (see db_routing)."""
+        if self.replica_session is None or cookie_wrote_recently(
+            request.cookies.get(STICKY_COOKIE), self._identity(request), self.config.get("REPLICA_STICKY_SECONDS", 5.0)
+        ):
+            return self.session()
+        return self.replica_session()
+
+    async def _current_user(self, session, request: Request):
+        user = await get_user_by_id(session, int(self._identity(request)))
+        if not user:
+            raise HTTPError(404, "User not found")
+        return user
+
+    # ------------------------------------------------------------------
+    # Handlers (mirror routes/book_routes.py and routes/ai_routes.py)
+    # ------------------------------------------------------------------
+
+    async def health(self, request: Request):
+        return 200, {"status": "ok"}
+
+    async def list_books(self, request: Request):
+        genre, status, author = _normalize_filters(
+            request.args.get("genre"), request.args.get("status"), request.args.get("author")
+        )
+        paged = "facets" in request.args or "limit" in request.args
+        if paged:
+            try:
+                facets = parse_facets(request.args.get("facets"))
+            except BookError as e:
+                raise HTTPError(400, str(e))
+            limit, offset = page_bounds(request.get_int("limit"), request.get_int("offset", 0))
+        else:
+            limit, offset = None, 0
+
+        async with self._reads(request) as session:
+            user = await self._current_user(session, request)
+            owner = None if user.is_admin else user.id
+            if owner is None:
+                books = await async_book_repo.get_all_books(session, genre, status, author, limit, offset)
+            else:
+                books = await async_book_repo.get_books_for_user(session, owner, genre, status, author, limit, offset)
+            if not paged:
+                return 200, [serialize_book(b) for b in books]
+            per_shard = [await async_book_repo.get_book_facets(
+                session, facets, owner, genre, status, author, top=FACET_VALUES
+            )]
+
+        return 200, serialize_book_page(book_page(books, per_shard, facets, limit, offset))
+
+    def _subscribe(self, user):
+        """Like book_service.open_book_stream_for_user, with this process's cap."""
+        subscription = self.book_events.subscribe(user.id, see_all=user.is_admin)
+        if subscription is None:
+            raise HTTPError(503, "Too many open streams; try again later.", ((b"retry-after", b"5"),))
+        return subscription
+
+    async def stream_books(self, request: Request):
+        async with self.session() as session:
+            user = await self._current_user(session, request)
+        return 200, self._subscribe(user)
+
+    async def admin_stream_books(self, request: Request):
+        async with self.session() as session:
+            user = await self._current_user(session, request)
+        if not user.is_admin:
+            raise HTTPError(403, "Not authorized")
+        return 200, self._subscribe(user)
+
+    async def ai_query(self, request: Request):
+        question = request.get_json().get("question")
+        if not question:
+            raise HTTPError(400, "Question is required.")
+
+        async with self._reads(request) as session:
+            user = await self._current_user(session, request)
+            try:
+                return 200, await async_ai_service.handle_ai_query(session, question, user)
+            except AIError as e:
+                raise HTTPError(400, str(e))
+
+    async def ai_recommendations(self, request: Request):
+        async with self._reads(request) as session:
+            user = await self._current_user(session, request)
+            return 200, await async_ai_service.get_recommendations(session, user)
+
+    async def ai_insights(self, request: Request):
+        async with self._reads(request) as session:
+            user = await self._current_user(session, request)
+            return 200, await async_ai_service.get_insights(session, user)
+
+
+def create_asgi_app(config_name: str = None, config_overrides: dict = None) -> AsyncLibraryApp:
+    return AsyncLibraryApp(_load_config(config_name or config_name_from_env(), config_overrides))
@@ -0,0 +1,145 @@
+"""
+Side-by-side throughput of the Flask (gunicorn) and ASGI (uvicorn) servers.
+
+Seeds a database, starts both servers on local ports with the same worker
+count, then drives each read endpoint with N concurrent keep-alive clients
+and prints requests/second and latency percentiles.
+
+    python -m benchmarks.async_vs_sync --users 50 --books 5000 --concurrency 32
+
+SQLite answers in microseconds, so the gap there is mostly server overhead;
+point --database-url at MySQL to see the effect of overlapping slow queries.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = [
+    ("GET", "/api/books/", None),
+    ("GET", "/api/ai/insights", None),
+    ("GET", "/api/ai/recommendations", None),
+    ("POST", "/api/ai/query", {"question": "Who owns the most books?"}),
+]
+
+
+def seed(database_url: str, users: int, books: int) -> str:
+    """Create the schema and rows; return an access token for one regular user."""
+    sys.path.insert(0, BACKEND_DIR)
+    from flask_jwt_extended import create_access_token
+    from library_app import create_app
+    from extensions import db
+    from models import User
+    from seed import seed_library
+
+    app = create_app("prod", {"SQLALCHEMY_DATABASE_URI": database_url})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_library(users=users, books=books)
+        reader = User.query.filter_by(role="user").order_by(User.id).first()
+        return create_access_token(identity=str(reader.id))
+
+
+def start_server(kind: str, port: int, workers: int, env: dict) -> subprocess.Popen:
+    if kind == "sync":
+        cmd = ["gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}",
+               f"--workers={workers}"]
+    else:
+        cmd = ["uvicorn", "--factory", "asgi_app:create_asgi_app", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{kind} server did not start on port {port}")
+
+
+def drive(port: int, token: str, method: str, path: str, body, concurrency: int, seconds: float):
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    payload = json.dumps(body) if body is not None else None
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        latencies, errors = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            conn.request(method, path, body=payload, headers=headers)
+            res = conn.getresponse()
+            res.read()
+            latencies.append(time.perf_counter() - started)
+            errors += res.status >= 400
+        return latencies, errors
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+
+    latencies = sorted(l for r in results for l in r[0])
+    q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": sum(r[1] for r in results),
+        "rps": round(len(latencies) / seconds, 1),
+        "p50_ms": round(q[49] * 1000, 2),
+        "p99_ms": round(q[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--database-url")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    token = seed(database_url, args.users, args.books)
+    env = dict(os.environ, DATABASE_URL=database_url)
+
+    results = {}
+    for kind, port in (("sync", 5101), ("async", 5102)):
+        proc = start_server(kind, port, args.workers, env)
+        try:
+            for method, path, body in ENDPOINTS:
+                key = f"{method} {path}"
+                results.setdefault(key, {})[kind] = drive(
+                    port, token, method, path, body, args.concurrency, args.seconds
+                )
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{'endpoint':32} {'sync rps':>10} {'async rps':>10} {'sync p99':>10} {'async p99':>10}")
+    for key, r in results.items():
+        print(f"{key:32} {r['sync']['rps']:>10} {r['async']['rps']:>10} "
+              f"{r['sync']['p99_ms']:>10} {r['async']['p99_ms']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
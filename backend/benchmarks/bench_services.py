@@ -0,0 +1,181 @@
+"""
+Service-layer benchmarks at several data sizes.
+
+For each size (number of books; users = books / 20) a fresh database is
+seeded with seed.seed_library, then every service function is timed in an
+app context and the results are written to JSON together with the git
+commit, so two runs can be diffed across commits.
+
+    python -m benchmarks.bench_services --sizes 10000,100000 --output bench.json
+    python -m benchmarks.bench_services --compare old.json new.json
+
+Defaults to a throwaway SQLite file per size; pass --database-url to run
+against MySQL (the database is dropped and recreated for every size).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _time(fn, repeat: int) -> dict:
+    from extensions import db
+
+    fn()  # warm-up: imports, statement compilation cache, page cache
+    samples = []
+    for _ in range(repeat):
+        db.session.expire_all()  # no identity-map hits carried between runs
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "repeat": repeat,
+    }
+
+
+def _cases(admin, reader):
+    from services.book_service import list_books_for_user, suggest_for_user
+    from services.ai_service import get_insights, get_recommendations, handle_ai_query
+    from services.admin_service import (
+        _library_summary,
+        get_admin_summary,
+        list_books_admin,
+        list_users_admin,
+    )
+
+    def summary_uncached():
+        _library_summary.cache_clear()
+        return get_admin_summary(admin)
+
+    questions = {
+        "owner_with_most_books": "Who owns the most books?",
+        "most_popular_book": "Which is the most popular book?",
+        "five_most_expensive_books": "Show the five most expensive books",
+    }
+    cases = {
+        "list_books_for_user[user]": lambda: list_books_for_user(reader),
+        "list_books_for_user[user,genre]": lambda: list_books_for_user(reader, genre="fantasy"),
+        "list_books_for_user[admin]": lambda: list_books_for_user(admin),
+        "get_insights": lambda: get_insights(reader),
+        "get_recommendations": lambda: get_recommendations(reader),
+        "list_users_admin[all]": lambda: list_users_admin(admin),
+        "list_users_admin[page=50]": lambda: list_users_admin(admin, limit=50),
+        "list_users_admin[search]": lambda: list_users_admin(admin, limit=50, search="ana"),
+        "list_books_admin": lambda: list_books_admin(admin),
+        "list_books_admin[status]": lambda: list_books_admin(admin, status="reading"),
+        "get_admin_summary[uncached]": summary_uncached,
+        # the warm-up lookup builds the field's index; these time the lookups
+        "suggest_for_user[title,1 char]": lambda: suggest_for_user(reader, "title", "t"),
+        "suggest_for_user[title,3 chars]": lambda: suggest_for_user(reader, "title", "the"),
+        "suggest_for_user[author]": lambda: suggest_for_user(reader, "author", "an"),
+    }
+    for intent, question in questions.items():
+        cases[f"handle_ai_query[{intent},user]"] = lambda q=question: handle_ai_query(q, reader)
+        cases[f"handle_ai_query[{intent},admin]"] = lambda q=question: handle_ai_query(q, admin)
+    return cases
+
+
+def run_size(books: int, database_url: str, repeat: int, only=None) -> dict:
+    from library_app import create_app
+    from extensions import db
+    from models import User
+    from seed import seed_library
+
+    app = create_app("prod", {"SQLALCHEMY_DATABASE_URI": database_url, "METRICS_ENABLED": False})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        seed_library(users=max(books // 20, 10), books=books)
+        seed_seconds = time.perf_counter() - started
+
+        admin = User.query.filter_by(role="admin").first()
+        # the second user is a typical heavy reader; user 1 is the admin
+        reader = User.query.filter_by(role="user").order_by(User.id).first()
+
+        results = {}
+        for name, fn in _cases(admin, reader).items():
+            if only and not any(part in name for part in only):
+                continue
+            results[name] = _time(fn, repeat)
+            print(f"  {name:50} {results[name]['median_ms']:>10.2f} ms", flush=True)
+
+        db.session.remove()
+        db.engine.dispose()
+    return {"seed_seconds": round(seed_seconds, 2), "functions": results}
+
+
+def compare(old_path: str, new_path: str) -> None:
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old['commit']} -> {new['commit']} (median ms)")
+    for size, data in new["sizes"].items():
+        before = old["sizes"].get(size, {}).get("functions", {})
+        print(f"\n{size} books")
+        for name, stats in data["functions"].items():
+            if name not in before:
+                continue
+            a, b = before[name]["median_ms"], stats["median_ms"]
+            change = (b - a) / a * 100 if a else 0.0
+            print(f"  {name:50} {a:>10.2f} {b:>10.2f} {change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time service functions at several data sizes.")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma-separated book counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file per size")
+    parser.add_argument("--only", help="comma-separated substrings of case names to run")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="print the change between two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    only = args.only.split(",") if args.only else None
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",")):
+        url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench_{size}.db"
+        report["database"] = url.split(":", 1)[0]
+        print(f"{size} books", flush=True)
+        report["sizes"][str(size)] = run_size(size, url, args.repeat, only)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Open-loop load test of the Flask app with a mixed endpoint workload.
+
+Seeds a database, logs in a pool of seeded users, then issues requests at a
+fixed target rate drawn from a weighted endpoint mix and reports latency
+percentiles, throughput and error rate per endpoint.
+
+    python -m benchmarks.loadtest --rps 50 --seconds 30
+    python -m benchmarks.loadtest --target gunicorn --workers 4 --rps 200
+    python -m benchmarks.loadtest --mix list=5,insights=1,ai_query=2,create=1,login=1
+
+Targets:
+  wsgi      create_app() in this process, called through the WSGI test client
+            (default; no sockets, measures the app and the database only)
+  gunicorn  a real gunicorn server started on a local port against the seeded DB
+  http://…  an already running server; it must have been seeded with
+            `flask seed --reset --users N` so the reader<n>@seed.local logins exist
+
+Request i is scheduled at i / rps seconds after the start whether or not the
+earlier ones have finished, and its latency is measured from that scheduled
+time. A server that falls behind therefore shows up as queueing in p95/p99
+instead of quietly receiving less load.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_MIX = "list=5,insights=2,ai_query=2,recommendations=1,create=1,login=1"
+
+QUESTIONS = [
+    "Who owns the most books?",
+    "Which is the most popular book?",
+    "Show the five most expensive books",
+]
+
+
+# -----------------------------------------------------------------------------
+# Targets
+# -----------------------------------------------------------------------------
+
+class WSGITarget:
+    """Calls the app in-process; one test client per load thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        res = client.open(path, method=method, json=body, headers=headers)
+        return res.status_code, res.get_data()
+
+
+class HTTPTarget:
+    """Keep-alive HTTP connection per load thread, reopened after errors."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        payload = json.dumps(body) if body is not None else None
+
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            res = conn.getresponse()
+            return res.status, res.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+# -----------------------------------------------------------------------------
+# Workload
+# -----------------------------------------------------------------------------
+
+def _login(target, email):
+    status, data = target.request(
+        "POST", "/api/auth/login", {"email": email, "password": _seed_password()}
+    )
+    if status != 200:
+        raise RuntimeError(f"login failed for {email}: {status} {data[:200]!r}")
+    return json.loads(data)["access_token"]
+
+
+def _seed_password():
+    from seed import SEED_PASSWORD
+    return SEED_PASSWORD
+
+
+def _new_book(rng):
+    from seed import GENRES, STATUSES, WORDS
+    return {
+        "title": f"Load {rng.choice(WORDS)} {rng.randint(1, 10 ** 6)}",
+        "author": "Load Tester",
+        "genre": rng.choice(list(GENRES)),
+        "price": round(rng.uniform(5, 60), 2),
+        "pages": rng.randint(80, 900),
+        "reading_status": rng.choice(list(STATUSES)),
+    }
+
+
+OPERATIONS = {
+    "login": lambda t, s, rng: t.request(
+        "POST", "/api/auth/login", {"email": s["email"], "password": _seed_password()}),
+    "list": lambda t, s, rng: t.request("GET", "/api/books/", token=s["token"]),
+    "create": lambda t, s, rng: t.request("POST", "/api/books/", _new_book(rng), token=s["token"]),
+    "ai_query": lambda t, s, rng: t.request(
+        "POST", "/api/ai/query", {"question": rng.choice(QUESTIONS)}, token=s["token"]),
+    "insights": lambda t, s, rng: t.request("GET", "/api/ai/insights", token=s["token"]),
+    "recommendations": lambda t, s, rng: t.request(
+        "GET", "/api/ai/recommendations", token=s["token"]),
+}
+
+
+def parse_mix(spec: str) -> dict:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise SystemExit(f"unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_load(target, sessions, mix, rps, seconds, concurrency, seed=0):
+    """Fire round(rps * seconds) requests on schedule; return {operation: [(latency_s, ok)]}."""
+    rng = random.Random(seed)
+    total = int(rps * seconds)
+    plan = rng.choices(list(mix), weights=list(mix.values()), k=total)
+    picks = [rng.choice(sessions) for _ in range(total)]
+    samples = defaultdict(list)
+    start = time.perf_counter() + 0.05
+
+    def fire(i, op, session):
+        scheduled = start + i / rps
+        try:
+            status, _ = OPERATIONS[op](target, session, random.Random(seed + i))
+            ok = status < 400
+        except Exception:
+            ok = False
+        samples[op].append((time.perf_counter() - scheduled, ok))
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        for i, (op, session) in enumerate(zip(plan, picks)):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(fire, i, op, session)
+    return samples
+
+
+def summarize(samples, seconds) -> dict:
+    def stats(rows):
+        latencies = sorted(l for l, _ in rows)
+        errors = sum(1 for _, ok in rows if not ok)
+        if len(latencies) > 1:
+            q = statistics.quantiles(latencies, n=100, method="inclusive")
+        else:
+            q = latencies * 99
+        return {
+            "requests": len(rows),
+            "errors": errors,
+            "error_rate": round(errors / len(rows), 4),
+            "throughput_rps": round(len(rows) / seconds, 1),
+            "p50_ms": round(q[49] * 1000, 2),
+            "p95_ms": round(q[94] * 1000, 2),
+            "p99_ms": round(q[98] * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+
+    report = {op: stats(rows) for op, rows in sorted(samples.items()) if rows}
+    everything = [row for rows in samples.values() for row in rows]
+    if everything:
+        report["total"] = stats(everything)
+    return report
+
+
+# -----------------------------------------------------------------------------
+# Setup
+# -----------------------------------------------------------------------------
+
+def seed_database(database_url, users, books):
+    """Fresh schema and rows; return the app and the seeded (id, email, role) rows."""
+    from library_app import create_app
+    from extensions import db
+    from models import User
+    from seed import seed_library
+
+    app = create_app("prod", {"SQLALCHEMY_DATABASE_URI": database_url, "METRICS_ENABLED": False})
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_library(users=users, books=books)
+        rows = [tuple(row) for row in db.session.query(User.id, User.email, User.role).order_by(User.id)]
+        db.session.remove()
+        db.engine.dispose()
+    return app, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test with a mixed endpoint workload.")
+    parser.add_argument("--target", default="wsgi", help="wsgi, gunicorn or a base URL")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=200, help="users to seed")
+    parser.add_argument("--books", type=int, default=10000, help="books to seed")
+    parser.add_argument("--sessions", type=int, default=20, help="logged-in users to spread load over")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="operation=weight pairs")
+    parser.add_argument("--rps", type=float, default=50.0, help="target request rate")
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    proc = None
+
+    if args.target.startswith("http"):
+        target = HTTPTarget(args.target)
+        emails = [f"reader{n}@seed.local" for n in range(1, args.users + 1)]
+    else:
+        database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/loadtest.db"
+        print(f"seeding {args.users} users / {args.books} books", flush=True)
+        app, rows = seed_database(database_url, args.users, args.books)
+        emails = [email for _, email, _ in rows]
+        if args.target == "wsgi":
+            target = WSGITarget(app)
+        elif args.target == "gunicorn":
+            from benchmarks.async_vs_sync import start_server
+            port = 5103
+            proc = start_server("sync", port, args.workers,
+                                dict(os.environ, DATABASE_URL=database_url))
+            target = HTTPTarget(f"http://127.0.0.1:{port}")
+        else:
+            raise SystemExit(f"unknown target {args.target!r}")
+
+    try:
+        sessions = [
+            {"email": email, "token": _login(target, email)}
+            for email in rng.sample(emails, min(args.sessions, len(emails)))
+        ]
+        print(f"{args.target}: {args.rps:g} rps for {args.seconds:g}s, mix {args.mix}", flush=True)
+        started = time.perf_counter()
+        samples = run_load(target, sessions, mix, args.rps, args.seconds, args.concurrency, args.seed)
+        elapsed = time.perf_counter() - started
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    report = summarize(samples, elapsed)
+    print(f"\n{'operation':16} {'reqs':>7} {'err %':>7} {'rps':>8} "
+          f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for op, s in report.items():
+        print(f"{op:16} {s['requests']:>7} {s['error_rate'] * 100:>7.2f} {s['throughput_rps']:>8} "
+              f"{s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9} {s['max_ms']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"target": args.target, "rps": args.rps, "seconds": args.seconds,
+                       "mix": mix, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
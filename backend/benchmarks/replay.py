@@ -0,0 +1,268 @@
+"""
+Replay a recorded traffic log against a seeded instance and compare latencies.
+
+Recordings come from traffic_recorder.py (TRAFFIC_RECORD_PATH). Each recorded
+request is rebuilt from its route template and body shape, sent as a seeded
+user standing in for the recorded pseudonym (admins for pseudonyms seen on
+/api/admin routes), and issued at its original offset divided by --speed.
+
+    python -m benchmarks.replay traffic.jsonl --users 1000 --books 100000
+    python -m benchmarks.replay traffic.jsonl --speed 10 --target gunicorn
+    python -m benchmarks.replay traffic.jsonl --speed 0     # as fast as possible
+
+Recorded latencies are server-side (first to last request hook); replayed
+ones are measured from each request's scheduled time, so queueing counts.
+Ids in paths are drawn from what the stand-in user can actually see, but
+writes change the seeded data as they replay, so start from a fresh seed
+for comparable runs.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import string
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from benchmarks.loadtest import (
+    HTTPTarget,
+    WSGITarget,
+    _login,
+    _seed_password,
+    seed_database,
+    summarize,
+)
+
+INTENT_QUESTIONS = {
+    "owner_with_most_books": "Who owns the most books?",
+    "most_popular_book": "Which is the most popular book?",
+    "five_most_expensive_books": "Show the five most expensive books",
+}
+REPLAY_PASSWORD = "Replay123!@#"
+PATH_PARAM = re.compile(r"<(?:\w+:)?(\w+)>")
+
+
+def load_recording(path: str) -> list:
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["t"])
+
+
+def _letters(rng, n: int) -> str:
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(max(n, 1)))
+
+
+def synthesize(shape, rng, key=None, serial=0):
+    """Inverse of traffic_recorder.value_shape: a plausible value of that shape."""
+    if isinstance(shape, dict):
+        return {k: synthesize(v, rng, k, serial) for k, v in shape.items()}
+    if not isinstance(shape, str):
+        return shape
+    kind, _, rest = shape.partition(":")
+    if kind == "null":
+        return None
+    if kind == "bool":
+        return False
+    if kind == "int":
+        return rng.randint(1, 500)
+    if kind == "float":
+        return round(rng.uniform(1, 100), 2)
+    if kind == "intent":
+        return INTENT_QUESTIONS.get(rest, rest)
+    if kind == "str":
+        if key == "email":
+            return f"replay{serial}-{rng.randrange(10 ** 9)}@seed.local"
+        if key == "password":
+            return REPLAY_PASSWORD
+        return _letters(rng, int(rest))
+    if kind == "list":
+        item, _, count = rest.partition(":")
+        return [synthesize(item, rng, key, serial) for _ in range(int(count or 0))]
+    return shape  # recorded verbatim (SAFE_BODY_KEYS)
+
+
+class Replayer:
+    def __init__(self, target, records, users, seed=0):
+        """`users` are the seeded (id, email, role) rows to stand in for pseudonyms."""
+        self.target = target
+        self.records = records
+        self.user_ids = [uid for uid, _, _ in users]
+        self.rng = random.Random(seed)
+        self.seed = seed
+
+        admins = sorted({r["u"] for r in records if r.get("u") and r["r"].startswith("/api/admin")})
+        readers = sorted({r["u"] for r in records if r.get("u")} - set(admins))
+        user_pool = [email for _, email, role in users if role != "admin"]
+        admin_pool = [email for _, email, role in users if role == "admin"] or user_pool
+        self.stand_ins = {p: admin_pool[i % len(admin_pool)] for i, p in enumerate(admins)}
+        self.rng.shuffle(user_pool)
+        self.stand_ins.update({p: user_pool[i % len(user_pool)] for i, p in enumerate(readers)})
+        self.logins = user_pool or admin_pool
+        self.tokens = {}
+        self.book_ids = {}
+
+    def prepare(self):
+        """Log every stand-in in and collect the book ids each can see, before timing starts."""
+        needs_books = {r["u"] for r in self.records if "<int:book_id>" in r["r"] and r.get("u")}
+        for pseudonym, email in self.stand_ins.items():
+            if email not in self.tokens:
+                self.tokens[email] = _login(self.target, email)
+            if pseudonym in needs_books and email not in self.book_ids:
+                status, data = self.target.request("GET", "/api/books/", token=self.tokens[email])
+                self.book_ids[email] = [b["id"] for b in json.loads(data)] if status == 200 else []
+
+    def build(self, record, serial):
+        rng = random.Random(self.seed * 1_000_003 + serial)
+        email = self.stand_ins.get(record.get("u"))
+
+        def fill(match):
+            name = match.group(1)
+            if name == "book_id" and self.book_ids.get(email):
+                return str(rng.choice(self.book_ids[email]))
+            if name == "user_id" and self.user_ids:
+                return str(rng.choice(self.user_ids))
+            return "0"
+
+        path = PATH_PARAM.sub(fill, record["r"])
+        query = {
+            k: synthesize(v, rng, k, serial) for k, v in (record.get("q") or {}).items()
+            if k != "cursor"  # opaque and tied to the recorded data
+        }
+        if query:
+            path += "?" + urlencode(query)
+
+        body = record.get("b")
+        if record["r"] == "/api/auth/login":
+            body = {"email": rng.choice(self.logins), "password": _seed_password()}
+        elif body is not None:
+            body = synthesize(body, rng, serial=serial)
+        return record["m"], path, body, self.tokens.get(email)
+
+    def run(self, speed: float, concurrency: int) -> dict:
+        """Issue every record; return {"METHOD rule": [(latency_s, ok)]}."""
+        t0 = self.records[0]["t"]
+        samples = defaultdict(list)
+        lock = threading.Lock()
+        start = time.perf_counter() + 0.05
+
+        def fire(serial, record, scheduled):
+            method, path, body, token = self.build(record, serial)
+            scheduled = scheduled if speed else time.perf_counter()
+            try:
+                status, _ = self.target.request(method, path, body, token=token)
+                ok = status < 400
+            except Exception:
+                ok = False
+            with lock:
+                samples[f"{record['m']} {record['r']}"].append((time.perf_counter() - scheduled, ok))
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            for serial, record in enumerate(self.records):
+                scheduled = start + (record["t"] - t0) / speed if speed else start
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(fire, serial, record, scheduled)
+        return samples
+
+
+def recorded_samples(records) -> dict:
+    samples = defaultdict(list)
+    for r in records:
+        samples[f"{r['m']} {r['r']}"].append((r["ms"] / 1000, r["s"] < 400))
+    return samples
+
+
+def compare(recorded: dict, replayed: dict) -> dict:
+    rows = {}
+    for key, rec in recorded.items():
+        new = replayed.get(key)
+        if not new:
+            continue
+        rows[key] = {
+            "requests": rec["requests"],
+            "recorded": {k: rec[k] for k in ("p50_ms", "p95_ms", "p99_ms", "error_rate")},
+            "replayed": {k: new[k] for k in ("p50_ms", "p95_ms", "p99_ms", "error_rate")},
+            "p50_change_pct": round((new["p50_ms"] - rec["p50_ms"]) / rec["p50_ms"] * 100, 1)
+            if rec["p50_ms"] else None,
+        }
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded traffic and compare latencies.")
+    parser.add_argument("recording", help="file written by TRAFFIC_RECORD_PATH")
+    parser.add_argument("--target", default="wsgi", help="wsgi, gunicorn or a base URL")
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=200, help="users to seed")
+    parser.add_argument("--books", type=int, default=10000, help="books to seed")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time compression; 1 = original pacing, 0 = no pacing")
+    parser.add_argument("--concurrency", type=int, default=64, help="max requests in flight")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the comparison as JSON to this file")
+    args = parser.parse_args()
+
+    records = load_recording(args.recording)
+    if not records:
+        raise SystemExit("recording is empty")
+    proc = None
+
+    if args.target.startswith("http"):
+        target = HTTPTarget(args.target)
+        # same ids, emails and roles that `flask seed --reset --users N` creates
+        users = [(n, f"reader{n}@seed.local", "admin" if (n - 1) % 100 == 0 else "user")
+                 for n in range(1, args.users + 1)]
+    else:
+        database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/replay.db"
+        print(f"seeding {args.users} users / {args.books} books", flush=True)
+        app, users = seed_database(database_url, args.users, args.books)
+        if args.target == "wsgi":
+            target = WSGITarget(app)
+        elif args.target == "gunicorn":
+            from benchmarks.async_vs_sync import start_server
+            port = 5104
+            proc = start_server("sync", port, args.workers,
+                                dict(os.environ, DATABASE_URL=database_url))
+            target = HTTPTarget(f"http://127.0.0.1:{port}")
+        else:
+            raise SystemExit(f"unknown target {args.target!r}")
+
+    try:
+        replayer = Replayer(target, records, users, args.seed)
+        replayer.prepare()
+        span = records[-1]["t"] - records[0]["t"]
+        print(f"replaying {len(records)} requests recorded over {span:.0f}s "
+              f"at {'max' if not args.speed else f'{args.speed:g}x'} speed", flush=True)
+        started = time.perf_counter()
+        samples = replayer.run(args.speed, args.concurrency)
+        elapsed = time.perf_counter() - started
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    rows = compare(summarize(recorded_samples(records), max(span, 1e-3)),
+                   summarize(samples, elapsed))
+    print(f"\n{'endpoint':40} {'reqs':>6} {'rec p50':>9} {'new p50':>9} "
+          f"{'rec p99':>9} {'new p99':>9} {'p50 Δ%':>8}")
+    for key, row in rows.items():
+        rec, new = row["recorded"], row["replayed"]
+        change = row["p50_change_pct"]
+        print(f"{key:40} {row['requests']:>6} {rec['p50_ms']:>9} {new['p50_ms']:>9} "
+              f"{rec['p99_ms']:>9} {new['p99_ms']:>9} {change if change is not None else '-':>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"recording": args.recording, "speed": args.speed, "target": args.target,
+                       "endpoints": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
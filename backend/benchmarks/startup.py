@@ -0,0 +1,108 @@
+"""
+Import and boot time of the Flask app, measured in fresh interpreters.
+
+Times three things a cold process pays for: importing library_app, building
+the app with create_app() (what each gunicorn worker does without preload),
+and pytest collecting the test suite. Prints the medians, the slowest
+imports behind create_app(), and exits non-zero when a budget is exceeded,
+so CI can keep boot time from creeping up.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --budget create_app=900,collect=2500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# milliseconds, with headroom for slow CI machines; most of it is Flask and
+# SQLAlchemy themselves, so a jump usually means a new eager import
+DEFAULT_BUDGETS = {"import": 1500, "create_app": 1600, "collect": 4000}
+
+CASES = {
+    "import": [sys.executable, "-c", "import library_app"],
+    "create_app": [sys.executable, "-c", "from library_app import create_app; create_app()"],
+    "collect": [sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:cacheprovider"],
+}
+
+
+def _env():
+    database = f"sqlite:///{tempfile.mkdtemp()}/startup.db"
+    return dict(os.environ, APP_ENV="prod", DATABASE_URL=database)
+
+
+def measure(cmd, repeat: int, env) -> float:
+    subprocess.run(cmd, cwd=BACKEND_DIR, env=env, check=True, capture_output=True)  # warm .pyc/page cache
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(cmd, cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def slowest_imports(env, top: int):
+    """Direct imports of library_app and create_app(), by cumulative time (-X importtime)."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "from library_app import create_app; create_app()"],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    )
+    totals = []
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            totals.append((name.strip(), int(cumulative) / 1000))
+    return sorted(totals, key=lambda kv: kv[1], reverse=True)[:top]
+
+
+def parse_budgets(spec: str) -> dict:
+    budgets = dict(DEFAULT_BUDGETS)
+    for part in filter(None, (spec or "").split(",")):
+        name, _, ms = part.partition("=")
+        if name not in CASES:
+            raise SystemExit(f"unknown case {name!r}; choose from {', '.join(CASES)}")
+        budgets[name] = float(ms)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import and boot time against a budget.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", help="name=ms pairs overriding the defaults, e.g. create_app=900")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    env = _env()
+    results, over = {}, []
+    for name, cmd in CASES.items():
+        results[name] = round(measure(cmd, args.repeat, env), 1)
+        ok = results[name] <= budgets[name]
+        over += [] if ok else [name]
+        print(f"{name:12} {results[name]:>9.1f} ms  (budget {budgets[name]:g} ms){'' if ok else '  OVER'}")
+
+    print("\nslowest imports behind create_app():")
+    imports = slowest_imports(env, args.top)
+    for package, ms in imports:
+        print(f"  {package:30} {ms:>8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"median_ms": results, "budgets_ms": budgets,
+                       "imports_ms": dict(imports)}, f, indent=2)
+    if over:
+        sys.exit(f"over budget: {', '.join(over)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# book_events.py
+"""
+Live book events for the SSE streams GET /api/books/stream and GET
+/api/admin/books/stream.
+
+change_log.py hands each commit's book changes to the broadcaster, which
+fans every change out to the subscribers allowed to see it, by the rule of
+list_books_for_user: admins see every book, others their own. A stream sends
+
+    event: create | update | delete
+    data: {"id": 7, "title": ..., "user_id": 3}      (deletes: id and user_id)
+
+How changes reach other processes is up to BOOK_EVENTS_BACKEND:
+
+  * "local" (default): only this process's subscribers. Fine for one worker;
+    with several, a stream only sees writes served by its own worker, so
+    gunicorn.conf.py switches to "changelog" when it starts more than one.
+  * "changelog": every worker tails book_changes, one query per shard each
+    BOOK_EVENTS_POLL_MS while it has subscribers, so each write reaches every
+    stream after at most one interval. Needs nothing besides the database.
+  * "package.module:factory": factory(app) returning an object with
+    start(broadcaster) and publish(changes), e.g. over Redis pub/sub; it calls
+    broadcaster.deliver(changes) for changes from any process.
+
+The ASGI app (asgi_app.py) serves both streams too, and is where they
+belong: there an open stream is a coroutine waiting on an asyncio queue,
+fed by one AsyncChangeLogBackend task per process, so a process holds up to
+ASGI_STREAM_MAX_CLIENTS (1000) of them. Route the two stream paths to it.
+
+The Flask routes stay as a fallback for deployments without the ASGI app.
+There a stream holds a request thread while it is open, one of the 4 a
+gunicorn worker runs by default. Each worker therefore accepts at most
+BOOK_STREAM_MAX_CLIENTS streams (2; 503 beyond that), well below
+GUNICORN_THREADS so other requests still get a thread.
+
+Either server closes a stream after BOOK_STREAM_MAX_SECONDS, and
+EventSource reconnects by itself. A subscriber that falls BOOK_STREAM_BUFFER
+changes behind is disconnected the same way. Events carry no ids; a
+reconnecting client catches up with GET /api/books/changes.
+"""
+import asyncio
+import importlib
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+
+from flask import Response, current_app, has_app_context
+
+import change_log
+from json_provider import dumps_bytes
+from repositories import async_book_repo
+from repositories.book_repo import get_book_changes, get_books_by_ids, get_latest_change_seq
+from sharding import current_shard, scatter
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15.0
+RETRY_MS = 3000
+RETRY_EVENT = f"retry: {RETRY_MS}\n\n".encode()
+KEEPALIVE_EVENT = b": keepalive\n\n"
+
+
+def sse_event(change: dict) -> bytes:
+    return b"event: " + change["op"].encode() + b"\ndata: " + dumps_bytes(change["book"]) + b"\n\n"
+
+
+class Subscription:
+    def __init__(self, user_id: int, see_all: bool, buffer: int):
+        self.user_id = user_id
+        self.see_all = see_all
+        self.queue = self.new_queue(buffer)
+        self.dropped = False
+
+    @staticmethod
+    def new_queue(buffer: int):
+        return queue.Queue(maxsize=buffer)
+
+    def offer(self, change: dict) -> bool:
+        """Queue a change this subscriber may see; False once it has fallen behind."""
+        if not self.see_all and change["book"]["user_id"] != self.user_id:
+            return True
+        try:
+            self.queue.put_nowait(change)
+            return True
+        except (queue.Full, asyncio.QueueFull):
+            self.dropped = True
+            return False
+
+
+class AsyncSubscription(Subscription):
+    """A subscription read by a coroutine; only the event loop's thread may offer to it."""
+
+    @staticmethod
+    def new_queue(buffer: int):
+        return asyncio.Queue(maxsize=buffer)
+
+
+class Broadcaster:
+    def __init__(self, backend, max_clients: int = 2, buffer: int = 1000, subscription_class=Subscription):
+        self.backend = backend
+        self.max_clients = max_clients
+        self.buffer = buffer
+        self.subscription_class = subscription_class
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def listening(self) -> bool:
+        return bool(self._subscribers)
+
+    def _ensure_started(self) -> None:
+        # the backend may run threads; start them in the worker, not a preloading master
+        if not self._started:
+            with self._lock:
+                if not self._started:
+                    self.backend.start(self)
+                    self._started = True
+
+    def subscribe(self, user_id: int, see_all: bool) -> Optional[Subscription]:
+        """A new subscription, or None when this worker has max_clients streams open."""
+        self._ensure_started()
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                return None
+            subscription = self.subscription_class(user_id, see_all, self.buffer)
+            self._subscribers.add(subscription)
+            return subscription
+
+    def stop(self) -> None:
+        """Stop a backend that has a stop(); the next subscribe() starts it again."""
+        with self._lock:
+            if self._started and hasattr(self.backend, "stop"):
+                self.backend.stop()
+            self._started = False
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, changes: list) -> None:
+        """Changes committed in this process."""
+        self._ensure_started()
+        self.backend.publish(changes)
+
+    def deliver(self, changes: list) -> None:
+        """Changes from the backend, to this process's subscribers."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for change in changes:
+                if not subscription.offer(change):
+                    self.unsubscribe(subscription)
+                    break
+
+
+# -----------------------------------------------------------------------------
+# Backends
+# -----------------------------------------------------------------------------
+
+class LocalBackend:
+    """Changes go straight to this process's subscribers."""
+
+    def __init__(self, app=None):
+        self.broadcaster = None
+
+    def start(self, broadcaster) -> None:
+        self.broadcaster = broadcaster
+
+    def publish(self, changes: list) -> None:
+        self.broadcaster.deliver(changes)
+
+
+class ChangeLogBackend:
+    """Each worker polls the change log, so it sees writes from every process."""
+
+    def __init__(self, app, interval_ms: float = 500.0):
+        self.app = app
+        self.interval = interval_ms / 1000
+        self.broadcaster = None
+        self._cursor = None  # newest seq seen, per shard
+
+    def start(self, broadcaster) -> None:
+        self.broadcaster = broadcaster
+        threading.Thread(target=self._run, name="book-events", daemon=True).start()
+
+    def publish(self, changes: list) -> None:
+        pass  # the change log is the transport
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            if not self.broadcaster.listening:
+                self._cursor = None  # nobody to replay the gap to
+                continue
+            try:
+                with self.app.app_context():
+                    changes = self.poll()
+                if changes:
+                    self.broadcaster.deliver(changes)
+            except Exception:
+                self.app.logger.exception("book events: change log poll failed")
+
+    def poll(self) -> list:
+        """Changes logged since the last poll; the first poll only finds where the log ends."""
+        if self._cursor is None:
+            self._cursor = scatter(get_latest_change_seq)
+            return []
+        cursor = self._cursor
+        pages = scatter(lambda: _changes_after(cursor[current_shard() or 0]))
+        self._cursor = [seq for seq, _ in pages]
+        return [change for _, changes in pages for change in changes]
+
+
+class AsyncChangeLogBackend:
+    """
+    ChangeLogBackend for the ASGI app: one task on the event loop polls the
+    change log through `session_factory` (an async_sessionmaker) and
+    delivers to the AsyncSubscriptions.
+    """
+
+    def __init__(self, session_factory, interval_ms: float = 500.0, settle_seconds: float = 2.0):
+        self.session_factory = session_factory
+        self.interval = interval_ms / 1000
+        self.settle_seconds = settle_seconds
+        self.broadcaster = None
+        self._cursor = None
+        self._task = None
+
+    def start(self, broadcaster) -> None:
+        self.broadcaster = broadcaster
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._cursor = None
+
+    def publish(self, changes: list) -> None:
+        pass  # the change log is the transport
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.broadcaster.listening:
+                self._cursor = None  # nobody to replay the gap to
+                continue
+            try:
+                async with self.session_factory() as session:
+                    changes = await self.poll(session)
+                if changes:
+                    self.broadcaster.deliver(changes)
+            except Exception:
+                logger.exception("book events: change log poll failed")
+
+    async def poll(self, session) -> list:
+        """Changes logged since the last poll; the first poll only finds where the log ends."""
+        if self._cursor is None:
+            self._cursor = await async_book_repo.get_latest_change_seq(session, self.settle_seconds)
+            return []
+        entries = await async_book_repo.get_book_changes(session, self._cursor, self.settle_seconds)
+        books = await async_book_repo.get_books_by_ids(
+            session, [e.book_id for e in entries if e.op != change_log.DELETE]
+        )
+        if entries:
+            self._cursor = entries[-1].seq
+        return _changes_from(entries, books)
+
+
+def _changes_after(since: int, limit: int = 1000):
+    entries = get_book_changes(since, limit=limit)
+    books = get_books_by_ids([e.book_id for e in entries if e.op != change_log.DELETE])
+    return (entries[-1].seq if entries else since), _changes_from(entries, books)
+
+
+def _changes_from(entries: list, books: list) -> list:
+    books = {b.id: b for b in books}
+    changes = []
+    for entry in entries:
+        book = books.get(entry.book_id)
+        if entry.op == change_log.DELETE:
+            changes.append({"op": change_log.DELETE, "book": {"id": entry.book_id, "user_id": entry.user_id}})
+        elif book is not None:  # else deleted since; its delete entry follows
+            changes.append(change_log.book_change(entry.op, book))
+    return changes
+
+
+def _load_backend(app):
+    name = app.config.get("BOOK_EVENTS_BACKEND") or "local"
+    if name == "local":
+        return LocalBackend(app)
+    if name == "changelog":
+        return ChangeLogBackend(app, float(app.config.get("BOOK_EVENTS_POLL_MS", 500.0)))
+    module, _, attr = name.partition(":")
+    if not attr:
+        raise ValueError(f"BOOK_EVENTS_BACKEND must be local, changelog or module:factory, got {name!r}")
+    return getattr(importlib.import_module(module), attr)(app)
+
+
+# -----------------------------------------------------------------------------
+# Streams
+# -----------------------------------------------------------------------------
+
+def subscribe(user_id: int, see_all: bool) -> Optional[Subscription]:
+    return current_app.extensions["book_events"].subscribe(user_id, see_all)
+
+
+class _EventStream:
+    """
+    The SSE body. close() (called by the server when the client goes away,
+    even before the first event) releases the subscription.
+    """
+
+    def __init__(self, broadcaster: Broadcaster, subscription: Subscription, max_seconds: float):
+        self.broadcaster = broadcaster
+        self.subscription = subscription
+        self.max_seconds = max_seconds
+        self._events = self._generate()
+
+    def __iter__(self):
+        return self._events
+
+    def _generate(self):
+        subscription = self.subscription
+        deadline = time.monotonic() + self.max_seconds
+        yield RETRY_EVENT
+        while not subscription.dropped:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                change = subscription.queue.get(timeout=min(KEEPALIVE_SECONDS, remaining))
+            except queue.Empty:
+                yield KEEPALIVE_EVENT
+                continue
+            yield sse_event(change)
+
+    def close(self) -> None:
+        self._events.close()
+        self.broadcaster.unsubscribe(self.subscription)
+
+
+def event_stream(subscription: Subscription) -> Response:
+    """
+    The SSE response for a subscription. It needs no request context while
+    streaming, so the request's session is released before the first event.
+    """
+    broadcaster = current_app.extensions["book_events"]
+    max_seconds = float(current_app.config.get("BOOK_STREAM_MAX_SECONDS", 300.0))
+    body = _EventStream(broadcaster, subscription, max_seconds)
+    response = Response(body, mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # nginx: pass events through unbuffered
+    return response
+
+
+def _publish_committed(changes: list) -> None:
+    broadcaster = current_app.extensions.get("book_events") if has_app_context() else None
+    if broadcaster is not None:
+        broadcaster.publish(changes)
+
+
+def init_app(app) -> None:
+    app.extensions["book_events"] = Broadcaster(
+        _load_backend(app),
+        max_clients=int(app.config.get("BOOK_STREAM_MAX_CLIENTS", 2)),
+        buffer=int(app.config.get("BOOK_STREAM_BUFFER", 1000)),
+    )
+    change_log.on_commit(_publish_committed)
@@ -0,0 +1,198 @@
+# book_writer.py
+"""
+Background writer for `POST /api/books/?async=1`.
+
+The request validates the book (create_book_for_user's rules), queues it
+here and answers 202 with a ticket. One thread per process drains the queue:
+it waits up to BOOK_WRITER_MAX_DELAY_MS for more rows and writes up to
+BOOK_WRITER_BATCH_SIZE of them with book_repo.create_books, so a burst of
+creates costs one transaction per batch (and shard) instead of a commit per
+request, with multi-row INSERTs where create_books can batch them.
+
+A batch that fails is retried row by row, so a bad row (say, its owner was
+deleted in the meantime) fails only its own ticket. GET
+/api/books/tickets/<ticket> reports queued, created (with the book) or
+failed, from whichever worker serves it:
+
+  * A ticket is a token signed with SECRET_KEY carrying a random id and the
+    owner's user id, so any worker can check it and find the owner's shard.
+  * Each book's outcome is a book_tickets row, written in the transaction
+    that inserts the book (failures in their own). No row means still
+    queued, or, PENDING_SECONDS after the submit, lost with a batch that
+    could not be written at all.
+  * Tickets expire, and their rows are deleted, BOOK_WRITER_TICKETS_KEEP_SECONDS
+    after the submit.
+
+When the queue is full, submit() returns None and the route writes
+synchronously instead.
+
+The thread starts on the first submit, so gunicorn's preloading master never
+owns it, and the queue is drained (for up to DRAIN_SECONDS) at exit.
+"""
+import atexit
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from extensions import db
+from instrumentation import metrics
+from repositories.book_repo import create_books, get_book_ticket, prune_book_tickets, save_failed_ticket
+from sharding import group_by_shard, on_user_shard, scatter
+
+DRAIN_SECONDS = 5.0
+PENDING_SECONDS = 300.0  # a ticket still without a row after this was lost
+PRUNE_SECONDS = 60.0  # how often the writer deletes expired tickets
+
+
+class BookWriter:
+    def __init__(self, app, batch_size: int = 500, max_delay_ms: float = 50.0,
+                 queue_size: int = 10000, keep_seconds: float = 86400.0):
+        self.app = app
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.keep_seconds = keep_seconds
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._signer = URLSafeTimedSerializer(app.config["SECRET_KEY"], salt="book-ticket")
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pruned_at = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # Tickets
+    # ------------------------------------------------------------------
+
+    def submit(self, user_id: int, fields: dict) -> Optional[str]:
+        """Queue one validated book; its ticket, or None when the queue is full."""
+        ticket_id = uuid.uuid4().hex
+        row = dict(fields, user_id=user_id)
+        try:
+            self._queue.put_nowait((ticket_id, row))
+        except queue.Full:
+            metrics.inc("book_writer_rejected_total")
+            return None
+        self._ensure_thread()
+        return self._signer.dumps({"id": ticket_id, "user_id": user_id})
+
+    def status(self, ticket: str) -> Optional[dict]:
+        """The ticket's owner and outcome; None when it isn't a ticket or has expired."""
+        try:
+            claims, submitted_at = self._signer.loads(ticket, max_age=self.keep_seconds, return_timestamp=True)
+        except BadSignature:
+            return None
+        with on_user_shard(claims["user_id"]):
+            row = get_book_ticket(claims["id"])
+        status = {
+            "ticket": ticket,
+            "status": "queued",
+            "user_id": claims["user_id"],
+            "book_id": None,
+            "error": None,
+            "submitted_at": round(submitted_at.timestamp(), 3),
+            "finished_at": None,
+        }
+        if row is not None:
+            status.update(
+                status="failed" if row.book_id is None else "created",
+                book_id=row.book_id,
+                error=row.error,
+                finished_at=round(row.finished_at.replace(tzinfo=timezone.utc).timestamp(), 3),
+            )
+        elif time.time() - submitted_at.timestamp() > PENDING_SECONDS:
+            status.update(status="failed", error="The book was not written; submit it again.")
+        return status
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _ensure_thread(self) -> None:
+        # after a fork the parent's thread is not alive in the child
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is None:
+                    atexit.register(self.wait, DRAIN_SECONDS)
+                self._thread = threading.Thread(target=self._run, name="book-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with self.app.app_context():
+                    self._write(batch)
+            except Exception:
+                self.app.logger.exception("book writer: batch of %d lost", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch) -> None:
+        metrics.inc("book_writer_batches_total")
+        metrics.inc("book_writer_rows_total", len(batch))
+        # one create_books call per shard, so a failure leaves no partial group
+        for group in group_by_shard(batch, key=lambda item: item[1]["user_id"]).values():
+            try:
+                create_books([row for _, row in group], [ticket for ticket, _ in group])
+            except Exception:
+                db.session.rollback()
+                self.app.logger.warning("book writer: batch failed, retrying %d rows singly", len(group))
+                for ticket, row in group:
+                    self._write_one(ticket, row)
+        if time.monotonic() - self._pruned_at > PRUNE_SECONDS:
+            self._pruned_at = time.monotonic()
+            scatter(prune_book_tickets, datetime.utcnow() - timedelta(seconds=self.keep_seconds))
+
+    def _write_one(self, ticket: str, row: dict) -> None:
+        try:
+            create_books([row], [ticket])
+        except Exception as e:
+            db.session.rollback()
+            metrics.inc("book_writer_failed_total")
+            self.app.logger.warning("book writer: row for user %s failed: %s", row["user_id"], e)
+            save_failed_ticket(ticket, row["user_id"], "Could not create the book.")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written; False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+def submit(user_id: int, fields: dict) -> Optional[str]:
+    return current_app.extensions["book_writer"].submit(user_id, fields)
+
+
+def status(ticket: str) -> Optional[dict]:
+    return current_app.extensions["book_writer"].status(ticket)
+
+
+def init_app(app) -> None:
+    app.extensions["book_writer"] = BookWriter(
+        app,
+        batch_size=int(app.config.get("BOOK_WRITER_BATCH_SIZE", 500)),
+        max_delay_ms=float(app.config.get("BOOK_WRITER_MAX_DELAY_MS", 50.0)),
+        queue_size=int(app.config.get("BOOK_WRITER_QUEUE_SIZE", 10000)),
+        keep_seconds=float(app.config.get("BOOK_WRITER_TICKETS_KEEP_SECONDS", 86400.0)),
+    )
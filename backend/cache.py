@@ -0,0 +1,355 @@
+# cache.py
+"""
+Caching keyed on write versions, scoped like the cache keys.
+
+Every committed write to a watched table (one named by cached_response or
+cached_until_write) bumps versions in the cache_versions table on the
+primary, shared by every worker:
+
+- "user:<id>" for each user whose row or books it changed ("user:*" when a
+  bulk statement leaves the owners unknown), which is what a user's own
+  cached listing is checked against;
+- one of CacheVersion.SLOTS "all:<n>" rows picked by the owner's id; their
+  sum is the version of views over everyone's data (admin views, and the
+  library-wide parts of the AI views).
+
+A write therefore contends only with writes by the same user and, on the
+slot row, with about one in SLOTS of the others. Within a request the
+bumps are collected and run once, in one short transaction after the
+view returns and before the response is sent, so a client that wrote
+never reads its own stale data, whichever worker serves the read; writes
+outside a request (the book writer, CLI commands) bump right after their
+commit. The versions are read once per request, in one primary-key
+lookup of the caller's rows and the slots.
+
+What is left: each write request still pays that extra transaction, a
+cache check still costs one primary read, and a user's "user:<id>" row
+outlives the user. The TTL only bounds memory and a bump lost to a
+database error.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+from flask import after_this_request, current_app, g, has_app_context, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db_routing import REPLICA_BIND, wrote_recently
+from extensions import db
+from instrumentation import metrics
+from models import CacheVersion, User
+
+ALL_USERS = "user:*"
+_SLOTS = tuple(f"all:{n}" for n in range(CacheVersion.SLOTS))
+
+_watched = set()
+
+
+def _scopes(owners: Iterable[Optional[int]]) -> Set[str]:
+    """The version rows a write by `owners` bumps; None stands for unknown owners."""
+    names = set()
+    for owner in owners:
+        names.add(ALL_USERS if owner is None else f"user:{owner}")
+        names.add(_SLOTS[(owner or 0) % len(_SLOTS)])
+    return names
+
+
+def _read(user_id: Optional[int]) -> Dict[str, int]:
+    names = [ALL_USERS, *_SLOTS] + ([f"user:{user_id}"] if user_id is not None else [])
+    return dict(db.session.execute(
+        select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.in_(names)),
+        bind_arguments={"bind": db.engine},  # the primary, even under @read_replica
+    ).all())
+
+
+def versions(user_id: Optional[int] = None, shared: bool = True) -> Tuple[int, ...]:
+    """
+    The version of everyone's data (shared), or of user `user_id`'s own.
+    Read on the primary, once per request.
+    """
+    state = _request_state()
+    if state is None:
+        rows = _read(user_id)
+    else:
+        if state["pending"]:
+            # this request wrote: cached values must see its bumps first
+            _bump_logged(state["pending"])
+            state["pending"].clear()
+            state["versions"].clear()
+        rows = state["versions"].get(user_id)
+        if rows is None:
+            rows = state["versions"][user_id] = _read(user_id)
+    if shared:
+        return (sum(rows.get(slot, 0) for slot in _SLOTS),)
+    return rows.get(f"user:{user_id}", 0), rows.get(ALL_USERS, 0)
+
+
+def _is_admin(user_id: int, version: int) -> bool:
+    # remembered per app until the user's version moves, which a role change does
+    roles = current_app.extensions.setdefault("cache_roles", {})
+    known = roles.get(user_id)
+    if known is None or known[0] != version:
+        role = db.session.execute(
+            select(User.role).where(User.id == user_id), bind_arguments={"bind": db.engine}
+        ).scalar()
+        known = roles[user_id] = (version, role == "admin")
+    return known[1]
+
+
+def bump_versions(owners: Iterable[Optional[int]]) -> None:
+    """Bump the versions covering the data of `owners` (user ids; None for unknown owners)."""
+    names = sorted(_scopes(owners))
+    table = CacheVersion.__table__
+    for attempt in range(2):
+        try:
+            with db.engine.begin() as connection:
+                bumped = connection.execute(
+                    update(table).where(table.c.name.in_(names)).values(version=table.c.version + 1)
+                ).rowcount
+                if bumped < len(names):  # a user's first write
+                    known = set(connection.scalars(select(table.c.name).where(table.c.name.in_(names))))
+                    connection.execute(table.insert(), [{"name": n, "version": 1} for n in names if n not in known])
+            return
+        except IntegrityError:
+            if attempt:  # another worker inserted the same row first; its row is bumped on retry
+                raise
+
+
+def _bump_logged(owners) -> None:
+    try:
+        bump_versions(owners)
+    except Exception:
+        # cached values of these owners now live until their TTL
+        current_app.logger.exception("cache: could not bump versions of %s", sorted(_scopes(owners)))
+
+
+def _request_state() -> Optional[dict]:
+    if not has_request_context():
+        return None
+    state = g.get("cache_versions")
+    if state is None:
+        state = g.cache_versions = {"pending": set(), "versions": {}}
+
+        @after_this_request
+        def finish(response):
+            done = g.pop("cache_versions", None)
+            if done and done["pending"]:
+                _bump_logged(done["pending"])
+            return response
+
+    return state
+
+
+# -----------------------------------------------------------------------------
+# Write tracking (session events)
+# -----------------------------------------------------------------------------
+
+def _touched(session: Session) -> set:
+    return session.info.setdefault("touched_owners", set())
+
+
+def _owner(obj) -> Optional[int]:
+    return obj.id if isinstance(obj, User) else getattr(obj, "user_id", None)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    touched = _touched(session)
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if getattr(obj, "__tablename__", None) in _watched:
+            touched.add(_owner(obj))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    # bulk Query.update()/delete() and insert() never pass through the flush,
+    # and may touch any owner's rows
+    if orm_execute_state.is_select:
+        return
+    mapper = orm_execute_state.bind_arguments.get("mapper")
+    if mapper is not None and mapper.local_table.name in _watched:
+        _touched(orm_execute_state.session).add(None)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_on_commit(session):
+    touched = session.info.pop("touched_owners", None)
+    if not touched or not has_app_context():
+        return
+    state = _request_state()
+    if state is None:
+        _bump_logged(touched)
+    else:
+        state["pending"].update(touched)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("touched_owners", None)
+
+
+# -----------------------------------------------------------------------------
+# Memoization
+# -----------------------------------------------------------------------------
+
+def cached_until_write(*tables: str, ttl: float = 60.0) -> Callable:
+    """
+    Memoize a function over everyone's data until one of `tables` is
+    written, by any worker, or `ttl` seconds pass. Arguments must be hashable; they become part of the
+    cache key.
+    """
+    _watched.update(tables)
+
+    def decorator(fn):
+        entries: Dict[tuple, tuple] = {}
+        lock = threading.Lock()
+
+        @wraps(fn)
+        def wrapper(*args):
+            current = versions()
+            now = time.monotonic()
+            hit = entries.get(args)
+            if hit and hit[0] == current and hit[1] > now:
+                return hit[2]
+
+            value = fn(*args)
+            with lock:
+                entries[args] = (current, now + ttl, value)
+            return value
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+
+    return decorator
+
+
+# -----------------------------------------------------------------------------
+# Response cache for GET views
+# -----------------------------------------------------------------------------
+
+class ResponseCache:
+    """LRU of serialized response bodies, bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, versions):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] != versions or entry[1] <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, versions, ttl: float, response: tuple) -> None:
+        size = len(response[0])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (versions, time.monotonic() + ttl, response)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry[2][0])
+
+
+def _response_cache(app) -> ResponseCache:
+    cache = app.extensions.get("response_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("response_cache", ResponseCache(
+            app.config.get("RESPONSE_CACHE_MAX_ENTRIES", 1024),
+            app.config.get("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024),
+        ))
+    return cache
+
+
+def _normalized_query() -> tuple:
+    # parameter order and empty filters do not change the result
+    return tuple(sorted((k, v) for k, v in request.args.items(multi=True) if v.strip()))
+
+
+def cached_response(*tables: str, ttl: float = None, shared: bool = False) -> Callable:
+    """
+    Cache a GET view's 200 responses as serialized bytes, per endpoint, user
+    and normalized query string, until one of `tables` is written or the TTL
+    (RESPONSE_CACHE_TTL) passes. A hit returns the stored body without
+    running the view, so it costs no SQL and no serialization.
+
+    A regular user's response is checked against writes to their own data;
+    with shared=True (the view also reads other users' data) or for an
+    admin, against writes to anyone's.
+
+    Place below @jwt_required() and above @read_replica / @query_budget.
+    """
+    _watched.update(tables)
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            if not app.config.get("RESPONSE_CACHE_ENABLED", True):
+                return view(*args, **kwargs)
+
+            identity = get_jwt_identity()
+            if REPLICA_BIND in app.config.get("SQLALCHEMY_BINDS", {}) and wrote_recently(str(identity)):
+                # the cached copy may have been read from a replica that hasn't seen
+                # this client's write; the view reads the primary instead
+                return view(*args, **kwargs)
+
+            key = (
+                request.endpoint,
+                identity,
+                _normalized_query(),
+                request.accept_mimetypes.best_match(["application/json", "application/msgpack"]),
+            )
+            cache = _response_cache(app)
+            current = versions(int(identity), shared=False)
+            if shared or _is_admin(int(identity), current[0]):
+                current = versions(int(identity))
+            hit = cache.get(key, current)
+            if hit is not None:
+                metrics.inc("response_cache_hits_total")
+                body, mimetype, vary = hit
+                response = app.response_class(body, mimetype=mimetype)
+                if vary:
+                    response.headers["Vary"] = vary
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            metrics.inc("response_cache_misses_total")
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                cache.put(key, current, ttl or app.config.get("RESPONSE_CACHE_TTL", 30.0),
+                          (response.get_data(), response.mimetype, response.headers.get("Vary")))
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
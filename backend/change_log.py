@@ -0,0 +1,119 @@
+# change_log.py
+"""
+Change log of the books table, for incremental sync.
+
+Every create, update and delete of a book appends a BookChange row (op,
+book_id, user_id) in the same transaction, so the log commits or rolls back
+with the write. Its autoincrement seq orders the changes: a client that has
+seen everything up to seq N asks GET /api/books/changes?since=N and gets the
+current state of each book changed since, plus the ids of deleted ones.
+
+Writes through the session's unit of work are logged by an after_flush
+listener, one multi-row INSERT per flush. Bulk Query.delete() calls skip the
+flush and log themselves first with record_deletes(); bulk inserts are
+logged after the fact by record_bulk_inserts(). After a commit, the changes
+it made go to the on_commit() hooks, which is how book_events.py hears of
+them.
+
+When sharded, the log lives on each shard next to its books, so seq is per
+shard; see book_service.list_book_changes_for_user for the admin cursor.
+On MySQL and PostgreSQL a seq is taken at INSERT, so a transaction can
+commit a lower seq just after a higher one was read. Readers therefore only
+see entries older than BOOK_CHANGES_SETTLE_SECONDS (book_repo.settled).
+"""
+from datetime import datetime
+
+from sqlalchemy import event, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from models import Book, BookChange
+
+CREATE, UPDATE, DELETE = "create", "update", "delete"
+
+# the book as committed subscribers see it; deletes carry only id and user_id
+CHANGE_FIELDS = ("id", "title", "author", "genre", "price", "pages", "reading_status", "user_id")
+
+_commit_hooks = []
+
+
+def on_commit(hook) -> None:
+    """Call hook(changes) after each commit that changed books (see book_events.py)."""
+    if hook not in _commit_hooks:
+        _commit_hooks.append(hook)
+
+
+def _entry(book: Book, op: str, now: datetime) -> dict:
+    return {"book_id": book.id, "user_id": book.user_id, "op": op, "changed_at": now}
+
+
+def book_change(op: str, book: Book) -> dict:
+    fields = ("id", "user_id") if op == DELETE else CHANGE_FIELDS
+    return {"op": op, "book": {field: getattr(book, field) for field in fields}}
+
+
+def _pending(session) -> list:
+    return session.info.setdefault("book_changes", [])
+
+
+@event.listens_for(Session, "after_flush")
+def _log_flushed_books(session, flush_context):
+    now = datetime.utcnow()
+    changed = [(CREATE, obj) for obj in session.new if isinstance(obj, Book)]
+    changed += [
+        (UPDATE, obj) for obj in session.dirty
+        if isinstance(obj, Book) and session.is_modified(obj, include_collections=False)
+    ]
+    changed += [(DELETE, obj) for obj in session.deleted if isinstance(obj, Book)]
+    if changed:
+        # the books' connection: same transaction, and same shard when sharded
+        connection = session.connection(bind_arguments={"mapper": BookChange.__mapper__})
+        connection.execute(insert(BookChange.__table__), [_entry(book, op, now) for op, book in changed])
+        # snapshot now: commit expires the books
+        _pending(session).extend(book_change(op, book) for op, book in changed)
+
+
+def record_deletes(session, *criteria) -> set:
+    """
+    Log deletes of the books matching `criteria`; call right before the bulk
+    DELETE. Returns the user ids owning them.
+    """
+    now = datetime.utcnow()
+    rows = session.execute(select(Book.id, Book.user_id).where(*criteria)).all()
+    if rows:
+        session.execute(
+            insert(BookChange.__table__),
+            [{"book_id": i, "user_id": u, "op": DELETE, "changed_at": now} for i, u in rows],
+        )
+        _pending(session).extend({"op": DELETE, "book": {"id": i, "user_id": u}} for i, u in rows)
+    return {u for _, u in rows}
+
+
+@event.listens_for(Session, "after_commit")
+def _run_commit_hooks(session):
+    changes = session.info.pop("book_changes", None)
+    if changes:
+        for hook in _commit_hooks:
+            hook(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("book_changes", None)
+
+
+def record_bulk_inserts(session) -> None:
+    """
+    Log a create for every book above the highest id in the log: rows
+    inserted in bulk (seed.py) skip the flush listener. Book ids only grow
+    (AUTOINCREMENT on SQLite too), so these are exactly the books inserted
+    since the last logged write.
+    """
+    highest = select(func.coalesce(func.max(BookChange.book_id), 0)).scalar_subquery()
+    books = (
+        select(Book.id, Book.user_id, literal(CREATE), Book.created_at)
+        .where(Book.id > highest)
+        .order_by(Book.id)
+    )
+    session.execute(
+        insert(BookChange.__table__).from_select(["book_id", "user_id", "op", "changed_at"], books)
+    )
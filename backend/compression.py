@@ -0,0 +1,168 @@
+# compression.py
+"""
+Response compression for clients that call the backend directly.
+
+Picks the best encoding the client accepts from brotli, zstd (each only when
+its package is installed) and gzip, honouring Accept-Encoding q-values.
+Buffered responses are compressed when they are at least COMPRESS_MIN_SIZE
+bytes; smaller bodies cost more to compress than they save on the wire.
+Streamed responses have no length up front, so they are always compressed,
+chunk by chunk, with a flush after each chunk so the client is not kept
+waiting for a full compression window.
+
+Bytes before and after compression are counted per encoding in the
+Prometheus metrics; their quotient is the compression ratio.
+"""
+import zlib
+
+from flask import request
+from werkzeug.datastructures import Accept
+
+from instrumentation import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "application/msgpack",
+    "text/plain",
+    "text/html",
+    "text/csv",
+}
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # brotli's 11 is for static assets; 4 is close to gzip speed
+ZSTD_LEVEL = 3
+
+
+class _GzipStream:
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._z.compress(chunk) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._z.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._c.process(chunk) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class _ZstdStream:
+    def __init__(self):
+        self._c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._c.compress(chunk) + self._c.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+# server preference when the client rates several encodings equally
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS["br"] = _BrotliStream
+if zstandard is not None:
+    ENCODERS["zstd"] = _ZstdStream
+ENCODERS["gzip"] = _GzipStream
+
+
+def choose_encoding(accept_encodings: Accept):
+    """Best supported encoding for an Accept-Encoding header, or None for identity."""
+    if not accept_encodings:
+        return None
+    return accept_encodings.best_match(list(ENCODERS))
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    stream = ENCODERS[encoding]()
+    body = stream.compress(data) if data else b""
+    body += stream.finish()
+    _count(encoding, len(data), len(body))
+    return body
+
+
+def _count(encoding: str, before: int, after: int) -> None:
+    metrics.inc(f'http_response_bytes_uncompressed_total{{encoding="{encoding}"}}', before)
+    metrics.inc(f'http_response_bytes_compressed_total{{encoding="{encoding}"}}', after)
+
+
+def _compress_stream(chunks, encoding):
+    stream = ENCODERS[encoding]()
+    before = after = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if not chunk:
+                continue
+            out = stream.compress(chunk)
+            before += len(chunk)
+            after += len(out)
+            yield out
+        tail = stream.finish()
+        after += len(tail)
+        yield tail
+    finally:
+        _count(encoding, before, after)
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _compress_response(response, min_size: int):
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or request.method == "HEAD"
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app) -> None:
+    if not app.config.get("COMPRESS_ENABLED", True):
+        return
+    min_size = int(app.config.get("COMPRESS_MIN_SIZE", 1024))
+
+    # registered after the timing hooks, so it runs before them and its
+    # cost is included in the request latency
+    @app.after_request
+    def _compress(response):
+        return _compress_response(response, min_size)
@@ -1,4 +1,25 @@
 import os
+import tempfile
+
+from sharding import BookShards, shard_urls
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
 
 class BaseConfig:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
@@ -8,18 +29,159 @@ class BaseConfig:
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool (applied to every bind by engine_options below)
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+    # below MySQL's wait_timeout so idle connections are replaced, not found dead
+    DB_POOL_RECYCLE = _env_int("DB_POOL_RECYCLE", 1800)
+    DB_POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 10)
+    DB_POOL_PRE_PING = _env_bool("DB_POOL_PRE_PING", True)
+
+    # Optional read replica; GET listings and AI reads go there when set
+    REPLICA_DATABASE_URL = os.environ.get("REPLICA_DATABASE_URL")
+    # how long a user's reads stay on the primary after they write
+    REPLICA_STICKY_SECONDS = _env_float("REPLICA_STICKY_SECONDS", 5.0)
+
+    # Optional book shards (comma-separated URLs); books are placed by user_id,
+    # see sharding.py. Unset keeps books on the primary.
+    BOOK_SHARD_URLS = os.environ.get("BOOK_SHARD_URLS")
+    # threads for scatter-gather reads; defaults to one per shard
+    BOOK_SHARD_WORKERS = _env_int("BOOK_SHARD_WORKERS", 0)
+
     JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "jwt-secret-key")
 
+    # Prometheus metrics at /api/metrics, served only to scrapers sending
+    # "Authorization: Bearer <METRICS_TOKEN>"; unset leaves the route unmounted
+    METRICS_ENABLED = _env_bool("METRICS_ENABLED", True)
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # What to do when a view exceeds its @query_budget: "raise", "log" or "off".
+    # Unset means raise under TESTING, log otherwise.
+    QUERY_BUDGET_MODE = os.environ.get("QUERY_BUDGET_MODE")
+
+    # Cached GET responses (cache.cached_response), per process
+    RESPONSE_CACHE_ENABLED = _env_bool("RESPONSE_CACHE_ENABLED", True)
+    RESPONSE_CACHE_TTL = _env_float("RESPONSE_CACHE_TTL", 30.0)
+    RESPONSE_CACHE_MAX_ENTRIES = _env_int("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+    RESPONSE_CACHE_MAX_BYTES = _env_int("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+    # Statements at least this slow are logged with their plan (slow_query.py)
+    SLOW_QUERY_LOG_ENABLED = _env_bool("SLOW_QUERY_LOG_ENABLED", True)
+    SLOW_QUERY_THRESHOLD_MS = _env_float("SLOW_QUERY_THRESHOLD_MS", 200.0)
+    SLOW_QUERY_EXPLAIN = _env_bool("SLOW_QUERY_EXPLAIN", True)
+    SLOW_QUERY_MAX_SHAPES = _env_int("SLOW_QUERY_MAX_SHAPES", 500)
+
+    # gzip/brotli/zstd for responses of at least this many bytes
+    COMPRESS_ENABLED = _env_bool("COMPRESS_ENABLED", True)
+    COMPRESS_MIN_SIZE = _env_int("COMPRESS_MIN_SIZE", 1024)
+
+    # Sampled, anonymized request log for benchmarks/replay.py; unset disables it
+    TRAFFIC_RECORD_PATH = os.environ.get("TRAFFIC_RECORD_PATH")
+    TRAFFIC_SAMPLE_RATE = _env_float("TRAFFIC_SAMPLE_RATE", 0.1)
+
+    # Admin-triggered request profiles (X-Profile header), see profiling.py
+    PROFILING_ENABLED = _env_bool("PROFILING_ENABLED", True)
+    PROFILE_DIR = os.environ.get("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "libraryai-profiles")
+    PROFILE_KEEP = _env_int("PROFILE_KEEP", 50)
+    # profile 1 in PROFILE_SAMPLE_EVERY requests to this endpoint, e.g. books.list_books
+    PROFILE_SAMPLE_ENDPOINT = os.environ.get("PROFILE_SAMPLE_ENDPOINT")
+    PROFILE_SAMPLE_EVERY = _env_int("PROFILE_SAMPLE_EVERY", 100)
+    PROFILE_SAMPLE_MODES = os.environ.get("PROFILE_SAMPLE_MODES", "cpu")
+
+    # Queued creates (POST /api/books/?async=1), written in batches, see book_writer.py
+    BOOK_WRITER_BATCH_SIZE = _env_int("BOOK_WRITER_BATCH_SIZE", 500)
+    BOOK_WRITER_MAX_DELAY_MS = _env_float("BOOK_WRITER_MAX_DELAY_MS", 50.0)
+    BOOK_WRITER_QUEUE_SIZE = _env_int("BOOK_WRITER_QUEUE_SIZE", 10000)
+    BOOK_WRITER_TICKETS_KEEP_SECONDS = _env_float("BOOK_WRITER_TICKETS_KEEP_SECONDS", 86400.0)
+
+    # GET /api/books/changes and the changelog events backend only read log
+    # entries this old, so a write still committing can't be skipped (not on SQLite)
+    BOOK_CHANGES_SETTLE_SECONDS = _env_float("BOOK_CHANGES_SETTLE_SECONDS", 2.0)
+
+    # Live book events over SSE, see book_events.py. The backend is "local",
+    # "changelog" (the default under gunicorn with several workers) or
+    # "module:factory". On the Flask fallback streams are counted per worker
+    # and each holds one of its GUNICORN_THREADS; keep the cap below that.
+    # The ASGI app serves them as coroutines, polling the change log.
+    BOOK_EVENTS_BACKEND = os.environ.get("BOOK_EVENTS_BACKEND", "local")
+    BOOK_EVENTS_POLL_MS = _env_float("BOOK_EVENTS_POLL_MS", 500.0)
+    BOOK_STREAM_MAX_CLIENTS = _env_int("BOOK_STREAM_MAX_CLIENTS", 2)
+    ASGI_STREAM_MAX_CLIENTS = _env_int("ASGI_STREAM_MAX_CLIENTS", 1000)
+    BOOK_STREAM_MAX_SECONDS = _env_float("BOOK_STREAM_MAX_SECONDS", 300.0)
+    BOOK_STREAM_BUFFER = _env_int("BOOK_STREAM_BUFFER", 1000)
+
+    # Type-ahead indexes for GET /api/books/suggest, one per user and field,
+    # see suggest.py. Each worker rebuilds them this often to pick up other
+    # workers' writes, and keeps those of this many users.
+    SUGGEST_REFRESH_SECONDS = _env_float("SUGGEST_REFRESH_SECONDS", 60.0)
+    SUGGEST_MAX_OWNERS = _env_int("SUGGEST_MAX_OWNERS", 1000)
+
 
 class DevConfig(BaseConfig):
     DEBUG = True
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 2)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 3)
 
 
 class ProdConfig(BaseConfig):
     DEBUG = False
+    # gunicorn runs 4 threads per worker; leave headroom for bursts
+    DB_POOL_SIZE = _env_int("DB_POOL_SIZE", 8)
+    DB_MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 8)
 
 
 config_by_name = {
     "dev": DevConfig,
     "prod": ProdConfig,
 }
+
+
+def config_name_from_env() -> str:
+    """
+    APP_ENV selects the config class. Unset means production, so a server
+    started without it never runs with DevConfig's debug settings.
+    """
+    name = os.environ.get("APP_ENV") or "prod"
+    if name not in config_by_name:
+        raise ValueError(f"APP_ENV must be one of {', '.join(config_by_name)}, got {name!r}")
+    return name
+
+
+def engine_options(uri: str, config) -> dict:
+    """
+    create_engine() options for one bind.
+    SQLite uses its own single-connection pools, so only pre-ping applies there.
+    """
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"]}
+    if uri.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_recycle=config["DB_POOL_RECYCLE"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+    return options
+
+
+def configure_database(config) -> None:
+    """
+    Fill SQLALCHEMY_ENGINE_OPTIONS and SQLALCHEMY_BINDS from the final config.
+    Runs after overrides are applied, so pool options always match the URI in use.
+    """
+    config.setdefault(
+        "SQLALCHEMY_ENGINE_OPTIONS",
+        engine_options(config["SQLALCHEMY_DATABASE_URI"], config),
+    )
+
+    binds = dict(config.get("SQLALCHEMY_BINDS") or {})
+    replica_url = config.get("REPLICA_DATABASE_URL")
+    if replica_url and "replica" not in binds:
+        binds["replica"] = replica_url
+    for index, url in enumerate(shard_urls(config)):
+        binds.setdefault(BookShards.key(index), url)
+    for key, bind in binds.items():
+        if isinstance(bind, str):
+            binds[key] = {"url": bind, **engine_options(bind, config)}
+    config["SQLALCHEMY_BINDS"] = binds
@@ -0,0 +1,112 @@
+# db_routing.py
+"""
+Read-replica routing.
+
+Views decorated with @read_replica send their SELECTs to the "replica" bind.
+Everything else, every flush and every request from a client that wrote
+within the last REPLICA_STICKY_SECONDS stays on the primary, so users always
+read their own writes even while the replica lags. A write response sets a
+short-lived cookie holding the writer and the write time, so the read that
+follows stays on the primary whichever worker serves it.
+
+With book shards configured, statements on the books table are routed to
+their shard before any of this (sharding.py).
+"""
+import math
+import time
+from functools import wraps
+from typing import Optional
+
+from flask import current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+import sharding
+
+REPLICA_BIND = "replica"
+STICKY_COOKIE = "read_primary"  # "<user id>:<unix time of the write>"
+
+
+class RoutingSession(FlaskSession):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            shard = sharding.bind_for(self._db.engines, mapper, clause)
+            if shard is not None:
+                return shard
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and has_request_context()
+            and g.get("read_replica")
+            and not g.get("db_wrote")
+        ):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_flush(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    if not orm_execute_state.is_select and has_request_context():
+        g.db_wrote = True
+
+
+def cookie_wrote_recently(cookie: Optional[str], identity: str, window: float) -> bool:
+    """Whether a STICKY_COOKIE value records a write by `identity` in the last `window` seconds."""
+    writer, _, written = (cookie or "").partition(":")
+    if writer != identity:
+        return False
+    try:
+        age = time.time() - float(written)
+    except ValueError:
+        return False
+    return age < window
+
+
+def wrote_recently(identity: str) -> bool:
+    """Whether this request's client wrote as `identity` within REPLICA_STICKY_SECONDS."""
+    return cookie_wrote_recently(
+        request.cookies.get(STICKY_COOKIE), identity, current_app.config.get("REPLICA_STICKY_SECONDS", 5.0)
+    )
+
+
+def read_replica(view):
+    """Route this view's reads to the replica. Place below @jwt_required()."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if REPLICA_BIND in current_app.config.get("SQLALCHEMY_BINDS", {}):
+            g.read_replica = not wrote_recently(str(get_jwt_identity()))
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def _remember_writer(response):
+    if not g.get("db_wrote"):
+        return response
+    try:
+        identity = get_jwt_identity()
+    except RuntimeError:
+        # no JWT on this request (e.g. registration); nothing to pin
+        return response
+    if identity is not None:
+        window = current_app.config.get("REPLICA_STICKY_SECONDS", 5.0)
+        response.set_cookie(
+            STICKY_COOKIE, f"{identity}:{time.time():.3f}",
+            max_age=math.ceil(window), path="/api", httponly=True, samesite="Lax",
+        )
+    return response
+
+
+def init_app(app) -> None:
+    app.after_request(_remember_writer)
@@ -1,9 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
-db = SQLAlchemy()
-migrate = Migrate()
+from db_routing import RoutingSession
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 jwt = JWTManager()
 cors = CORS()
@@ -0,0 +1,80 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings for the Flask app, sized from the machine and overridable
+from the environment:
+
+    GUNICORN_BIND                 address to listen on (default 0.0.0.0:5001)
+    GUNICORN_WORKERS              processes (default 2 x CPUs + 1, at most 12)
+    GUNICORN_THREADS              threads per process (default 4)
+    GUNICORN_PRELOAD              import the app once in the master (default true)
+    GUNICORN_MAX_REQUESTS         recycle a worker after this many requests (default 0, off)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests per worker (default 10% of the above)
+    GUNICORN_TIMEOUT              seconds before a silent worker is killed (default 30)
+
+With more than one worker, BOOK_EVENTS_BACKEND defaults to "changelog", so
+a book stream sees writes served by any worker (see book_events.py). Each
+open stream holds one of its worker's threads; BOOK_STREAM_MAX_CLIENTS (2)
+leaves the others to ordinary requests. Serve the streams from asgi_app.py
+instead, and these routes are only a fallback.
+
+With preload the master imports the app before forking, so workers share
+its memory copy-on-write and boot instantly. Engines created in the master
+must not hand their pooled connections to several processes; post_fork
+gives each worker fresh pools.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_bool(name, default):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+wsgi_app = "library_app:create_app()"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5001")
+
+workers = _env_int("GUNICORN_WORKERS", min(multiprocessing.cpu_count() * 2 + 1, 12))
+# ProdConfig's DB pool (8 + 8 overflow) is sized for these threads
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = "gthread" if threads > 1 else "sync"
+
+# "local" book events only reach streams on the worker that served the write;
+# set before the app (and config.py) is imported
+if workers > 1:
+    os.environ.setdefault("BOOK_EVENTS_BACKEND", "changelog")
+
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+# bound slow memory growth by recycling workers; jitter keeps them from all
+# restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 0)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", max_requests // 10)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = timeout
+
+# heartbeat files on tmpfs; a disk-backed /tmp can stall workers under load
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+
+def post_fork(server, worker):
+    """Drop connection pools inherited from the master (preload only)."""
+    app = server.app.callable
+    if app is None:
+        return
+
+    from extensions import db
+
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: leave the master's sockets alone, just forget them
+            engine.dispose(close=False)
@@ -0,0 +1,188 @@
+# instrumentation.py
+"""
+Request and SQL instrumentation exposed in Prometheus text format.
+
+Flask request hooks time every request; engine cursor events count the SQL
+statements it runs and their time. Both add a perf_counter() call and a few
+dict updates per event. Metrics are per process: under gunicorn each worker
+reports its own numbers, and Prometheus sums them across scrape targets.
+
+/api/metrics is only mounted when METRICS_TOKEN is set, and answers 401
+unless the scraper sends it as a bearer token: endpoint names, traffic and
+SQL timings are not for the public.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _EndpointStats:
+    __slots__ = ("buckets", "latency_sum", "count", "statuses", "sql_count", "db_time")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.latency_sum = 0.0
+        self.count = 0
+        self.statuses = defaultdict(int)
+        self.sql_count = 0
+        self.db_time = 0.0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = defaultdict(_EndpointStats)
+        self._counters = defaultdict(float)
+
+    def observe_request(self, endpoint, status, seconds, sql_count, db_time):
+        slot = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._endpoints[endpoint]
+            stats.buckets[slot] += 1
+            stats.latency_sum += seconds
+            stats.count += 1
+            stats.statuses[status] += 1
+            stats.sql_count += sql_count
+            stats.db_time += db_time
+
+    def inc(self, name, value=1.0):
+        """Free-form process counter, rendered as `<name> <value>`."""
+        with self._lock:
+            self._counters[name] += value
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            counters = sorted(self._counters.items())
+
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by endpoint.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for endpoint, s in endpoints:
+            cumulative = 0
+            for le, n in zip(LATENCY_BUCKETS + ("+Inf",), s.buckets):
+                cumulative += n
+                lines.append(
+                    f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{le}"}} {cumulative}'
+                )
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {s.latency_sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {s.count}')
+
+        lines += ["# HELP http_requests_total Responses by endpoint and status.",
+                  "# TYPE http_requests_total counter"]
+        for endpoint, s in endpoints:
+            for status, n in sorted(s.statuses.items()):
+                lines.append(f'http_requests_total{{endpoint="{endpoint}",status="{status}"}} {n}')
+
+        lines += ["# HELP db_statements_total SQL statements executed while serving the endpoint.",
+                  "# TYPE db_statements_total counter"]
+        lines += [f'db_statements_total{{endpoint="{e}"}} {s.sql_count}' for e, s in endpoints]
+
+        lines += ["# HELP db_time_seconds_total Time spent in SQL while serving the endpoint.",
+                  "# TYPE db_time_seconds_total counter"]
+        lines += [f'db_time_seconds_total{{endpoint="{e}"}} {s.db_time:.6f}' for e, s in endpoints]
+
+        for name, value in counters:
+            lines.append(f"{name} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+# -----------------------------------------------------------------------------
+# SQL statement tracking
+# -----------------------------------------------------------------------------
+
+_count_lock = threading.Lock()  # sharding.scatter threads count on their request's g
+
+
+def _counting_globals():
+    """The request's g, also from a scatter() thread working for it; None outside requests."""
+    if has_request_context():
+        return g
+    if has_app_context():
+        return g.get("sql_counted_for")
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    counting = _counting_globals()
+    if counting is not None:
+        with _count_lock:
+            counting.sql_count = counting.get("sql_count", 0) + 1
+            counting.sql_time = counting.get("sql_time", 0.0) + elapsed
+            # statement text is only kept while a query budget is watching
+            statements = counting.get("sql_statements")
+            if statements is not None:
+                statements.append(statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_failed_statement(exception_context):
+    conn = exception_context.connection
+    started = conn.info.get("query_started") if conn is not None else None
+    if started:
+        started.pop()
+
+
+# -----------------------------------------------------------------------------
+# Request hooks
+# -----------------------------------------------------------------------------
+
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        metrics.observe_request(
+            request.endpoint or "unmatched",
+            response.status_code,
+            time.perf_counter() - started,
+            g.get("sql_count", 0),
+            g.get("sql_time", 0.0),
+        )
+    return response
+
+
+def init_app(app) -> None:
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
+
+    if not app.config.get("METRICS_TOKEN"):
+        return
+
+    @app.get("/api/metrics")
+    def prometheus_metrics():
+        expected = f"Bearer {current_app.config['METRICS_TOKEN']}"
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected.encode()):
+            return Response("Unauthorized\n", status=401, mimetype="text/plain",
+                            headers={"WWW-Authenticate": "Bearer"})
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
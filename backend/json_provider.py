@@ -0,0 +1,90 @@
+# json_provider.py
+"""
+Response serialization for the Flask and ASGI apps.
+
+FastJSONProvider replaces Flask's default provider with orjson when it is
+installed (stdlib json otherwise). Model values go in as they come out of
+the database: Decimal prices become JSON numbers and datetimes ISO-8601
+strings inside the encoder, so serializers no longer convert every row with
+float()/isoformat() in Python.
+
+Clients that send `Accept: application/msgpack` get MessagePack instead of
+JSON when msgpack is installed; everyone else, including `Accept: */*`,
+gets JSON.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import has_request_context, request
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPE = "application/msgpack"
+
+
+def _default(obj):
+    """Types the encoders do not know natively."""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    # non-str keys: grouped results can have None (no genre) as a key
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+    def dumps_bytes(obj) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps_bytes(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+def packb(obj) -> bytes:
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def wants_msgpack(accept_header) -> bool:
+    """True when msgpack is available and the client prefers it over JSON."""
+    if msgpack is None or not accept_header:
+        return False
+    best = accept_header.best_match(["application/json", MSGPACK_MIMETYPE])
+    return best == MSGPACK_MIMETYPE
+
+
+class FastJSONProvider(JSONProvider):
+    mimetype = "application/json"
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps_bytes(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if has_request_context() and wants_msgpack(request.accept_mimetypes):
+            response = self._app.response_class(packb(obj), mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+        if msgpack is not None:
+            response.vary.add("Accept")
+        return response
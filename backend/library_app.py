@@ -1,10 +1,27 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
+from flask.cli import AppGroup
 
-from config import config_by_name
-from extensions import db, migrate, jwt, cors
+import book_events
+import book_writer
+import compression
+import db_routing
+import instrumentation
+import json_provider
+import profiling
+import sharding
+import slow_query
+import suggest
+import traffic_recorder
+from config import config_by_name, config_name_from_env, configure_database
+from extensions import db, jwt, cors
 
 # import models so migrations detect them
-from models import User, Book
+from models import User, Book, Genre, Author
+
+# registers the session listener that logs book writes
+import change_log
+# registers the flush listener that turns genre and author names into ids
+import lookups
 
 # import blueprints
 from routes.auth_routes import auth_bp
@@ -13,20 +30,71 @@ from routes.admin_routes import admin_bp
 from routes.ai_routes import ai_bp
 
 
-def create_app(config_name: str = "dev") -> Flask:
+class _AppCLI(AppGroup):
+    """
+    app.cli that imports Flask-Migrate only when a `flask db ...` command is
+    looked up. It pulls in alembic, most of the app's import time, and only
+    the CLI needs it; gunicorn workers and the test suite never load it.
+    """
+
+    def __init__(self, app: Flask):
+        super().__init__(app.name)
+        self._app = app
+
+    def get_command(self, ctx, name):
+        if name == "db" and "migrate" not in self._app.extensions:
+            from flask_migrate import Migrate
+            Migrate(self._app, db)  # registers the `db` group on this CLI
+        return super().get_command(ctx, name)
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | {"db"})
+
+
+def create_app(config_name: str = None, config_overrides: dict = None) -> Flask:
+    """
+    App factory. Without a config_name the config comes from APP_ENV, so
+    servers call it bare: `gunicorn "library_app:create_app()"`,
+    `flask --app library_app run`.
+    """
     app = Flask(__name__)
-    app.config.from_object(config_by_name[config_name])
+    app.cli = _AppCLI(app)
+    app.json = json_provider.FastJSONProvider(app)
+    app.config.from_object(config_by_name[config_name or config_name_from_env()])
+    if config_overrides:
+        app.config.update(config_overrides)
+    configure_database(app.config)
 
     # init extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    db_routing.init_app(app)
+    sharding.init_app(app)
+    instrumentation.init_app(app)
+    slow_query.init_app(app)
+    traffic_recorder.init_app(app)
+    compression.init_app(app)
+    profiling.init_app(app)
+    book_writer.init_app(app)
+    book_events.init_app(app)
+    suggest.init_app(app)
     jwt.init_app(app)
     cors.init_app(app, resources={r"/api/*": {"origins": "*"}})
 
-    # health check
+    # health check; ?deep=1 adds a timed DB ping and pool counters
     @app.get("/api/health")
     def health():
-        return jsonify({"status": "ok"})
+        if not request.args.get("deep"):
+            return jsonify({"status": "ok"})
+
+        from services.health_service import check_database, get_pool_status
+
+        database = check_database()
+        body = {
+            "status": "ok" if database["ok"] else "degraded",
+            "database": database,
+            "pool": get_pool_status(),
+        }
+        return jsonify(body), 200 if database["ok"] else 503
 
     # register blueprints
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
@@ -34,12 +102,12 @@ def create_app(config_name: str = "dev") -> Flask:
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
     app.register_blueprint(ai_bp, url_prefix="/api/ai")
 
-    return app
+    # CLI: flask seed
+    from seed import seed_command
+    app.cli.add_command(seed_command)
 
-
-# global app object that Flask CLI will use
-app = create_app("dev")
+    return app
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    create_app("dev").run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,125 @@
+# lookups.py
+"""
+Genre and author lookup tables.
+
+Books store genre_id and author_id; each name is a row in genres or authors,
+unique by lookup_key(name) (trimmed and case-folded), so "Sci-Fi", "sci-fi "
+and "SCI-FI" are one genre, displayed as first written. Filters and group-bys
+then run on the books' small indexed integer columns instead of comparing
+strings row by row.
+
+Setting book.genre or book.author only records the name. A before_flush
+listener resolves the names of every book in the flush at once: ids come
+from a per-process cache, then one SELECT per table for the keys it lacks,
+then one INSERT for keys that are new. The INSERT skips keys a concurrent
+request added first (INSERT IGNORE on MySQL, OR IGNORE on SQLite); the
+new ids are read back with a second SELECT, unless a single row went in and
+returned its id. Lookup rows are never deleted.
+
+Ids are cached only once the transaction that found them commits, per
+database: when sharded, each shard has its own genres and authors next to
+its books, with their own ids.
+"""
+from typing import Dict, Iterable, Tuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, insert, select
+from sqlalchemy.orm import Session
+
+from models import Author, Book, Genre, lookup_key
+from sharding import current_shard
+
+LOOKUPS = (("genre", "genre_id", Genre), ("author", "author_id", Author))
+
+
+def _cache(model) -> dict:
+    """{key: (id, name)} committed on the current database; a throwaway dict outside an app."""
+    if not has_app_context():
+        return {}
+    caches = current_app.extensions.setdefault("lookups", {})
+    return caches.setdefault((model.__tablename__, current_shard()), {})
+
+
+def _found(session) -> list:
+    return session.info.setdefault("lookup_rows", [])
+
+
+def _lookup(session, model, names: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+    names = {lookup_key(name): name.strip() for name in names if name and name.strip()}
+    cache = _cache(model)
+    rows = {key: cache[key] for key in names if key in cache}
+    missing = [key for key in names if key not in rows]
+    if not missing:
+        return rows
+
+    connection = session.connection(bind_arguments={"mapper": model.__mapper__})
+    table = model.__table__
+
+    def select_rows(keys):
+        query = select(table.c.key, table.c.id, table.c.name).where(table.c.key.in_(keys))
+        return {key: (id_, name) for key, id_, name in connection.execute(query)}
+
+    found = select_rows(missing)
+    new = [key for key in missing if key not in found]
+    if new:
+        result = connection.execute(
+            insert(table).prefix_with("OR IGNORE", dialect="sqlite").prefix_with("IGNORE", dialect="mysql"),
+            [{"key": key, "name": names[key]} for key in new],
+        )
+        if len(new) == 1 and result.rowcount == 1:
+            # the usual case, one new name per write: its id came back with the INSERT
+            found[new[0]] = (result.inserted_primary_key[0], names[new[0]])
+        else:
+            found.update(select_rows(new))
+    _found(session).append((cache, found))
+    rows.update(found)
+    return rows
+
+
+def lookup_ids(session, model, names: Iterable[str]) -> Dict[str, int]:
+    """
+    {lookup_key(name): id} for `names` on the current database, adding the
+    rows that don't exist yet. Runs on the session's connection, so new rows
+    commit or roll back with its transaction.
+    """
+    return {key: id_ for key, (id_, _) in _lookup(session, model, names).items()}
+
+
+@event.listens_for(Session, "before_flush")
+def _resolve_book_names(session, flush_context, instances):
+    books = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Book) and obj.__dict__.get("_unresolved")
+    ]
+    for attr, column, model in LOOKUPS:
+        named = [book for book in books if attr in book.__dict__["_unresolved"]]
+        if not named:
+            continue
+        rows = _lookup(session, model, [book.__dict__["_lookup_names"][attr] for book in named])
+        for book in named:
+            names = book.__dict__["_lookup_names"]
+            # until the book is reloaded, it reads the name as stored
+            id_, names[attr] = rows[lookup_key(names[attr])] if names[attr] else (None, None)
+            setattr(book, column, id_)
+    for book in books:
+        del book.__dict__["_unresolved"]
+
+
+@event.listens_for(Book, "expire")
+def _forget_names(book, attrs):
+    # reloaded books read their names through genre_entry and author_entry
+    if attrs is not None:
+        return
+    book.__dict__.pop("_lookup_names", None)
+    book.__dict__.pop("_unresolved", None)
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_committed_ids(session):
+    for cache, found in session.info.pop("lookup_rows", []):
+        cache.update(found)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_uncommitted_ids(session):
+    session.info.pop("lookup_rows", None)
@@ -0,0 +1,193 @@
+"""genre and author lookups
+
+Revision ID: 5e2b7c1d9a30
+Revises: 8d41b6e0c2a5
+Create Date: 2026-10-18 16:41:09.272814
+
+Moves books.genre and books.author into the genres and authors lookup tables
+(unique by trimmed, case-folded name, see models.lookup_key) and stores
+reading_status as its index in models.READING_STATUSES. MySQL's default
+collation ignores accents, so the key columns use the binary one and the keys
+of existing rows are computed in Python rather than grouped in SQL. Existing
+rows are converted BATCH_SIZE books at a time, keyed by id, so no statement
+touches the whole table at once. A status outside READING_STATUSES becomes NULL.
+
+This upgrades the primary database. Shard databases (BOOK_SHARD_URLS) are not
+managed by alembic; convert them by pointing DATABASE_URL at each shard in
+turn, or recreate them with `flask create-shard-tables`.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '5e2b7c1d9a30'
+down_revision = '8d41b6e0c2a5'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+READING_STATUSES = ('planned', 'reading', 'completed')  # models.READING_STATUSES when this was written
+
+books = sa.table(
+    'books',
+    sa.column('id', sa.Integer),
+    sa.column('author', sa.String),
+    sa.column('genre', sa.String),
+    sa.column('reading_status', sa.String),
+    sa.column('author_id', sa.Integer),
+    sa.column('genre_id', sa.Integer),
+    sa.column('status_code', sa.SmallInteger),
+)
+authors = sa.table('authors', sa.column('id', sa.Integer), sa.column('key', sa.String), sa.column('name', sa.String))
+genres = sa.table('genres', sa.column('id', sa.Integer), sa.column('key', sa.String), sa.column('name', sa.String))
+
+
+def _key(name):
+    return name.strip().casefold() if name and name.strip() else None
+
+
+def _batches(conn, *columns):
+    """The books' `columns` (after id), BATCH_SIZE rows at a time in id order."""
+    last = 0
+    while True:
+        rows = conn.execute(
+            sa.select(books.c.id, *columns).where(books.c.id > last).order_by(books.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+
+
+def _fill_lookup(conn, lookup, column):
+    """One lookup row per distinct key, named as the oldest book spells it; {key: id}."""
+    # keys are merged here rather than with GROUP BY, which on MySQL's default
+    # collation would fold "Émile" into "Emile" and leave one spelling unmatched
+    names = {}
+    for rows in _batches(conn, column):
+        for _, name in rows:
+            names.setdefault(_key(name), name and name.strip())
+    names.pop(None, None)
+    rows = [{'key': key, 'name': name} for key, name in names.items()]
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(lookup.insert(), rows[start:start + BATCH_SIZE])
+    return dict(conn.execute(sa.select(lookup.c.key, lookup.c.id)).all())
+
+
+def _status_code(status):
+    status = (status or '').strip().lower()
+    return READING_STATUSES.index(status) if status in READING_STATUSES else None
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_table('authors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=255).with_variant(mysql.VARCHAR(length=255, collation='utf8mb4_bin'), 'mysql'), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_table('genres',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=100).with_variant(mysql.VARCHAR(length=100, collation='utf8mb4_bin'), 'mysql'), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('author_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('genre_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('status_code', sa.SmallInteger(), nullable=True))
+
+    # ### end Alembic commands ###
+
+    conn = op.get_bind()
+    author_ids = _fill_lookup(conn, authors, books.c.author)
+    genre_ids = _fill_lookup(conn, genres, books.c.genre)
+    convert = (
+        books.update()
+        .where(books.c.id == sa.bindparam('book_id'))
+        .values(
+            author_id=sa.bindparam('new_author_id'),
+            genre_id=sa.bindparam('new_genre_id'),
+            status_code=sa.bindparam('new_status_code'),
+        )
+    )
+    for rows in _batches(conn, books.c.author, books.c.genre, books.c.reading_status):
+        conn.execute(convert, [
+            {
+                'book_id': book_id,
+                'new_author_id': author_ids.get(_key(author)),
+                'new_genre_id': genre_ids.get(_key(genre)),
+                'new_status_code': _status_code(status),
+            }
+            for book_id, author, genre, status in rows
+        ])
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('author')
+        batch_op.drop_column('genre')
+        batch_op.drop_column('reading_status')
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.alter_column('status_code', new_column_name='reading_status',
+               existing_type=sa.SmallInteger(), existing_nullable=True)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_books_author_id'), ['author_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_books_genre_id'), ['genre_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_books_reading_status'), ['reading_status'], unique=False)
+        batch_op.create_foreign_key('fk_books_author_id_authors', 'authors', ['author_id'], ['id'])
+        batch_op.create_foreign_key('fk_books_genre_id_genres', 'genres', ['genre_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_books_genre_id_genres', type_='foreignkey')
+        batch_op.drop_constraint('fk_books_author_id_authors', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_books_reading_status'))
+        batch_op.drop_index(batch_op.f('ix_books_genre_id'))
+        batch_op.drop_index(batch_op.f('ix_books_author_id'))
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.alter_column('reading_status', new_column_name='status_code',
+               existing_type=sa.SmallInteger(), existing_nullable=True)
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reading_status', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('genre', sa.String(length=100), nullable=True))
+        batch_op.add_column(sa.Column('author', sa.String(length=255), nullable=True))
+
+    conn = op.get_bind()
+    author_names = dict(conn.execute(sa.select(authors.c.id, authors.c.name)).all())
+    genre_names = dict(conn.execute(sa.select(genres.c.id, genres.c.name)).all())
+    restore = (
+        books.update()
+        .where(books.c.id == sa.bindparam('book_id'))
+        .values(
+            author=sa.bindparam('new_author'),
+            genre=sa.bindparam('new_genre'),
+            reading_status=sa.bindparam('new_reading_status'),
+        )
+    )
+    for rows in _batches(conn, books.c.author_id, books.c.genre_id, books.c.status_code):
+        conn.execute(restore, [
+            {
+                'book_id': book_id,
+                'new_author': author_names.get(author_id),
+                'new_genre': genre_names.get(genre_id),
+                'new_reading_status': READING_STATUSES[code] if code is not None else None,
+            }
+            for book_id, author_id, genre_id, code in rows
+        ])
+
+    with op.batch_alter_table('books', schema=None) as batch_op:
+        batch_op.drop_column('status_code')
+        batch_op.drop_column('genre_id')
+        batch_op.drop_column('author_id')
+
+    op.drop_table('genres')
+    op.drop_table('authors')
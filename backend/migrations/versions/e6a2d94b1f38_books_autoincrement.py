@@ -0,0 +1,35 @@
+"""books autoincrement
+
+Revision ID: e6a2d94b1f38
+Revises: c81d5f2a6e09
+Create Date: 2026-10-19 15:27:50.342117
+
+SQLite reuses the highest rowid once that row is deleted unless the table
+is declared AUTOINCREMENT; change_log.record_bulk_inserts needs book ids
+that only grow. MySQL and PostgreSQL never reuse them, so only SQLite
+tables are rebuilt.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2d94b1f38'
+down_revision = 'c81d5f2a6e09'
+branch_labels = None
+depends_on = None
+
+
+def _rebuild_books(autoincrement):
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('books', recreate='always', table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+
+
+def upgrade():
+    _rebuild_books(True)
+
+
+def downgrade():
+    _rebuild_books(False)
@@ -1,14 +1,22 @@
 from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.hybrid import Comparator, hybrid_property
+from sqlalchemy.orm import attributes
+from sqlalchemy.types import SmallInteger, TypeDecorator
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from extensions import db
 
+# stored as their index; append new statuses, never reorder
+READING_STATUSES = ("planned", "reading", "completed")
+
 
 class User(db.Model):
     __tablename__ = "users"
 
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), nullable=False)
+    name = db.Column(db.String(120), nullable=False, index=True)
     email = db.Column(db.String(120), unique=True, index=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), default="user")
@@ -16,6 +24,9 @@ class User(db.Model):
 
     books = db.relationship("Book", backref="owner", lazy="dynamic", cascade="all, delete-orphan")
 
+    # keyset pagination for the admin listing walks (created_at, id) descending
+    __table_args__ = (db.Index("ix_users_created_at_id", "created_at", "id"),)
+
     # password methods
     def set_password(self, raw_password):
         self.password_hash = generate_password_hash(raw_password)
@@ -28,17 +39,179 @@ class User(db.Model):
         return self.role == "admin"
 
 
+def lookup_key(name: str) -> str:
+    """The unique key of a genre or author name: trimmed and case-folded."""
+    return name.strip().casefold()
+
+
+def _key_type(length: int):
+    # MySQL's default collation ignores case and accents, so "Émile" and "emile"
+    # would be the same key to the unique index and to lookups; compare bytes
+    return db.String(length).with_variant(mysql.VARCHAR(length, collation="utf8mb4_bin"), "mysql")
+
+
+class Genre(db.Model):
+    __tablename__ = "genres"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(_key_type(100), unique=True, nullable=False)  # lookup_key(name)
+    name = db.Column(db.String(100), nullable=False)  # as first written
+
+
+class Author(db.Model):
+    __tablename__ = "authors"
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(_key_type(255), unique=True, nullable=False)
+    name = db.Column(db.String(255), nullable=False)
+
+
+class ReadingStatus(TypeDecorator):
+    """A reading status, stored as its index in READING_STATUSES."""
+    impl = SmallInteger
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return READING_STATUSES.index(value.strip().lower())
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else READING_STATUSES[value]
+
+
+class _LookupComparator(Comparator):
+    """Book.genre == name in SQL: genre_id against the id of name's key."""
+
+    def __init__(self, column, model):
+        super().__init__(column)
+        self.model = model
+
+    def __eq__(self, name):
+        if name is None:
+            return self.expression.is_(None)
+        key = lookup_key(name)
+        return self.expression == select(self.model.id).where(self.model.key == key).scalar_subquery()
+
+
+def _lookup_name(book, attr: str):
+    names = book.__dict__.get("_lookup_names", {})
+    if attr in names:
+        return names[attr]
+    entry = getattr(book, f"{attr}_entry")
+    return entry.name if entry is not None else None
+
+
+def _set_lookup_name(book, attr: str, name) -> None:
+    name = name.strip() if name else None
+    book.__dict__.setdefault("_lookup_names", {})[attr] = name or None
+    book.__dict__.setdefault("_unresolved", set()).add(attr)
+    attributes.flag_dirty(book)  # so the flush resolves it, see lookups.py
+
+
 class Book(db.Model):
+    """
+    genre and author read and write names; the table holds ids into genres
+    and authors, which lookups.py resolves (creating new names) at flush.
+    """
     __tablename__ = "books"
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(255), nullable=False, index=True)
-    author = db.Column(db.String(255))
-    genre = db.Column(db.String(100))
+    author_id = db.Column(db.Integer, db.ForeignKey("authors.id"), index=True)
+    genre_id = db.Column(db.Integer, db.ForeignKey("genres.id"), index=True)
     price = db.Column(db.Numeric(10, 2))
     pages = db.Column(db.Integer)
-    reading_status = db.Column(db.String(50))  # planned, reading, completed
+    reading_status = db.Column(ReadingStatus, index=True)  # planned, reading, completed
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    author_entry = db.relationship(Author, lazy="joined")
+    genre_entry = db.relationship(Genre, lazy="joined")
+
+    # never reuse the id of a deleted book; change_log.record_bulk_inserts relies on it
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    @hybrid_property
+    def author(self):
+        return _lookup_name(self, "author")
+
+    @author.setter
+    def author(self, name):
+        _set_lookup_name(self, "author", name)
+
+    @author.comparator
+    def author(cls):
+        return _LookupComparator(cls.author_id, Author)
+
+    @hybrid_property
+    def genre(self):
+        return _lookup_name(self, "genre")
+
+    @genre.setter
+    def genre(self, name):
+        _set_lookup_name(self, "genre", name)
+
+    @genre.comparator
+    def genre(cls):
+        return _LookupComparator(cls.genre_id, Genre)
+
+
+class BookChange(db.Model):
+    """
+    Change log of the books table, written by change_log.py: one row per
+    create, update or delete, in seq order. No foreign keys; deleted books
+    keep their entries as tombstones.
+    """
+    __tablename__ = "book_changes"
+
+    seq = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # create, update, delete
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        # per-user sync reads (user_id, seq > since) in order
+        db.Index("ix_book_changes_user_id_seq", "user_id", "seq"),
+        # never reuse a seq, even after the newest entry is deleted
+        {"sqlite_autoincrement": True},
+    )
+
+
+class BookTicket(db.Model):
+    """
+    Outcome of a create queued with ?async=1, written by book_writer.py in
+    the transaction that settled it: book_id when created, error when it
+    failed. No row yet means still queued. Lives next to the owner's books.
+    """
+    __tablename__ = "book_tickets"
+
+    ticket = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    book_id = db.Column(db.Integer, nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+    finished_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class CacheVersion(db.Model):
+    """
+    Write version of one scope of data, bumped by cache.py after every commit
+    that changed it, so cached values from any worker can tell they are
+    stale: "user:<id>" for a user's row and books, "user:*" for writes whose
+    owners are unknown, and SLOTS "all:<n>" rows summed for everyone's data.
+    """
+    __tablename__ = "cache_versions"
+    SLOTS = 16
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+@event.listens_for(CacheVersion.__table__, "after_create")
+def _seed_cache_versions(table, connection, **kw):
+    # the shared rows up front; a user's row is added by their first write
+    names = ["user:*"] + [f"all:{n}" for n in range(CacheVersion.SLOTS)]
+    connection.execute(table.insert(), [{"name": name, "version": 0} for name in names])
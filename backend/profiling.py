@@ -0,0 +1,270 @@
+# profiling.py
+"""
+On-demand CPU and memory profiles of live requests.
+
+An admin asks for one by sending `X-Profile: cpu`, `memory` or `cpu,memory`
+(or the same value as a `?_profile=` query flag) with an ordinary request.
+The caller's JWT is checked against the users table, so the flag is ignored
+for anyone who is not an admin at that moment. The request then runs under
+cProfile and/or tracemalloc, and the response carries `X-Profile-Id`.
+
+Sampling mode profiles every PROFILE_SAMPLE_EVERY-th request (per worker) to
+the endpoint named by PROFILE_SAMPLE_ENDPOINT, e.g. `books.list_books`,
+without any flag, for slowness that does not reproduce on demand.
+
+Each profile is a set of files in PROFILE_DIR sharing one id:
+
+    <id>.json         endpoint, path, status, duration, who asked
+    <id>.prof         cProfile stats (python -m pstats, snakeviz)
+    <id>.cpu.txt      top functions by cumulative time
+    <id>.tracemalloc  allocation snapshot (tracemalloc.Snapshot.load)
+    <id>.mem.txt      top allocation sites still held when the view returned
+
+Only the newest PROFILE_KEEP profiles are kept. /api/admin/profiles lists
+them and serves the files.
+"""
+import cProfile
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from extensions import db
+from models import User
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_PARAM = "_profile"
+MODES = ("cpu", "memory")
+
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 30
+
+# tracemalloc is process-wide: one memory profile at a time per worker
+_memory_lock = threading.Lock()
+_ids = itertools.count(1)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+def parse_modes(raw):
+    """`cpu,memory` -> ("cpu", "memory"); `1`/`true` mean cpu; junk -> ()."""
+    if not raw:
+        return ()
+    words = {part.strip().lower() for part in raw.split(",")}
+    if words & {"1", "true", "yes", "on"}:
+        words.add("cpu")
+    if "all" in words:
+        words.update(MODES)
+    return tuple(mode for mode in MODES if mode in words)
+
+
+def _caller_is_admin() -> bool:
+    try:
+        verify_jwt_in_request(optional=True)
+    except (JWTExtendedException, PyJWTError):
+        return False  # the view reports the bad token itself
+    identity = get_jwt_identity()
+    if identity is None:
+        return False
+    user = db.session.get(User, int(identity))
+    return bool(user and user.is_admin)
+
+
+class _ActiveProfile:
+    def __init__(self, modes, requested_by):
+        self.requested_by = requested_by
+        self.cpu = cProfile.Profile() if "cpu" in modes else None
+        self.memory = "memory" in modes and _memory_lock.acquire(blocking=False)
+        if self.memory and tracemalloc.is_tracing():
+            # started elsewhere (PYTHONTRACEMALLOC); its snapshot isn't ours
+            _memory_lock.release()
+            self.memory = False
+        self.snapshot = None
+        self.memory_peak = None
+        self.started = time.perf_counter()
+        self.duration_ms = None
+
+    @property
+    def modes(self):
+        return [mode for mode, on in (("cpu", self.cpu), ("memory", self.memory)) if on]
+
+    def start(self):
+        if self.memory:
+            tracemalloc.start(10)
+        if self.cpu:
+            self.cpu.enable()
+
+    def stop(self):
+        if self.cpu:
+            self.cpu.disable()
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+        if self.memory:
+            try:
+                self.memory_peak = tracemalloc.get_traced_memory()[1]
+                self.snapshot = tracemalloc.take_snapshot().filter_traces((
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ))
+            finally:
+                tracemalloc.stop()
+                _memory_lock.release()
+                self.memory = bool(self.snapshot)
+
+
+class Profiler:
+    def __init__(self, directory: str, keep: int, sample_endpoint=None,
+                 sample_every: int = 100, sample_modes=("cpu",)):
+        self.directory = directory
+        self.keep = keep
+        self.sample_endpoint = sample_endpoint
+        self.sample_every = max(int(sample_every), 1)
+        self.sample_modes = sample_modes
+        self._sampled = itertools.count()
+
+    def sampling(self) -> dict:
+        return {
+            "endpoint": self.sample_endpoint,
+            "every": self.sample_every if self.sample_endpoint else None,
+            "modes": list(self.sample_modes) if self.sample_endpoint else [],
+        }
+
+    # ------------------------------------------------------------------
+    # Request hooks
+    # ------------------------------------------------------------------
+
+    def before_request(self):
+        modes = parse_modes(request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM))
+        requested_by = "admin"
+        if modes and not _caller_is_admin():
+            modes = ()
+        if not modes and self.sample_endpoint and request.endpoint == self.sample_endpoint:
+            if next(self._sampled) % self.sample_every == 0:
+                modes, requested_by = self.sample_modes, "sampling"
+        if not modes:
+            return
+
+        profile = _ActiveProfile(modes, requested_by)
+        g.active_profile = profile
+        profile.start()
+
+    def after_request(self, response):
+        profile = g.pop("active_profile", None)
+        if profile is None:
+            return response
+        profile.stop()
+        try:
+            response.headers["X-Profile-Id"] = self.save(profile, response.status_code)
+        except OSError:
+            pass  # profiling must never fail the request
+        return response
+
+    def teardown_request(self, exc):
+        # after_request is skipped when the view raised; still release tracemalloc
+        profile = g.pop("active_profile", None)
+        if profile is not None:
+            profile.stop()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def save(self, profile: _ActiveProfile, status: int) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        endpoint = request.endpoint or "unmatched"
+        profile_id = "{}-{:03d}-{}-{}-{}".format(
+            time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)), int(now * 1000) % 1000,
+            os.getpid(), next(_ids), _UNSAFE_CHARS.sub("_", endpoint),
+        )
+        base = os.path.join(self.directory, profile_id)
+
+        files = []
+        if profile.cpu:
+            profile.cpu.dump_stats(base + ".prof")
+            out = io.StringIO()
+            pstats.Stats(profile.cpu, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+            _write_text(base + ".cpu.txt", out.getvalue())
+            files += [profile_id + ".prof", profile_id + ".cpu.txt"]
+        if profile.snapshot:
+            profile.snapshot.dump(base + ".tracemalloc")
+            stats = profile.snapshot.statistics("lineno")
+            lines = [f"peak traced: {profile.memory_peak} bytes", ""]
+            lines += [str(stat) for stat in stats[:TOP_ALLOCATIONS]]
+            _write_text(base + ".mem.txt", "\n".join(lines) + "\n")
+            files += [profile_id + ".tracemalloc", profile_id + ".mem.txt"]
+
+        meta = {
+            "id": profile_id,
+            "created_at": round(now, 3),
+            "endpoint": endpoint,
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "duration_ms": profile.duration_ms,
+            "modes": profile.modes,
+            "memory_peak_bytes": profile.memory_peak,
+            "requested_by": profile.requested_by,
+            "files": files,
+        }
+        _write_text(base + ".json", json.dumps(meta))
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        expired = set(ids[:-self.keep] if self.keep > 0 else ids)
+        if not expired:
+            return
+        for name in os.listdir(self.directory):
+            if name.split(".", 1)[0] in expired:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass  # another worker rotated it first
+
+    def list_profiles(self) -> list:
+        """Saved profiles' metadata, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # rotated away or still being written
+        return profiles
+
+
+def _write_text(path: str, text: str) -> None:
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def init_app(app) -> None:
+    if not app.config.get("PROFILING_ENABLED", True):
+        return
+
+    profiler = Profiler(
+        app.config["PROFILE_DIR"],
+        int(app.config.get("PROFILE_KEEP", 50)),
+        sample_endpoint=app.config.get("PROFILE_SAMPLE_ENDPOINT") or None,
+        sample_every=app.config.get("PROFILE_SAMPLE_EVERY", 100),
+        sample_modes=parse_modes(app.config.get("PROFILE_SAMPLE_MODES", "cpu")) or ("cpu",),
+    )
+    app.extensions["profiler"] = profiler
+    app.before_request(profiler.before_request)
+    app.after_request(profiler.after_request)
+    app.teardown_request(profiler.teardown_request)
@@ -0,0 +1,99 @@
+# query_budget.py
+"""
+Per-view SQL statement budgets.
+
+    @book_bp.get("/")
+    @jwt_required()
+    @query_budget(2)
+    def list_books(): ...
+
+The statements a view runs are counted by the cursor hooks in
+instrumentation.py. Going over budget raises QueryBudgetExceeded when
+QUERY_BUDGET_MODE is "raise" (the default under TESTING) and logs a warning
+with the repeated statement shapes when it is "log" (the default otherwise),
+which is how an N+1 usually shows itself.
+
+A view that commits a write to a cached table also runs the version bump
+from cache.py, one UPDATE per commit; its budget includes it.
+
+Statements sharding.scatter() runs on each shard count too. A view that
+scatters declares them per shard, so one budget holds sharded or not:
+
+    @query_budget(1, per_shard=1)   # the user, then one query on every shard
+"""
+import re
+from collections import Counter
+from functools import wraps
+from typing import List, Tuple
+
+from flask import current_app, g, request
+
+from sharding import shard_count
+
+_IN_LIST = re.compile(r"\((?:\s*(?:\?|%s|:\w+)\s*,)+\s*(?:\?|%s|:\w+)\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def statement_shape(statement: str) -> str:
+    """Collapse whitespace and IN (...) lists so the same query always looks the same."""
+    return _IN_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+def repeated_shapes(statements: List[str]) -> List[Tuple[str, int]]:
+    counts = Counter(statement_shape(s) for s in statements)
+    return [(shape, n) for shape, n in counts.most_common() if n > 1]
+
+
+def _mode() -> str:
+    mode = current_app.config.get("QUERY_BUDGET_MODE")
+    if mode:
+        return mode
+    return "raise" if current_app.testing else "log"
+
+
+def query_budget(max_statements: int, per_shard: int = 0):
+    """
+    Declare how many SQL statements a view may run: max_statements, plus
+    per_shard for each book shard (one when unsharded). Place directly above
+    the view.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            mode = _mode()
+            if mode == "off":
+                return view(*args, **kwargs)
+            budget = max_statements + per_shard * shard_count()
+
+            before = g.get("sql_count", 0)
+            outer = g.get("sql_statements")
+            g.sql_statements = []
+            try:
+                response = view(*args, **kwargs)
+            finally:
+                statements = g.sql_statements
+                g.sql_statements = outer
+
+            used = g.get("sql_count", 0) - before
+            if used > budget:
+                repeated = repeated_shapes(statements)
+                message = (
+                    f"{request.endpoint} ran {used} SQL statements "
+                    f"(budget {budget})"
+                )
+                if mode == "raise":
+                    detail = "; ".join(f"{n}x {shape}" for shape, n in repeated)
+                    raise QueryBudgetExceeded(message + (f"; repeated: {detail}" if detail else ""))
+                current_app.logger.warning(
+                    "%s; repeated statements: %s", message, repeated or "none"
+                )
+            return response
+
+        wrapper.query_budget = (max_statements, per_shard)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,180 @@
+# repositories/async_book_repo.py
+# AsyncSession counterparts of the read paths in book_repo and ai_service,
+# used by the ASGI entry point (asgi_app.py).
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User, Book, BookChange
+from repositories.book_repo import (
+    book_changes_query,
+    book_facets_from_rows,
+    book_facets_query,
+    books_query,
+    genre_counts_query,
+    latest_change_seq_query,
+)
+
+
+async def get_books_for_user(
+    session: AsyncSession,
+    user_id: int,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[Book]:
+    return list(await session.scalars(books_query(user_id, genre, status, author, limit, offset)))
+
+
+async def get_all_books(
+    session: AsyncSession,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[Book]:
+    return list(await session.scalars(books_query(None, genre, status, author, limit, offset)))
+
+
+async def get_book_facets(
+    session: AsyncSession,
+    facets: List[str],
+    user_id: Optional[int] = None,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    top: int = 50,
+) -> Tuple[int, Dict[str, List[Tuple[str, int]]]]:
+    """See book_repo.get_book_facets."""
+    rows = await session.execute(book_facets_query(facets, user_id, genre, status, author, top))
+    return book_facets_from_rows(facets, rows.all())
+
+
+async def get_books_by_ids(session: AsyncSession, book_ids: List[int]) -> List[Book]:
+    if not book_ids:
+        return []
+    return list(await session.scalars(select(Book).where(Book.id.in_(book_ids))))
+
+
+async def get_book_changes(
+    session: AsyncSession, since: int, settle_seconds: float, limit: int = 1000
+) -> List[BookChange]:
+    """See book_repo.get_book_changes."""
+    stmt = book_changes_query(since, session.bind.dialect.name, settle_seconds, limit=limit)
+    return list(await session.scalars(stmt))
+
+
+async def get_latest_change_seq(session: AsyncSession, settle_seconds: float) -> int:
+    """See book_repo.get_latest_change_seq."""
+    return await session.scalar(latest_change_seq_query(session.bind.dialect.name, settle_seconds)) or 0
+
+
+async def count_by(
+    session: AsyncSession, column, user_id: Optional[int] = None
+) -> List[Tuple[Any, int]]:
+    """(value, count) pairs for a Book column, optionally limited to one owner."""
+    stmt = select(column, func.count(Book.id)).where(column.isnot(None))
+    if user_id is not None:
+        stmt = stmt.where(Book.user_id == user_id)
+    stmt = stmt.group_by(column).order_by(func.count(Book.id).desc(), column)
+    return [tuple(row) for row in (await session.execute(stmt)).all()]
+
+
+async def genre_counts(session: AsyncSession, user_id: Optional[int] = None) -> List[Tuple[str, int]]:
+    """(genre name, count) pairs, grouped on genre_id, optionally limited to one owner."""
+    criteria = [Book.user_id == user_id] if user_id is not None else []
+    return [tuple(row) for row in (await session.execute(genre_counts_query(*criteria))).all()]
+
+
+async def page_and_price_stats(session: AsyncSession, user_id: int) -> dict:
+    """Pages/price aggregates for one owner in a single statement."""
+    row = (
+        await session.execute(
+            select(
+                func.count(Book.id),
+                func.avg(Book.pages),
+                func.min(Book.pages),
+                func.max(Book.pages),
+                func.sum(Book.pages),
+                func.avg(Book.price),
+            ).where(Book.user_id == user_id)
+        )
+    ).one()
+    total, avg_pages, min_pages, max_pages, total_pages, avg_price = row
+    return {
+        "total_books": int(total),
+        "average_pages": avg_pages,
+        "min_pages": min_pages,
+        "max_pages": max_pages,
+        "total_pages": total_pages,
+        "average_price": avg_price,
+    }
+
+
+async def books_in_genre(
+    session: AsyncSession, genre: str, exclude_user_id: int, limit: int
+) -> List[Book]:
+    result = await session.scalars(
+        select(Book)
+        .where(Book.genre == genre, Book.user_id != exclude_user_id)
+        .limit(limit)
+    )
+    return list(result)
+
+
+async def recent_books_excluding(
+    session: AsyncSession, exclude_user_id: int, exclude_ids: List[int], limit: int
+) -> List[Book]:
+    stmt = select(Book).where(Book.user_id != exclude_user_id)
+    if exclude_ids:
+        stmt = stmt.where(Book.id.notin_(exclude_ids))
+    result = await session.scalars(stmt.order_by(Book.created_at.desc()).limit(limit))
+    return list(result)
+
+
+async def owner_with_most_books(
+    session: AsyncSession, user_id: Optional[int] = None
+) -> Optional[Tuple[User, int]]:
+    stmt = (
+        select(User, func.count(Book.id))
+        .join(Book, Book.user_id == User.id)
+        .group_by(User.id)
+        .order_by(func.count(Book.id).desc())
+        .limit(1)
+    )
+    if user_id is not None:
+        stmt = stmt.where(User.id == user_id)
+    row = (await session.execute(stmt)).first()
+    return tuple(row) if row else None
+
+
+async def most_popular_title(
+    session: AsyncSession, user_id: Optional[int] = None
+) -> Optional[Tuple[str, int]]:
+    stmt = select(Book.title, func.count(Book.id))
+    if user_id is not None:
+        stmt = stmt.where(Book.user_id == user_id)
+    stmt = stmt.group_by(Book.title).order_by(func.count(Book.id).desc()).limit(1)
+    row = (await session.execute(stmt)).first()
+    return tuple(row) if row else None
+
+
+async def first_with_title(
+    session: AsyncSession, title: str, user_id: Optional[int] = None
+) -> Optional[Book]:
+    stmt = select(Book).where(Book.title == title)
+    if user_id is not None:
+        stmt = stmt.where(Book.user_id == user_id)
+    return (await session.scalars(stmt.limit(1))).first()
+
+
+async def most_expensive(
+    session: AsyncSession, limit: int, user_id: Optional[int] = None
+) -> List[Book]:
+    stmt = select(Book).where(Book.price.isnot(None))
+    if user_id is not None:
+        stmt = stmt.where(Book.user_id == user_id)
+    result = await session.scalars(stmt.order_by(Book.price.desc()).limit(limit))
+    return list(result)
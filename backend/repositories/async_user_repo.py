@@ -0,0 +1,8 @@
+# repositories/async_user_repo.py
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import User
+
+
+async def get_user_by_id(session: AsyncSession, user_id: int) -> Optional[User]:
+    return await session.get(User, user_id)
@@ -1,19 +1,278 @@
 # repositories/book_repo.py
-from typing import List, Optional
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+from sqlalchemy import Integer, func, literal, null, select, type_coerce, union_all
+from sqlalchemy.sql import Select
+import suggest
 from extensions import db
-from models import Book
+from models import READING_STATUSES, Author, Book, BookChange, BookTicket, Genre
+from sharding import group_by_shard, is_sharded, needs_book_ids, next_book_ids, on_book_shard, on_shard, on_user_shard, scatter
+
+# Per-user functions run on the owner's shard; get_all_books reads every
+# shard and merges. Writes refresh the book before leaving the shard, so
+# callers never lazy-load a book outside it (see sharding.py).
+#
+# genre and author filters compare books.genre_id / author_id with the id of
+# the name's key (see Book.genre), status filters the small-int
+# reading_status.
+
+NEWEST_FIRST = (Book.created_at.desc(), Book.id.desc())
+
+
+def _criteria(genre: Optional[str], status: Optional[str], author: Optional[str]) -> Dict[str, Any]:
+    """{facet: WHERE clause} for the filters that are set."""
+    criteria = {}
+    if genre:
+        criteria["genre"] = Book.genre == genre
+    if status:
+        criteria["status"] = Book.reading_status == status
+    if author:
+        criteria["author"] = Book.author == author
+    return criteria
+
+
+def books_query(
+    user_id: Optional[int] = None,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Select:
+    """
+    The books (of `user_id`, when given) matching every filter, newest
+    first; `limit` and `offset` select a page. async_book_repo runs the same
+    statement, so the two listings filter alike.
+    """
+    owner = [Book.user_id == user_id] if user_id is not None else []
+    stmt = select(Book).where(*owner, *_criteria(genre, status, author).values()).order_by(*NEWEST_FIRST)
+    if limit is not None:
+        stmt = stmt.offset(offset).limit(limit)
+    return stmt
+
+
+def _books(stmt: Select) -> List[Book]:
+    return list(db.session.scalars(stmt))
+
+
+def get_books_for_user(
+    user_id: int,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[Book]:
+    """The user's books, newest first; `limit` and `offset` select a page."""
+    with on_user_shard(user_id):
+        return _books(books_query(user_id, genre, status, author, limit, offset))
+
+
+def get_all_books(
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> List[Book]:
+    """Every user's books, newest first; `limit` and `offset` select a page."""
+    if not is_sharded():
+        return _books(books_query(None, genre, status, author, limit, offset))
+    # the page is within the first offset + limit books of each shard
+    per_shard = scatter(_books, books_query(None, genre, status, author, None if limit is None else offset + limit))
+    merged = heapq.merge(*per_shard, key=lambda b: (b.created_at, b.id), reverse=True)
+    return list(islice(merged, offset, None if limit is None else offset + limit))
+
+
+def _lookup_counts_query(column, model, *criteria) -> Select:
+    # groups on the books' id column and joins the names to the grouped rows
+    counts = (
+        select(column.label("lookup_id"), func.count(Book.id).label("count"))
+        .where(column.isnot(None), *criteria)
+        .group_by(column)
+        .subquery()
+    )
+    return (
+        select(model.name, counts.c.count)
+        .join(counts, counts.c.lookup_id == model.id)
+        .order_by(counts.c.count.desc(), model.name)
+    )
+
+
+def genre_counts_query(*criteria) -> Select:
+    """
+    (genre name, book count) for the books matching `criteria`, most books
+    first. Groups on books.genre_id and joins the names to the grouped rows.
+    """
+    return _lookup_counts_query(Book.genre_id, Genre, *criteria)
+
 
+def get_genre_counts(*criteria) -> List[Tuple[str, int]]:
+    """genre_counts_query on the current shard."""
+    return [tuple(row) for row in db.session.execute(genre_counts_query(*criteria))]
 
-def get_books_for_user(user_id: int) -> List[Book]:
-    return Book.query.filter_by(user_id=user_id).order_by(Book.created_at.desc()).all()
 
+def get_value_counts(field: str, user_id: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    (value, book count) of every title, author or genre on the current shard,
+    of one user's books if given, for suggest.py.
+    """
+    criteria = [Book.user_id == user_id] if user_id is not None else []
+    if field == "title":
+        query = select(Book.title, func.count(Book.id)).where(*criteria).group_by(Book.title)
+    elif field == "author":
+        query = _lookup_counts_query(Book.author_id, Author, *criteria)
+    else:
+        query = genre_counts_query(*criteria)
+    return [tuple(row) for row in db.session.execute(query)]
 
-def get_all_books() -> List[Book]:
-    return Book.query.order_by(Book.created_at.desc()).all()
+
+def _facet_counts(facet: str, criteria: list, top: int) -> Select:
+    column, lookup = {
+        "genre": (Book.genre_id, Genre),
+        "status": (type_coerce(Book.reading_status, Integer), None),
+        "author": (Book.author_id, Author),
+    }[facet]
+    count = func.count(Book.id)
+    counts = (
+        select(column.label("value"), count.label("count"))
+        .where(column.isnot(None), *criteria)
+        .group_by(column)
+        .order_by(count.desc(), column)
+        .limit(top)
+        .subquery()
+    )
+    if lookup is None:
+        return select(literal(facet).label("facet"), counts.c.value, null().label("name"), counts.c.count)
+    return (
+        select(literal(facet).label("facet"), counts.c.value, lookup.name.label("name"), counts.c.count)
+        .join_from(counts, lookup, lookup.id == counts.c.value)
+    )
+
+
+def book_facets_query(
+    facets: List[str],
+    user_id: Optional[int] = None,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    top: int = 50,
+) -> Select:
+    """
+    How many books (of `user_id`, when given) match every filter, and for
+    each of `facets` (genre, status, author) its `top` values with their book
+    counts. A facet's counts leave out its own filter but apply the others,
+    so they show what choosing another value would give. Books without the
+    value are not counted. Read the rows with book_facets_from_rows().
+
+    One statement: the grouped queries, on the integer columns, are UNION ALL
+    parts, so the whole result costs one round trip.
+    """
+    owner = [Book.user_id == user_id] if user_id is not None else []
+    criteria = _criteria(genre, status, author)
+    matching = select(
+        literal("total").label("facet"),
+        null().label("value"),
+        null().label("name"),
+        func.count(Book.id).label("count"),
+    )
+    parts = [matching.where(*owner, *criteria.values())]
+    for facet in facets:
+        others = [clause for name, clause in criteria.items() if name != facet]
+        parts.append(_facet_counts(facet, owner + others, top))
+    # selected from as a subquery: the session routes (shard, replica) a
+    # SELECT by its tables, and is given no clause for a bare UNION
+    return select(union_all(*parts).subquery())
+
+
+def book_facets_from_rows(facets: List[str], rows) -> Tuple[int, Dict[str, List[Tuple[str, int]]]]:
+    """The total and {facet: [(value, count)]}, most books first, from book_facets_query rows."""
+    total = 0
+    counts: Dict[str, List[Tuple[str, int]]] = {facet: [] for facet in facets}
+    for facet, value, name, count in rows:
+        if facet == "total":
+            total = count
+        else:
+            counts[facet].append((READING_STATUSES[value] if facet == "status" else name, count))
+    # the union keeps no order across the joins
+    for values in counts.values():
+        values.sort(key=lambda item: (-item[1], item[0]))
+    return total, counts
+
+
+def get_book_facets(
+    facets: List[str],
+    user_id: Optional[int] = None,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    top: int = 50,
+) -> Tuple[int, Dict[str, List[Tuple[str, int]]]]:
+    """book_facets_query on the current shard: the total and each facet's top values."""
+    query = book_facets_query(facets, user_id, genre, status, author, top)
+    return book_facets_from_rows(facets, db.session.execute(query))
 
 
 def get_book_by_id(book_id: int) -> Optional[Book]:
-    return Book.query.get(book_id)
+    with on_book_shard(book_id):
+        return Book.query.get(book_id)
+
+
+def get_books_by_ids(book_ids: List[int]) -> List[Book]:
+    """Books with these ids on the current shard (callers group ids by shard)."""
+    if not book_ids:
+        return []
+    return Book.query.filter(Book.id.in_(book_ids)).all()
+
+
+# SQLite holds the database lock from a transaction's first write to its
+# commit, so its seqs commit in order and every entry is settled at once
+_SEQ_ORDERED_COMMITS = {"sqlite"}
+
+
+def settled(stmt, dialect: str, settle_seconds: float):
+    """
+    `stmt` limited to the change-log entries logged `settle_seconds` ago or
+    more. A seq is taken at INSERT, so a transaction can commit a lower one
+    after a higher one was read; by then every older write has committed.
+    """
+    if not settle_seconds or dialect in _SEQ_ORDERED_COMMITS:
+        return stmt
+    return stmt.where(BookChange.changed_at < datetime.utcnow() - timedelta(seconds=settle_seconds))
+
+
+def book_changes_query(
+    since: int, dialect: str, settle_seconds: float, user_id: Optional[int] = None, limit: int = 1000
+) -> Select:
+    """Settled change-log entries after `since`, oldest first. Shared with async_book_repo."""
+    stmt = select(BookChange).where(BookChange.seq > since)
+    if user_id is not None:
+        stmt = stmt.where(BookChange.user_id == user_id)
+    return settled(stmt, dialect, settle_seconds).order_by(BookChange.seq).limit(limit)
+
+
+def latest_change_seq_query(dialect: str, settle_seconds: float) -> Select:
+    """The newest settled change-log seq (NULL for an empty log). Shared with async_book_repo."""
+    return settled(select(func.max(BookChange.seq)), dialect, settle_seconds)
+
+
+def _settle_args() -> Tuple[str, float]:
+    dialect = db.session.get_bind(mapper=BookChange.__mapper__).dialect.name
+    return dialect, current_app.config.get("BOOK_CHANGES_SETTLE_SECONDS", 2.0)
+
+
+def get_book_changes(since: int, user_id: Optional[int] = None, limit: int = 1000) -> List[BookChange]:
+    """Settled change-log entries after `since` on the current shard, oldest first."""
+    return db.session.scalars(book_changes_query(since, *_settle_args(), user_id=user_id, limit=limit)).all()
+
+
+def get_latest_change_seq() -> int:
+    """The newest settled change-log seq on the current shard; 0 for an empty log."""
+    return db.session.scalar(latest_change_seq_query(*_settle_args())) or 0
 
 
 def create_book(
@@ -34,14 +293,75 @@ def create_book(
         pages=pages,
         reading_status=reading_status,
     )
-    db.session.add(book)
-    db.session.commit()
+    with on_user_shard(user_id):
+        db.session.add(book)
+        db.session.commit()
+        db.session.refresh(book)
+    suggest.record(added=[suggest.book_values(book)])
     return book
 
 
-def delete_book(book: Book) -> None:
-    db.session.delete(book)
+def create_books(rows: List[dict], tickets: Optional[List[str]] = None) -> List[int]:
+    """
+    Inserts many books, one transaction per shard, and returns their ids in
+    the order of `rows`. With `tickets` (one per row, see book_writer.py),
+    each book's BookTicket commits with it.
+
+    The INSERTs are batched only where the ids are known before the flush:
+    when sharded (handed out up front) or where the database returns
+    generated ids in parameter order (PostgreSQL). SQLite has RETURNING, but without that
+    order guarantee SQLAlchemy sends one INSERT ... RETURNING per row, as it
+    does on MySQL, which has no RETURNING. Either way the rows share a
+    single commit per shard. A failing shard raises after the shards before
+    it have committed.
+    """
+    ids = [None] * len(rows)
+    positions = group_by_shard(range(len(rows)), key=lambda i: rows[i]["user_id"])
+    for shard, indexes in positions.items():
+        batch = [Book(**rows[i]) for i in indexes]
+        with on_shard(shard):
+            connection = db.session.connection(bind_arguments={"mapper": Book.__mapper__})
+            if needs_book_ids(connection):
+                for book, book_id in zip(batch, next_book_ids(connection, shard, len(batch))):
+                    book.id = book_id
+            db.session.add_all(batch)
+            db.session.flush()
+            for i, book in zip(indexes, batch):
+                ids[i] = book.id
+            if tickets is not None:
+                db.session.add_all(
+                    BookTicket(ticket=tickets[i], user_id=rows[i]["user_id"], book_id=book.id)
+                    for i, book in zip(indexes, batch)
+                )
+            db.session.commit()
+        suggest.record(added=[rows[i] for i in indexes])
+    return ids
+
+
+def save_failed_ticket(ticket: str, user_id: int, error: str) -> None:
+    with on_user_shard(user_id):
+        db.session.add(BookTicket(ticket=ticket, user_id=user_id, error=error))
+        db.session.commit()
+
+
+def get_book_ticket(ticket: str) -> Optional[BookTicket]:
+    """On the owner's shard."""
+    return db.session.get(BookTicket, ticket)
+
+
+def prune_book_tickets(before: datetime) -> int:
+    """Delete the tickets settled before `before` on the current shard."""
+    deleted = BookTicket.query.filter(BookTicket.finished_at < before).delete(synchronize_session=False)
     db.session.commit()
+    return deleted
+
+
+def delete_book(book: Book) -> None:
+    with on_user_shard(book.user_id):
+        removed = suggest.book_values(book)
+        db.session.delete(book)
+        db.session.commit()
+    suggest.record(removed=[removed])
 
 
 def update_book(
@@ -54,6 +374,7 @@ def update_book(
     pages: int = None,
     reading_status: str = None,
 ) -> Book:
+    before = suggest.book_values(book)
     if title is not None:
         book.title = title
     if author is not None:
@@ -67,5 +388,8 @@ def update_book(
     if reading_status is not None:
         book.reading_status = reading_status
 
-    db.session.commit()
+    with on_user_shard(book.user_id):
+        db.session.commit()
+        db.session.refresh(book)
+    suggest.record(added=[suggest.book_values(book)], removed=[before])
     return book
@@ -1,7 +1,10 @@
 # repositories/user_repo.py
-from typing import Optional,List 
+from datetime import datetime
+from typing import Optional, List, Tuple
+from sqlalchemy import and_, func, or_
 from extensions import db
-from models import User
+from models import User, Book
+from sharding import is_sharded, scatter
 
 
 def get_user_by_email(email: str) -> Optional[User]:
@@ -23,6 +26,91 @@ def create_user(name: str, email: str, password: str, role: str = "user") -> Use
 def get_all_users() -> List[User]:
     return User.query.order_by(User.created_at.desc()).all()
 
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# newest first; users without a created_at come last, whichever end the
+# dialect sorts NULLs to
+_LISTING_ORDER = (User.created_at.is_(None), User.created_at.desc(), User.id.desc())
+
+
+def get_users_with_book_counts(
+    limit: Optional[int] = None,
+    after: Optional[Tuple[Optional[datetime], int]] = None,
+    search: Optional[str] = None,
+) -> List[Tuple[User, int]]:
+    """
+    Users newest first, each paired with their book count.
+
+    `after` is the (created_at, id) of the last row already seen (keyset
+    pagination); created_at may be None. `search` is a prefix matched against name or email; LIKE is
+    case-insensitive under the default MySQL collation and SQLite, and a
+    prefix pattern can use the name/email indexes.
+    """
+    page = db.session.query(User.id)
+    if search:
+        pattern = _escape_like(search) + "%"
+        page = page.filter(
+            or_(
+                User.name.like(pattern, escape="\\"),
+                User.email.like(pattern, escape="\\"),
+            )
+        )
+    if after:
+        created_at, user_id = after
+        if created_at is None:
+            page = page.filter(User.created_at.is_(None), User.id < user_id)
+        else:
+            page = page.filter(
+                or_(
+                    User.created_at < created_at,
+                    and_(User.created_at == created_at, User.id < user_id),
+                    User.created_at.is_(None),
+                )
+            )
+    page = page.order_by(*_LISTING_ORDER)
+    if limit is not None:
+        page = page.limit(limit)
+
+    page = page.subquery()
+    if is_sharded():
+        users = (
+            User.query.join(page, page.c.id == User.id)
+            .order_by(*_LISTING_ORDER)
+            .all()
+        )
+        return _with_sharded_book_counts(users)
+
+    return (
+        db.session.query(User, func.count(Book.id))
+        .join(page, page.c.id == User.id)
+        .outerjoin(Book, Book.user_id == User.id)
+        .group_by(User.id)
+        .order_by(*_LISTING_ORDER)
+        .all()
+    )
+
+
+def _book_counts(user_ids: List[int]) -> List[Tuple[int, int]]:
+    return (
+        db.session.query(Book.user_id, func.count(Book.id))
+        .filter(Book.user_id.in_(user_ids))
+        .group_by(Book.user_id)
+        .all()
+    )
+
+
+def _with_sharded_book_counts(users: List[User]) -> List[Tuple[User, int]]:
+    """Books can't be joined across databases: count them on every shard in parallel."""
+    counts = {}
+    if users:
+        for rows in scatter(_book_counts, [u.id for u in users]):
+            counts.update(rows)
+    return [(user, counts.get(user.id, 0)) for user in users]
+
+
 def save_user(user: User) -> User:
     """Utility to commit changes after updating a user."""
     db.session.add(user)
@@ -1,31 +1,45 @@
 # routes/admin_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify, send_from_directory
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import User
+import book_events
 from extensions import db
+from cache import cached_response
+from db_routing import read_replica
+from query_budget import query_budget
 from services.auth_service import get_user_or_raise
+from services.book_service import BookError, open_book_stream_for_user
 from services.admin_service import (
     AdminError,
+    MAX_USERS_PAGE,
     list_users_admin,
     update_user_role_admin,
     delete_user_admin,
     update_user_admin,
     list_books_admin,
+    get_admin_summary,
+    bulk_update_role_admin,
+    bulk_delete_users_admin,
+    bulk_delete_books_admin,
 )
 
 admin_bp = Blueprint("admin", __name__)
 
 
 # Small helpers to serialize models → JSON
+# (Decimal and datetime values are encoded by json_provider)
 
-def _serialize_user(user):
-    return {
+def _serialize_user(user, book_count=None):
+    data = {
         "id": user.id,
         "name": user.name,
         "email": user.email,
         "role": user.role,
-        "created_at": user.created_at.isoformat() if user.created_at else None,
+        "created_at": user.created_at,
     }
+    if book_count is not None:
+        data["book_count"] = int(book_count)
+    return data
 
 
 def _serialize_book(book):
@@ -34,34 +48,78 @@ def _serialize_book(book):
         "title": book.title,
         "author": book.author,
         "genre": book.genre,
-        "price": float(book.price) if book.price is not None else None,
+        "price": book.price,
         "pages": book.pages,
         "reading_status": book.reading_status,
         "user_id": book.user_id,
-        "created_at": book.created_at.isoformat() if book.created_at else None,
+        "created_at": book.created_at,
     }
 
 
+# -----------------------------------------------------------------------------
+# SUMMARY (Admin only)
+# -----------------------------------------------------------------------------
+
+@admin_bp.get("/summary")
+@jwt_required()
+@read_replica
+@query_budget(2, per_shard=1)  # the book roll-up runs on each shard
+def admin_summary_route():
+    """Users by role, books by status/genre and price/page totals in one response."""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    try:
+        summary = get_admin_summary(current_user)
+    except AdminError as e:
+        return jsonify({"message": str(e)}), 403
+
+    return jsonify(summary), 200
+
+
 # -----------------------------------------------------------------------------
 # USERS (Admin only)
 # -----------------------------------------------------------------------------
 
 @admin_bp.get("/users")
 @jwt_required()
+@read_replica
+@query_budget(1, per_shard=1)  # the page of users, their book counts on each shard
 def list_users_route():
+    """
+    List users with their book counts.
+    Optional: ?q=<name/email prefix>&limit=50&cursor=<next_cursor>
+    With limit or cursor the response is {"items": [...], "next_cursor": ...};
+    otherwise a plain list of every matching user.
+    """
     current_user_id = int(get_jwt_identity())
     current_user = get_user_or_raise(current_user_id)
 
+    cursor = request.args.get("cursor")
+    search = request.args.get("q")
+    limit = request.args.get("limit", type=int)
+    paginated = limit is not None or cursor is not None
+    if paginated and limit is None:
+        limit = MAX_USERS_PAGE
+
     try:
-        users = list_users_admin(current_user)
+        rows, next_cursor = list_users_admin(
+            current_user, limit=limit, cursor=cursor, search=search
+        )
     except AdminError as e:
         return jsonify({"message": str(e)}), 403
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
 
-    return jsonify([_serialize_user(u) for u in users]), 200
+    items = [_serialize_user(u, count) for u, count in rows]
+    if paginated:
+        return jsonify({"items": items, "next_cursor": next_cursor}), 200
+    return jsonify(items), 200
 
 
 @admin_bp.post("/users")
 @jwt_required()
+@query_budget(8)  # register_user commits, then the role does
 def admin_create_user():
     """Admin-only: create a new user."""
     current_user_id = int(get_jwt_identity())
@@ -94,6 +152,7 @@ def admin_create_user():
 
 @admin_bp.patch("/users/<int:user_id>")
 @jwt_required()
+@query_budget(5)
 def admin_update_user(user_id: int):
     current_user_id = int(get_jwt_identity())
     current_user = get_user_or_raise(current_user_id)
@@ -109,6 +168,7 @@ def admin_update_user(user_id: int):
 
 @admin_bp.delete("/users/<int:user_id>")
 @jwt_required()
+@query_budget(9)
 def admin_delete_user(user_id: int):
     current_user_id = int(get_jwt_identity())
     current_user = get_user_or_raise(current_user_id)
@@ -120,12 +180,48 @@ def admin_delete_user(user_id: int):
 
     return jsonify({"message": "User deleted"}), 200
 
+@admin_bp.post("/users/bulk-role")
+@jwt_required()
+@query_budget(5)
+def admin_bulk_role():
+    """Body: {"ids": [1, 2, 3], "role": "admin"}"""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+    data = request.get_json() or {}
+
+    try:
+        results = bulk_update_role_admin(current_user, data.get("ids"), data.get("role"))
+    except AdminError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({"results": results}), 200
+
+
+@admin_bp.post("/users/bulk-delete")
+@jwt_required()
+@query_budget(4, per_shard=3)  # per shard: log the deletes, delete the books
+def admin_bulk_delete_users():
+    """Body: {"ids": [1, 2, 3]}"""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+    data = request.get_json() or {}
+
+    try:
+        results = bulk_delete_users_admin(current_user, data.get("ids"))
+    except AdminError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({"results": results}), 200
+
 # -----------------------------------------------------------------------------
 # BOOKS (Admin only)
 # -----------------------------------------------------------------------------
 
 @admin_bp.get("/books")
 @jwt_required()
+@cached_response("books", "users", shared=True)
+@read_replica
+@query_budget(1, per_shard=1)
 def list_admin_books_route():
     """
     List all books for admin dashboard.
@@ -145,8 +241,28 @@ def list_admin_books_route():
     return jsonify([_serialize_book(b) for b in books]), 200
 
 
+@admin_bp.get("/books/stream")
+@jwt_required()
+@query_budget(1)
+def admin_stream_books():
+    """Admin-only: live create/update/delete events for every book (SSE); asgi_app.py serves it too."""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify({"message": "Not authorized"}), 403
+
+    try:
+        subscription = open_book_stream_for_user(current_user)
+    except BookError as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "5"}
+
+    return book_events.event_stream(subscription)
+
+
 @admin_bp.delete("/books/<int:book_id>")
 @jwt_required()
+@query_budget(5)
 def admin_delete_book(book_id: int):
     """Admin-only: delete any book."""
     current_user_id = int(get_jwt_identity())
@@ -162,3 +278,108 @@ def admin_delete_book(book_id: int):
     except Exception as e:
         return jsonify({"message": str(e)}), 400
 
+
+@admin_bp.post("/books/bulk-delete")
+@jwt_required()
+@query_budget(2, per_shard=4)  # per shard: find the ids, log the deletes, delete
+def admin_bulk_delete_books():
+    """Body: {"ids": [1, 2, 3]}"""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+    data = request.get_json() or {}
+
+    try:
+        results = bulk_delete_books_admin(current_user, data.get("ids"))
+    except AdminError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({"results": results}), 200
+
+
+# -----------------------------------------------------------------------------
+# SLOW QUERIES (Admin only)
+# -----------------------------------------------------------------------------
+
+@admin_bp.get("/slow-queries")
+@jwt_required()
+@query_budget(1)
+def admin_slow_queries():
+    """
+    Slow statement shapes by total time, each with its slowest occurrence
+    (endpoint, service function, params hash, EXPLAIN). Optional: ?limit=20
+    """
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify({"message": "Not authorized"}), 403
+
+    log = current_app.extensions.get("slow_query_log")
+    if log is None:
+        return jsonify({"message": "Slow-query log is disabled"}), 404
+
+    limit = min(max(request.args.get("limit", default=20, type=int), 1), 200)
+    return jsonify({"threshold_ms": log.threshold_ms, "shapes": log.top(limit)}), 200
+
+
+@admin_bp.delete("/slow-queries")
+@jwt_required()
+@query_budget(1)
+def admin_reset_slow_queries():
+    """Start a fresh aggregate, e.g. after deploying a fix."""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify({"message": "Not authorized"}), 403
+
+    log = current_app.extensions.get("slow_query_log")
+    if log is None:
+        return jsonify({"message": "Slow-query log is disabled"}), 404
+
+    log.reset()
+    return jsonify({"message": "Slow-query log cleared"}), 200
+
+
+# -----------------------------------------------------------------------------
+# PROFILES (Admin only)
+# -----------------------------------------------------------------------------
+
+@admin_bp.get("/profiles")
+@jwt_required()
+@query_budget(1)
+def admin_list_profiles():
+    """Saved request profiles, newest first, plus the sampling settings."""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify({"message": "Not authorized"}), 403
+
+    profiler = current_app.extensions.get("profiler")
+    if profiler is None:
+        return jsonify({"message": "Profiling is disabled"}), 404
+
+    return jsonify({
+        "profiles": profiler.list_profiles(),
+        "sampling": profiler.sampling(),
+    }), 200
+
+
+@admin_bp.get("/profiles/<path:filename>")
+@jwt_required()
+@query_budget(1)
+def admin_download_profile(filename: str):
+    """One profile file, e.g. <id>.prof or <id>.mem.txt."""
+    current_user_id = int(get_jwt_identity())
+    current_user = get_user_or_raise(current_user_id)
+
+    if not current_user.is_admin:
+        return jsonify({"message": "Not authorized"}), 403
+
+    profiler = current_app.extensions.get("profiler")
+    if profiler is None:
+        return jsonify({"message": "Profiling is disabled"}), 404
+
+    # send_from_directory refuses paths that escape the directory
+    return send_from_directory(profiler.directory, filename, as_attachment=True)
@@ -1,8 +1,11 @@
 # routes/ai_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from services.ai_service import handle_ai_query, AIError, get_recommendations, get_insights
+from cache import cached_response
+from db_routing import read_replica
+from query_budget import query_budget
 from services.auth_service import get_user_or_raise
 
 ai_bp = Blueprint("ai", __name__)
@@ -10,6 +13,8 @@ ai_bp = Blueprint("ai", __name__)
 
 @ai_bp.post("/query")
 @jwt_required()
+@read_replica
+@query_budget(1, per_shard=2)
 def ai_query():
     """
     AI query endpoint with user authorization.
@@ -30,14 +35,17 @@ def ai_query():
         return jsonify(result), 200
     except AIError as e:
         return jsonify({"message": str(e)}), 400
-    except Exception as e:
+    except Exception:
         # Log error but don't expose details
-        print(f"AI query error: {e}")  # In production, use proper logging
+        current_app.logger.exception("AI query failed")
         return jsonify({"message": "An unexpected error occurred."}), 500
 
 
 @ai_bp.get("/recommendations")
 @jwt_required()
+@cached_response("books", "users", shared=True)  # the library-wide genres
+@read_replica
+@query_budget(3, per_shard=2)
 def ai_recommendations():
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
@@ -53,6 +61,9 @@ def ai_recommendations():
 
 @ai_bp.get("/insights")
 @jwt_required()
+@cached_response("books", "users", shared=True)  # the library-wide genres
+@read_replica
+@query_budget(9, per_shard=1)  # the most popular genre is counted on every shard
 def ai_insights():
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
@@ -4,6 +4,7 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from extensions import db
 from models import User
+from query_budget import query_budget
 from services import auth_service
 from services.auth_service import AuthError, register_user, authenticate_user, get_user_or_raise
 from flask_jwt_extended import (
@@ -66,6 +67,7 @@ auth_bp = Blueprint("auth", __name__)
 
 
 @auth_bp.post("/register")
+@query_budget(3)
 def register():
     data = request.get_json() or {}
     errors = validate_register_payload(data)
@@ -87,6 +89,7 @@ def register():
 
 
 @auth_bp.post("/login")
+@query_budget(1)
 def login():
     data = request.get_json() or {}
     errors = validate_login_payload(data)
@@ -122,6 +125,7 @@ def login():
 
 @auth_bp.get("/me")
 @jwt_required()
+@query_budget(1)
 def me():
     current_user_id = int(get_jwt_identity())
     try:
@@ -1,12 +1,23 @@
 # routes/book_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
+import book_events
+from cache import cached_response
+from db_routing import read_replica
+from query_budget import query_budget
 from services.auth_service import get_user_or_raise
 from services.book_service import (
     list_books_for_user,
     list_books_for_admin,
+    search_books_for_user,
+    parse_facets,
+    suggest_for_user,
+    list_book_changes_for_user,
+    open_book_stream_for_user,
     create_book_for_user,
+    submit_book_for_user,
+    get_book_ticket_for_user,
     update_book_for_user,
     delete_book_for_user,
     BookError,
@@ -16,18 +27,33 @@ book_bp = Blueprint("books", __name__)
 
 
 def serialize_book(b):
+    # price stays a Decimal; json_provider encodes it as a number
     return {
         "id": b.id,
         "title": b.title,
         "author": b.author,
         "genre": b.genre,
-        "price": float(b.price) if b.price is not None else None,
+        "price": b.price,
         "pages": b.pages,
         "reading_status": b.reading_status,
         "user_id": b.user_id,
     }
 
 
+def serialize_book_page(page):
+    """A search_books_for_user result as the listing's paged response body."""
+    return {
+        "items": [serialize_book(b) for b in page["books"]],
+        "total": page["total"],
+        "limit": page["limit"],
+        "offset": page["offset"],
+        "facets": {
+            facet: [{"value": value, "count": count} for value, count in values]
+            for facet, values in page["facets"].items()
+        },
+    }
+
+
 # -----------------------------------------------------------
 # LIST BOOKS
 # -----------------------------------------------------------
@@ -35,32 +61,120 @@ def serialize_book(b):
 
 @book_bp.get("/")
 @jwt_required()
+@cached_response("books", "users")
+@read_replica
+@query_budget(1, per_shard=2)  # the user; the page and the facets on each shard
 def list_books():
+    """
+    Optional filters: ?genre=Fantasy&status=reading&author=...
+    Optional: ?facets=genre,status,author&limit=50&offset=0
+    With facets or limit the response is {"items": [...], "total",
+    "limit", "offset", "facets": {"genre": [{"value", "count"}, ...]}};
+    otherwise a plain list of every matching book.
+    """
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
 
-    # Optional filters from query params: ?genre=Fantasy&status=reading
     genre = request.args.get("genre")
     status = request.args.get("status")
+    author = request.args.get("author")
 
-    books = list_books_for_user(user, genre=genre, status=status)
-
-    result = []
-    for b in books:
-        result.append(
-            {
-                "id": b.id,
-                "title": b.title,
-                "author": b.author,
-                "genre": b.genre,
-                "price": float(b.price) if b.price is not None else None,
-                "pages": b.pages,
-                "reading_status": b.reading_status,
-                "user_id": b.user_id,
-            }
+    if "facets" not in request.args and "limit" not in request.args:
+        books = list_books_for_user(user, genre=genre, status=status, author=author)
+        return jsonify([serialize_book(b) for b in books]), 200
+
+    try:
+        page = search_books_for_user(
+            user,
+            genre=genre,
+            status=status,
+            author=author,
+            facets=parse_facets(request.args.get("facets")),
+            limit=request.args.get("limit", type=int),
+            offset=request.args.get("offset", default=0, type=int),
         )
+    except BookError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify(serialize_book_page(page)), 200
+
+
+# -----------------------------------------------------------
+# SUGGESTIONS (type-ahead)
+# -----------------------------------------------------------
+
+
+@book_bp.get("/suggest")
+@jwt_required()
+@read_replica
+@query_budget(1, per_shard=1)  # the user; the first lookup of a field builds its index from each shard
+def suggest_books():
+    """
+    ?field=title|author|genre&prefix=fr&limit=10
+    Returns {"field", "prefix", "suggestions": [{"value", "count"}, ...]},
+    most books first.
+    """
+    current_user_id = int(get_jwt_identity())
+    user = get_user_or_raise(current_user_id)
+
+    field = request.args.get("field", "")
+    prefix = request.args.get("prefix", "")
+    try:
+        suggestions = suggest_for_user(user, field, prefix, limit=request.args.get("limit", type=int))
+    except BookError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({
+        "field": field,
+        "prefix": prefix,
+        "suggestions": [{"value": value, "count": count} for value, count in suggestions],
+    }), 200
+
+
+# -----------------------------------------------------------
+# CHANGES SINCE A SEQUENCE NUMBER
+# -----------------------------------------------------------
+
+
+@book_bp.get("/changes")
+@jwt_required()
+@read_replica
+@query_budget(1, per_shard=2)  # the user; the log and the changed books on each shard
+def list_book_changes():
+    current_user_id = int(get_jwt_identity())
+    user = get_user_or_raise(current_user_id)
+
+    try:
+        limit = int(request.args.get("limit", 1000))
+        changes = list_book_changes_for_user(user, since=request.args.get("since"), limit=limit)
+    except ValueError:
+        return jsonify({"message": "limit must be an integer."}), 400
+    except BookError as e:
+        return jsonify({"message": str(e)}), 400
 
-    return jsonify(result), 200
+    changes["books"] = [serialize_book(b) for b in changes["books"]]
+    return jsonify(changes), 200
+
+
+# -----------------------------------------------------------
+# LIVE EVENTS (SSE)
+# -----------------------------------------------------------
+
+
+@book_bp.get("/stream")
+@jwt_required()
+@query_budget(1)
+def stream_books():
+    """Fallback for deployments without asgi_app.py, which serves streams without a thread each."""
+    current_user_id = int(get_jwt_identity())
+    user = get_user_or_raise(current_user_id)
+
+    try:
+        subscription = open_book_stream_for_user(user)
+    except BookError as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "5"}
+
+    return book_events.event_stream(subscription)
 
 
 # -----------------------------------------------------------
@@ -68,6 +182,8 @@ def list_books():
 # -----------------------------------------------------------
 @book_bp.post("/")
 @jwt_required()
+# a genre or author new to the database adds a SELECT and an INSERT each (see lookups.py)
+@query_budget(9)
 def create_book_route():
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
@@ -75,6 +191,13 @@ def create_book_route():
     data = request.get_json() or {}
 
     try:
+        # ?async=1: validate now, insert with the next batch (book_writer.py)
+        if request.args.get("async"):
+            ticket = submit_book_for_user(user, data)
+            if ticket is not None:
+                location = url_for("books.book_ticket_route", ticket=ticket)
+                return jsonify({"ticket": ticket, "status": "queued"}), 202, {"Location": location}
+            # queue full: write it now instead
         book = create_book_for_user(user, data)
     except BookError as e:
         return jsonify({"message": str(e)}), 400
@@ -82,11 +205,30 @@ def create_book_route():
     return jsonify(serialize_book(book)), 201
 
 
+@book_bp.get("/tickets/<ticket>")
+@jwt_required()
+@query_budget(3)  # the user, the ticket's row, the book
+def book_ticket_route(ticket: str):
+    current_user_id = int(get_jwt_identity())
+    user = get_user_or_raise(current_user_id)
+
+    try:
+        status = get_book_ticket_for_user(user, ticket)
+    except BookError as e:
+        return jsonify({"message": str(e)}), 404
+
+    if status["book"] is not None:
+        status["book"] = serialize_book(status["book"])
+    return jsonify(status), 200
+
+
 # -----------------------------------------------------------
 # UPDATE BOOK
 # -----------------------------------------------------------
 @book_bp.put("/<int:book_id>")
 @jwt_required()
+# as for create: up to two statements per new genre or author
+@query_budget(10)
 def update_book_route(book_id: int):
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
@@ -105,6 +247,7 @@ def update_book_route(book_id: int):
 # -----------------------------------------------------------
 @book_bp.delete("/<int:book_id>")
 @jwt_required()
+@query_budget(5)
 def delete_book_route(book_id: int):
     current_user_id = int(get_jwt_identity())
     user = get_user_or_raise(current_user_id)
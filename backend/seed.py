@@ -0,0 +1,151 @@
+# seed.py
+"""
+Synthetic library data for benchmarks and local load testing.
+
+    flask --app library_app seed --users 1000 --books 100000
+
+Genres, authors and titles are skewed the way a real catalogue is (a few
+popular genres, a long tail of authors, some titles owned by many users), so
+the grouped AI/admin queries see realistic cardinalities. Rows go in with
+executemany inserts in batches; every user shares one pre-computed password
+hash, since hashing is far slower than inserting.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert
+from werkzeug.security import generate_password_hash
+
+from extensions import db
+from models import Author, Book, Genre, User, lookup_key
+from change_log import record_bulk_inserts
+from lookups import lookup_ids
+from sharding import create_shard_tables, group_by_shard, is_sharded, next_book_ids, on_shard, shard_count
+
+SEED_PASSWORD = "Seed123!@#"
+
+GENRES = {
+    "Fiction": 22, "Fantasy": 14, "Mystery": 12, "Sci-Fi": 10, "Romance": 10,
+    "Thriller": 8, "History": 6, "Biography": 5, "Classic": 5, "Horror": 3,
+    "Poetry": 2, "Philosophy": 2, "Travel": 1,
+}
+STATUSES = {"planned": 50, "reading": 20, "completed": 30}
+FIRST = ["Ana", "Ben", "Clara", "Dan", "Elif", "Faris", "Greta", "Hugo", "Ines", "Jon",
+         "Kaia", "Liam", "Mira", "Noah", "Olga", "Pavel", "Rosa", "Sami", "Tara", "Uma"]
+LAST = ["Berisha", "Hoxha", "Smith", "Garcia", "Müller", "Rossi", "Kowalski", "Novak",
+        "Ivanova", "Dubois", "Silva", "Jensen", "Kaya", "Tanaka", "Osei", "Nguyen"]
+WORDS = ["Shadow", "River", "Glass", "Winter", "Crown", "Garden", "Silent", "Iron", "Last",
+         "Hidden", "Golden", "Storm", "City", "Letters", "Night", "House", "Sea", "Fire",
+         "Memory", "Road", "Stone", "Empire", "Song", "Island"]
+
+
+def _weighted(rng: random.Random, weights: Dict[str, int], k: int):
+    return rng.choices(list(weights), weights=list(weights.values()), k=k)
+
+
+def _skewed_index(rng: random.Random, n: int, skew: float) -> int:
+    """Index in [0, n) biased towards 0; skew=1 is uniform, larger is more top-heavy."""
+    return int(n * rng.random() ** skew)
+
+
+def seed_library(users: int, books: int, batch_size: int = 5000, seed: int = 0) -> Dict[str, int]:
+    """Insert `users` users and `books` books spread across them. Returns row counts."""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    password_hash = generate_password_hash(SEED_PASSWORD)
+    offset = db.session.query(func.coalesce(func.max(User.id), 0)).scalar()
+
+    for start in range(0, users, batch_size):
+        rows = []
+        for i in range(start, min(start + batch_size, users)):
+            n = offset + i + 1
+            rows.append({
+                "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                "email": f"reader{n}@seed.local",
+                "password_hash": password_hash,
+                "role": "admin" if i % 100 == 0 else "user",
+                "created_at": now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+            })
+        db.session.execute(insert(User), rows)
+        db.session.commit()
+
+    user_ids = [
+        row[0] for row in db.session.query(User.id).filter(User.id > offset).order_by(User.id)
+    ]
+    if not user_ids:
+        return {"users": 0, "books": 0}
+
+    authors = [f"{rng.choice(FIRST)} {rng.choice(LAST)}" for _ in range(max(50, books // 40))]
+    titles = [
+        f"The {rng.choice(WORDS)} {rng.choice(WORDS)}" if rng.random() < 0.5
+        else f"{rng.choice(WORDS)} of {rng.choice(WORDS)}"
+        for _ in range(max(100, books // 8))
+    ]
+
+    for start in range(0, books, batch_size):
+        count = min(batch_size, books - start)
+        genres = _weighted(rng, GENRES, count)
+        statuses = _weighted(rng, STATUSES, count)
+        rows = []
+        for j in range(count):
+            rows.append({
+                # heavy readers own many books, most users only a few
+                "user_id": user_ids[_skewed_index(rng, len(user_ids), 2)],
+                "title": titles[_skewed_index(rng, len(titles), 3)],
+                "author": authors[_skewed_index(rng, len(authors), 2)],
+                "genre": genres[j] if rng.random() > 0.03 else None,
+                "price": round(min(rng.lognormvariate(2.7, 0.5), 250), 2) if rng.random() > 0.1 else None,
+                "pages": max(40, int(rng.gauss(320, 120))) if rng.random() > 0.05 else None,
+                "reading_status": statuses[j],
+                "created_at": now - timedelta(minutes=rng.randint(0, 3 * 365 * 24 * 60)),
+            })
+        _insert_books(rows)
+        db.session.commit()
+
+    # executemany skips the change-log listener; log the new books as created
+    for shard in range(shard_count()) if is_sharded() else [None]:
+        with on_shard(shard):
+            record_bulk_inserts(db.session)
+    db.session.commit()
+
+    return {"users": len(user_ids), "books": books}
+
+
+def _insert_books(rows) -> None:
+    """
+    One executemany per shard; sharded rows get their shard's ids up front.
+    Genre and author names become ids on the shard, like a flush does.
+    """
+    for shard, shard_rows in group_by_shard(rows, key=lambda row: row["user_id"]).items():
+        with on_shard(shard):
+            for name, column, model in (("genre", "genre_id", Genre), ("author", "author_id", Author)):
+                ids = lookup_ids(db.session, model, {row[name] for row in shard_rows if row[name]})
+                for row in shard_rows:
+                    value = row.pop(name)
+                    row[column] = ids[lookup_key(value)] if value else None
+            if shard is not None:
+                connection = db.session.connection(bind_arguments={"mapper": Book.__mapper__})
+                for row, book_id in zip(shard_rows, next_book_ids(connection, shard, len(shard_rows))):
+                    row["id"] = book_id
+            db.session.execute(insert(Book), shard_rows)
+
+
+@click.command("seed")
+@click.option("--users", default=100, show_default=True, help="Users to create.")
+@click.option("--books", default=2000, show_default=True, help="Books to create.")
+@click.option("--batch-size", default=5000, show_default=True)
+@click.option("--seed", "random_seed", default=0, show_default=True, help="Random seed.")
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first.")
+@with_appcontext
+def seed_command(users, books, batch_size, random_seed, reset):
+    """Generate synthetic users and books."""
+    if reset:
+        db.drop_all()
+        db.create_all()
+        create_shard_tables(drop_first=True)
+    counts = seed_library(users, books, batch_size=batch_size, seed=random_seed)
+    click.echo(f"Seeded {counts['users']} users and {counts['books']} books "
+               f"(password for every user: {SEED_PASSWORD})")
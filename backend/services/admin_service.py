@@ -1,13 +1,20 @@
 # services/admin_service.py
-from typing import List, Optional
-from models import User, Book
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, select
+from models import User, Book, Genre
 from extensions import db
+from cache import cached_until_write
+from change_log import record_deletes
+import suggest
 from repositories.user_repo import (
-    get_all_users,
     get_user_by_id,
+    get_users_with_book_counts,
     save_user,
 )
 from repositories.book_repo import get_all_books
+from sharding import group_by_shard, on_shard, on_user_shard, scatter
 from services.book_service import ALLOWED_STATUSES  # reuse your constant
 
 
@@ -24,9 +31,53 @@ def _require_admin(current_user: User) -> None:
 # USERS
 # -----------------------------------------------------------------------------
 
-def list_users_admin(current_user: User) -> List[User]:
+MAX_USERS_PAGE = 100
+
+
+def _encode_cursor(user: User) -> str:
+    created_at = user.created_at.isoformat() if user.created_at else ""
+    raw = f"{created_at}|{user.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(created_at) if created_at else None), int(user_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+
+
+def list_users_admin(
+    current_user: User,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    search: Optional[str] = None,
+) -> Tuple[List[Tuple[User, int]], Optional[str]]:
+    """
+    Admin user listing with per-user book counts.
+    Returns (rows, next_cursor); without a limit every matching user is
+    returned and next_cursor is None.
+    """
     _require_admin(current_user)
-    return get_all_users()
+
+    if limit is not None:
+        limit = max(1, min(limit, MAX_USERS_PAGE))
+    after = _decode_cursor(cursor) if cursor else None
+    search = (search or "").strip() or None
+
+    # fetch one extra row to learn whether another page exists
+    rows = get_users_with_book_counts(
+        limit=limit + 1 if limit is not None else None,
+        after=after,
+        search=search,
+    )
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1][0])
+    return rows, next_cursor
 
 
 def update_user_role_admin(current_user: User, target_user_id: int, new_role: str) -> User:
@@ -88,12 +139,138 @@ def delete_user_admin(current_user: User, target_user_id: int) -> None:
     if not user:
         raise AdminError("User not found")
 
-    # Delete all this user's books first
-    Book.query.filter_by(user_id=user.id).delete()
+    with on_user_shard(user.id):
+        # Delete all this user's books first
+        record_deletes(db.session, Book.user_id == user.id)
+        Book.query.filter_by(user_id=user.id).delete()
+
+        # Then delete the user
+        db.session.delete(user)
+        db.session.commit()
+    suggest.forget([user.id])
+
+# -----------------------------------------------------------------------------
+# BULK OPERATIONS
+# -----------------------------------------------------------------------------
+# Each bulk call runs one SELECT to find the existing ids, then one UPDATE or
+# DELETE per table with an IN (...) list, all inside a single transaction.
+# Book deletes are logged first: a SELECT of the ids, one INSERT (change_log.py).
+
+MAX_BULK_IDS = 1000
+
+
+def _normalize_ids(ids) -> List[int]:
+    if not isinstance(ids, list) or not ids:
+        raise AdminError("ids must be a non-empty list.")
+    if len(ids) > MAX_BULK_IDS:
+        raise AdminError(f"At most {MAX_BULK_IDS} ids per request.")
+    try:
+        # dict.fromkeys dedupes while keeping request order
+        return list(dict.fromkeys(int(i) for i in ids))
+    except (TypeError, ValueError):
+        raise AdminError("ids must be integers.")
+
+
+def _existing_ids(column, ids: List[int]) -> set:
+    return {row[0] for row in db.session.query(column).filter(column.in_(ids)).all()}
+
+
+def _run_bulk(apply) -> None:
+    try:
+        apply()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def bulk_update_role_admin(current_user: User, user_ids, new_role: str) -> List[Dict[str, Any]]:
+    """Set the role of many users at once. Admins cannot change their own role here."""
+    _require_admin(current_user)
+
+    new_role = (new_role or "").strip().lower()
+    if new_role not in {"user", "admin"}:
+        raise AdminError("Invalid role. Allowed values: 'user', 'admin'.")
+
+    ids = _normalize_ids(user_ids)
+    existing = _existing_ids(User.id, ids)
+    targets = [i for i in ids if i in existing and i != current_user.id]
+
+    if targets:
+        _run_bulk(
+            lambda: User.query.filter(User.id.in_(targets)).update(
+                {User.role: new_role}, synchronize_session=False
+            )
+        )
+
+    return [
+        {
+            "id": i,
+            "status": "not_found" if i not in existing
+            else "skipped_self" if i == current_user.id
+            else "updated",
+        }
+        for i in ids
+    ]
+
+
+def bulk_delete_users_admin(current_user: User, user_ids) -> List[Dict[str, Any]]:
+    """Delete many users and their books. Admins cannot delete themselves."""
+    _require_admin(current_user)
+
+    ids = _normalize_ids(user_ids)
+    existing = _existing_ids(User.id, ids)
+    targets = [i for i in ids if i in existing and i != current_user.id]
+
+    def apply():
+        for shard, owners in group_by_shard(targets, by="user").items():
+            with on_shard(shard):
+                record_deletes(db.session, Book.user_id.in_(owners))
+                Book.query.filter(Book.user_id.in_(owners)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(targets)).delete(synchronize_session=False)
+
+    if targets:
+        _run_bulk(apply)
+        suggest.forget(targets)
+
+    return [
+        {
+            "id": i,
+            "status": "not_found" if i not in existing
+            else "skipped_self" if i == current_user.id
+            else "deleted",
+        }
+        for i in ids
+    ]
+
+
+def bulk_delete_books_admin(current_user: User, book_ids) -> List[Dict[str, Any]]:
+    """Delete many books regardless of owner."""
+    _require_admin(current_user)
+
+    ids = _normalize_ids(book_ids)
+    by_shard = group_by_shard(ids, by="book")
+    existing = set()
+    for shard, shard_ids in by_shard.items():
+        with on_shard(shard):
+            existing |= _existing_ids(Book.id, shard_ids)
+
+    owners = set()
+
+    def apply():
+        for shard, shard_ids in by_shard.items():
+            targets = [i for i in shard_ids if i in existing]
+            if targets:
+                with on_shard(shard):
+                    owners.update(record_deletes(db.session, Book.id.in_(targets)))
+                    Book.query.filter(Book.id.in_(targets)).delete(synchronize_session=False)
+
+    if existing:
+        _run_bulk(apply)
+        suggest.forget(owners)
+
+    return [{"id": i, "status": "deleted" if i in existing else "not_found"} for i in ids]
 
-    # Then delete the user
-    db.session.delete(user)
-    db.session.commit()
 
 # -----------------------------------------------------------------------------
 # BOOKS
@@ -110,18 +287,103 @@ def list_books_admin(
     """
     _require_admin(current_user)
 
-    books = get_all_books()
-
-    if genre:
-        genre = genre.strip().lower()
-        books = [b for b in books if (b.genre or "").lower() == genre]
-
+    genre = (genre or "").strip() or None
     if status:
         status = status.strip().lower()
         if status not in ALLOWED_STATUSES:
             raise AdminError(
                 "Invalid status. Allowed values: planned, reading, completed."
             )
-        books = [b for b in books if (b.reading_status or "").lower() == status]
 
-    return books
+    return get_all_books(genre=genre, status=status or None)
+
+
+# -----------------------------------------------------------------------------
+# SUMMARY
+# -----------------------------------------------------------------------------
+
+def _book_rollup_rows():
+    # grouped on the integer columns; genre names are joined to the grouped rows
+    rollup = (
+        select(
+            Book.reading_status,
+            Book.genre_id,
+            func.count(Book.id).label("count"),
+            func.sum(Book.price).label("price_sum"),
+            func.count(Book.price).label("price_count"),
+            func.sum(Book.pages).label("pages_sum"),
+            func.count(Book.pages).label("pages_count"),
+        )
+        .group_by(Book.reading_status, Book.genre_id)
+        .subquery()
+    )
+    return db.session.execute(
+        select(
+            rollup.c.reading_status,
+            Genre.name,
+            rollup.c.count,
+            rollup.c.price_sum,
+            rollup.c.price_count,
+            rollup.c.pages_sum,
+            rollup.c.pages_count,
+        ).outerjoin(Genre, Genre.id == rollup.c.genre_id)
+    ).all()
+
+
+@cached_until_write("users", "books")
+def _library_summary() -> Dict[str, Any]:
+    """
+    Dashboard totals from two grouped queries.
+    Books are grouped once by (status, genre); the per-status, per-genre and
+    overall figures are rolled up from those rows instead of re-scanning.
+    """
+    users_by_role = {
+        (role or "user"): int(count)
+        for role, count in (
+            db.session.query(User.role, func.count(User.id)).group_by(User.role).all()
+        )
+    }
+
+    # one grouped query per shard; a (status, genre) pair can repeat across
+    # shards and is summed by the roll-up below
+    rows = [row for shard_rows in scatter(_book_rollup_rows) for row in shard_rows]
+
+    by_status: Dict[str, int] = {}
+    by_genre: Dict[str, int] = {}
+    total_books = priced = paged = total_pages = 0
+    total_price = 0.0
+    for status, genre, count, price_sum, price_count, pages_sum, pages_count in rows:
+        if status:
+            by_status[status] = by_status.get(status, 0) + count
+        if genre:
+            by_genre[genre] = by_genre.get(genre, 0) + count
+        total_books += count
+        total_price += float(price_sum or 0)
+        priced += price_count
+        total_pages += int(pages_sum or 0)
+        paged += pages_count
+
+    return {
+        "users": {
+            "total": sum(users_by_role.values()),
+            "by_role": users_by_role,
+        },
+        "books": {
+            "total": total_books,
+            "by_status": by_status,
+            "by_genre": by_genre,
+            "total_price": round(total_price, 2),
+            "average_price": round(total_price / priced, 2) if priced else None,
+            "total_pages": total_pages,
+            "average_pages": round(total_pages / paged, 1) if paged else None,
+        },
+    }
+
+
+def get_admin_summary(current_user: User) -> Dict[str, Any]:
+    """
+    Summary cards for the admin dashboard.
+    Cached until the next committed write to users or books.
+    """
+    _require_admin(current_user)
+    return _library_summary()
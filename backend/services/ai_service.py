@@ -1,10 +1,16 @@
 # services/ai_service.py
-from typing import Dict, Any, List, Optional
+import heapq
+from collections import Counter
+from itertools import chain
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy import func
 import re
 
 from extensions import db
 from models import User, Book
+from repositories.book_repo import get_genre_counts
+from repositories.user_repo import get_user_by_id
+from sharding import is_sharded, on_user_shard, scatter
 
 
 class AIError(Exception):
@@ -28,7 +34,7 @@ def _sanitize_input(text: str, max_length: int = 500) -> str:
     return sanitized.strip()
 
 
-def _parse_intent(question: str) -> Optional[str]:
+def parse_intent(question: str) -> Optional[str]:
     """
     Parse natural language question into structured intent.
     Returns intent type or None if not recognized.
@@ -79,34 +85,128 @@ def _parse_intent(question: str) -> Optional[str]:
     return None
 
 
+def parse_question(question: str) -> str:
+    """
+    Validate an AI question and return its allow-listed intent.
+    Shared by the Flask and ASGI entry points; raises AIError.
+    """
+    if not question:
+        raise AIError("Question is required.")
+    if len(question.strip()) > 500:
+        raise AIError("Question is too long (max 500 characters).")
+
+    # Sanitize input
+    question = _sanitize_input(question)
+    if len(question) < 3:
+        raise AIError("Question is too short.")
+
+    # Parse intent (NL → structured intent)
+    intent = parse_intent(question)
+
+    if not intent:
+        raise AIError(
+            "I don't understand this question. "
+            "Try: 'Who owns the most books?', "
+            "'Which is the most popular book?', or "
+            "'Show the five most expensive books.'"
+        )
+
+    # Validate intent is in allow-list (security check)
+    if intent not in ALLOWED_INTENTS:
+        raise AIError("Invalid query intent.")
+    return intent
+
+
+# -----------------------------------------------------------------------------
+# Per-shard queries
+# -----------------------------------------------------------------------------
+# Run through sharding.scatter() for library-wide answers and merged here;
+# without shards scatter() runs them once on the primary.
+
+def _top_owner() -> Optional[Tuple[int, int]]:
+    return (
+        db.session.query(Book.user_id, func.count(Book.id).label("book_count"))
+        .group_by(Book.user_id)
+        .order_by(func.count(Book.id).desc())
+        .first()
+    )
+
+
+def _title_counts(user_id: int = None, limit: int = None) -> List[Tuple[str, int]]:
+    query = db.session.query(Book.title, func.count(Book.id).label("count"))
+    if user_id is not None:
+        query = query.filter(Book.user_id == user_id)
+    query = query.group_by(Book.title).order_by(func.count(Book.id).desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+def _first_with_title(title: str, user_id: int = None) -> Optional[Book]:
+    query = Book.query.filter_by(title=title)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return query.first()
+
+
+def _most_expensive(limit: int, user_id: int = None) -> List[Book]:
+    query = Book.query.filter(Book.price.isnot(None))
+    if user_id is not None:
+        query = query.filter(Book.user_id == user_id)
+    return query.order_by(Book.price.desc()).limit(limit).all()
+
+
+def _others_in_genre(genre: str, user_id: int, limit: int) -> List[Book]:
+    return (
+        Book.query.filter(Book.genre == genre)
+        .filter(Book.user_id != user_id)
+        .limit(limit)
+        .all()
+    )
+
+
+def _others_recent(user_id: int, exclude_ids: List[int], limit: int) -> List[Book]:
+    return (
+        Book.query.filter(Book.user_id != user_id)
+        .filter(~Book.id.in_(exclude_ids) if exclude_ids else True)
+        .order_by(Book.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def _merged_counts(per_shard) -> Counter:
+    counts = Counter()
+    for rows in per_shard:
+        for key, count in rows:
+            counts[key] += count
+    return counts
+
+
+def _most_popular_genre() -> Optional[str]:
+    top = _merged_counts(scatter(get_genre_counts)).most_common(1)
+    return top[0][0] if top else None
+
+
 def _owner_with_most_books(user: User) -> Dict[str, Any]:
     """
     Returns the user who owns the most books and their count.
     Admin sees all users; regular users see only themselves.
     """
     if user.is_admin:
-        # Admin: see all users
-        result = (
-            db.session.query(User, func.count(Book.id).label("book_count"))
-            .join(Book, Book.user_id == User.id)
-            .group_by(User.id)
-            .order_by(func.count(Book.id).desc())
-            .first()
-        )
+        # Admin: see all users. A user's books share one shard, so the
+        # overall leader is the biggest of the per-shard leaders.
+        leaders = [row for row in scatter(_top_owner) if row]
+        owner_id, count = max(leaders, key=lambda row: row[1]) if leaders else (None, 0)
+        user_obj = get_user_by_id(owner_id) if owner_id is not None else None
     else:
         # Regular user: only see their own stats
-        result = (
-            db.session.query(User, func.count(Book.id).label("book_count"))
-            .join(Book, Book.user_id == User.id)
-            .filter(User.id == user.id)
-            .group_by(User.id)
-            .first()
-        )
-    
-    if not result:
+        with on_user_shard(user.id):
+            count = Book.query.filter_by(user_id=user.id).count()
+        user_obj = user
+
+    if not count or user_obj is None:
         raise AIError("No books found.")
-    
-    user_obj, count = result
     return {
         "type": "owner_with_most_books",
         "user": {
@@ -125,22 +225,16 @@ def _most_popular_book(user: User) -> Dict[str, Any]:
     Admin sees all books; regular users see only their books.
     """
     if user.is_admin:
-        # Admin: see all books
-        result = (
-            db.session.query(Book.title, func.count(Book.id).label("count"))
-            .group_by(Book.title)
-            .order_by(func.count(Book.id).desc())
-            .first()
-        )
+        # Admin: see all books. Copies of a title can sit on several shards,
+        # so each shard's full counts are merged; one database can LIMIT 1.
+        counts = _merged_counts(scatter(_title_counts, limit=None if is_sharded() else 1))
+        top = counts.most_common(1)
+        result = top[0] if top else None
     else:
         # Regular user: only their books
-        result = (
-            db.session.query(Book.title, func.count(Book.id).label("count"))
-            .filter(Book.user_id == user.id)
-            .group_by(Book.title)
-            .order_by(func.count(Book.id).desc())
-            .first()
-        )
+        with on_user_shard(user.id):
+            rows = _title_counts(user.id, limit=1)
+        result = rows[0] if rows else None
     
     if not result:
         raise AIError("No books found.")
@@ -148,9 +242,10 @@ def _most_popular_book(user: User) -> Dict[str, Any]:
     title, count = result
     # Fetch example book (respecting user scope)
     if user.is_admin:
-        sample_book = Book.query.filter_by(title=title).first()
+        sample_book = next((b for b in scatter(_first_with_title, title) if b), None)
     else:
-        sample_book = Book.query.filter_by(title=title, user_id=user.id).first()
+        with on_user_shard(user.id):
+            sample_book = _first_with_title(title, user.id)
     
     return {
         "type": "most_popular_book",
@@ -170,22 +265,14 @@ def _five_most_expensive_books(user: User) -> Dict[str, Any]:
     Admin sees all books; regular users see only their books.
     """
     if user.is_admin:
-        # Admin: see all books
-        books: List[Book] = (
-            Book.query.filter(Book.price.isnot(None))
-            .order_by(Book.price.desc())
-            .limit(5)
-            .all()
+        # Admin: see all books; the top 5 overall are among each shard's top 5
+        books: List[Book] = heapq.nlargest(
+            5, chain.from_iterable(scatter(_most_expensive, 5)), key=lambda b: b.price
         )
     else:
         # Regular user: only their books
-        books: List[Book] = (
-            Book.query.filter(Book.price.isnot(None))
-            .filter(Book.user_id == user.id)
-            .order_by(Book.price.desc())
-            .limit(5)
-            .all()
-        )
+        with on_user_shard(user.id):
+            books: List[Book] = _most_expensive(5, user.id)
     
     if not books:
         raise AIError("No books with price information found.")
@@ -198,7 +285,7 @@ def _five_most_expensive_books(user: User) -> Dict[str, Any]:
                 "title": b.title,
                 "author": b.author,
                 "genre": b.genre,
-                "price": float(b.price) if b.price is not None else None,
+                "price": b.price,
                 "owner_id": b.user_id,
             }
             for b in books
@@ -212,31 +299,8 @@ def handle_ai_query(question: str, user: User) -> Dict[str, Any]:
     Secure AI query handler with structured intent parsing.
     NL → Intent → Allow-listed SQLAlchemy queries.
     """
-    if not question:
-        raise AIError("Question is required.")
-    
-    # Sanitize input
-    question = _sanitize_input(question)
-    if len(question) < 3:
-        raise AIError("Question is too short.")
-    if len(question) > 500:
-        raise AIError("Question is too long (max 500 characters).")
-    
-    # Parse intent (NL → structured intent)
-    intent = _parse_intent(question)
-    
-    if not intent:
-        raise AIError(
-            "I don't understand this question. "
-            "Try: 'Who owns the most books?', "
-            "'Which is the most popular book?', or "
-            "'Show the five most expensive books.'"
-        )
-    
-    # Validate intent is in allow-list (security check)
-    if intent not in ALLOWED_INTENTS:
-        raise AIError("Invalid query intent.")
-    
+    intent = parse_question(question)
+
     # Execute allow-listed query based on intent
     try:
         if intent == "owner_with_most_books":
@@ -260,26 +324,14 @@ def get_recommendations(user: User) -> Dict[str, Any]:
     """
     try:
         # Get user's most read genre
-        user_genre = (
-            db.session.query(Book.genre, func.count(Book.id).label("count"))
-            .filter_by(user_id=user.id)
-            .filter(Book.genre.isnot(None))
-            .group_by(Book.genre)
-            .order_by(func.count(Book.id).desc())
-            .first()
-        )
+        with on_user_shard(user.id):
+            user_genre = next(iter(get_genre_counts(Book.user_id == user.id)), None)
         
         if not user_genre:
             # Fallback: use most popular genre overall
-            all_genre_stats = (
-                db.session.query(Book.genre, func.count(Book.id).label("count"))
-                .filter(Book.genre.isnot(None))
-                .group_by(Book.genre)
-                .order_by(func.count(Book.id).desc())
-                .first()
-            )
+            popular_genre = _most_popular_genre()
             
-            if not all_genre_stats:
+            if not popular_genre:
                 return {
                     "type": "recommendations",
                     "message": "No books in the library yet. Add some books to get recommendations!",
@@ -287,46 +339,41 @@ def get_recommendations(user: User) -> Dict[str, Any]:
                 }
             
             # Get books from most popular genre (excluding user's own)
-            recommended = (
-                Book.query.filter(Book.genre == all_genre_stats[0])
-                .filter(Book.user_id != user.id)
-                .limit(5)
-                .all()
-            )
+            recommended = list(chain.from_iterable(
+                scatter(_others_in_genre, popular_genre, user.id, 5)
+            ))[:5]
             
             return {
                 "type": "recommendations",
-                "based_on_genre": all_genre_stats[0],
+                "based_on_genre": popular_genre,
                 "strategy": "most_popular_genre",
-                "reason": f"Based on the most popular genre in the library: {all_genre_stats[0]}",
+                "reason": f"Based on the most popular genre in the library: {popular_genre}",
                 "books": [
                     {
                         "id": b.id,
                         "title": b.title,
                         "author": b.author,
                         "genre": b.genre,
-                        "price": float(b.price) if b.price else None,
+                        "price": b.price,
                     }
                     for b in recommended
                 ],
             }
         
         # Find books in same genre from other users (collaborative filtering)
-        recommended = (
-            Book.query.filter(Book.genre == user_genre[0])
-            .filter(Book.user_id != user.id)
-            .limit(5)
-            .all()
-        )
+        recommended = list(chain.from_iterable(
+            scatter(_others_in_genre, user_genre[0], user.id, 5)
+        ))[:5]
         
         # If not enough, supplement with other popular books
         if len(recommended) < 3:
-            additional = (
-                Book.query.filter(Book.user_id != user.id)
-                .filter(~Book.id.in_([b.id for b in recommended]) if recommended else True)
-                .order_by(Book.created_at.desc())
-                .limit(5 - len(recommended))
-                .all()
+            wanted = 5 - len(recommended)
+            additional = heapq.nlargest(
+                wanted,
+                chain.from_iterable(
+                    scatter(_others_recent, user.id, [b.id for b in recommended], wanted)
+                ),
+                key=lambda b: b.created_at,
             )
             recommended.extend(additional)
         
@@ -341,7 +388,7 @@ def get_recommendations(user: User) -> Dict[str, Any]:
                     "title": b.title,
                     "author": b.author,
                     "genre": b.genre,
-                    "price": float(b.price) if b.price else None,
+                    "price": b.price,
                 }
                 for b in recommended[:5]
             ],
@@ -396,70 +443,62 @@ def _generate_reading_summary(user: User, insights: Dict[str, Any]) -> str:
 def get_insights(user: User) -> Dict[str, Any]:
     """Generate comprehensive insights about reading habits with summaries."""
     try:
-        # Genre distribution (user's books only)
-        genre_stats = (
-            db.session.query(Book.genre, func.count(Book.id).label("count"))
-            .filter_by(user_id=user.id)
-            .filter(Book.genre.isnot(None))
-            .group_by(Book.genre)
-            .all()
-        )
-        
-        # Status distribution
-        status_stats = (
-            db.session.query(Book.reading_status, func.count(Book.id).label("count"))
-            .filter_by(user_id=user.id)
-            .filter(Book.reading_status.isnot(None))
-            .group_by(Book.reading_status)
-            .all()
-        )
+        # The user's books all live on their shard
+        with on_user_shard(user.id):
+            # Genre distribution (user's books only)
+            genre_stats = get_genre_counts(Book.user_id == user.id)
         
-        # Average pages
-        avg_pages = (
-            db.session.query(func.avg(Book.pages))
-            .filter_by(user_id=user.id)
-            .filter(Book.pages.isnot(None))
-            .scalar()
-        )
+            # Status distribution
+            status_stats = (
+                db.session.query(Book.reading_status, func.count(Book.id).label("count"))
+                .filter_by(user_id=user.id)
+                .filter(Book.reading_status.isnot(None))
+                .group_by(Book.reading_status)
+                .all()
+            )
         
-        # Min/Max pages
-        min_pages = (
-            db.session.query(func.min(Book.pages))
-            .filter_by(user_id=user.id)
-            .filter(Book.pages.isnot(None))
-            .scalar()
-        )
-        max_pages = (
-            db.session.query(func.max(Book.pages))
-            .filter_by(user_id=user.id)
-            .filter(Book.pages.isnot(None))
-            .scalar()
-        )
+            # Average pages
+            avg_pages = (
+                db.session.query(func.avg(Book.pages))
+                .filter_by(user_id=user.id)
+                .filter(Book.pages.isnot(None))
+                .scalar()
+            )
         
-        # Total pages read
-        total_pages = (
-            db.session.query(func.sum(Book.pages))
-            .filter_by(user_id=user.id)
-            .filter(Book.pages.isnot(None))
-            .scalar()
-        )
+            # Min/Max pages
+            min_pages = (
+                db.session.query(func.min(Book.pages))
+                .filter_by(user_id=user.id)
+                .filter(Book.pages.isnot(None))
+                .scalar()
+            )
+            max_pages = (
+                db.session.query(func.max(Book.pages))
+                .filter_by(user_id=user.id)
+                .filter(Book.pages.isnot(None))
+                .scalar()
+            )
         
-        # Average price
-        avg_price = (
-            db.session.query(func.avg(Book.price))
-            .filter_by(user_id=user.id)
-            .filter(Book.price.isnot(None))
-            .scalar()
-        )
+            # Total pages read
+            total_pages = (
+                db.session.query(func.sum(Book.pages))
+                .filter_by(user_id=user.id)
+                .filter(Book.pages.isnot(None))
+                .scalar()
+            )
         
+            # Average price
+            avg_price = (
+                db.session.query(func.avg(Book.price))
+                .filter_by(user_id=user.id)
+                .filter(Book.price.isnot(None))
+                .scalar()
+            )
+
+            total_books = Book.query.filter_by(user_id=user.id).count()
+
         # Most popular genre across all users (for context)
-        all_genre_stats = (
-            db.session.query(Book.genre, func.count(Book.id).label("count"))
-            .filter(Book.genre.isnot(None))
-            .group_by(Book.genre)
-            .order_by(func.count(Book.id).desc())
-            .first()
-        )
+        popular_genre = _most_popular_genre()
         
         # Favorite genre (user's most read)
         favorite_genre = None
@@ -475,9 +514,9 @@ def get_insights(user: User) -> Dict[str, Any]:
             "max_pages": int(max_pages) if max_pages else None,
             "total_pages": int(total_pages) if total_pages else None,
             "average_price": float(avg_price) if avg_price else None,
-            "total_books": Book.query.filter_by(user_id=user.id).count(),
+            "total_books": total_books,
             "favorite_genre": favorite_genre,
-            "most_popular_genre_overall": all_genre_stats[0] if all_genre_stats else None,
+            "most_popular_genre_overall": popular_genre,
         }
         
         # Generate AI summary
@@ -0,0 +1,137 @@
+# services/async_ai_service.py
+"""
+AsyncSession versions of the ai_service entry points for asgi_app.py.
+Intent parsing, validation and the reading summary are shared with
+ai_service; only the data access differs, and responses have the same shape.
+"""
+from typing import Any, Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import User, Book
+from repositories import async_book_repo
+from services.ai_service import AIError, _generate_reading_summary, parse_question
+
+
+def _book_brief(b: Book) -> Dict[str, Any]:
+    return {
+        "id": b.id,
+        "title": b.title,
+        "author": b.author,
+        "genre": b.genre,
+        "price": b.price,
+    }
+
+
+async def get_insights(session: AsyncSession, user: User) -> Dict[str, Any]:
+    genre_stats = await async_book_repo.genre_counts(session, user_id=user.id)
+    status_stats = await async_book_repo.count_by(session, Book.reading_status, user_id=user.id)
+    stats = await async_book_repo.page_and_price_stats(session, user.id)
+    overall = await async_book_repo.genre_counts(session)
+
+    insights = {
+        "type": "insights",
+        "user_genre_distribution": {g: int(c) for g, c in genre_stats},
+        "status_distribution": {s: int(c) for s, c in status_stats},
+        "average_pages": float(stats["average_pages"]) if stats["average_pages"] else None,
+        "min_pages": int(stats["min_pages"]) if stats["min_pages"] else None,
+        "max_pages": int(stats["max_pages"]) if stats["max_pages"] else None,
+        "total_pages": int(stats["total_pages"]) if stats["total_pages"] else None,
+        "average_price": float(stats["average_price"]) if stats["average_price"] else None,
+        "total_books": stats["total_books"],
+        "favorite_genre": genre_stats[0][0] if genre_stats else None,
+        "most_popular_genre_overall": overall[0][0] if overall else None,
+    }
+    insights["summary"] = _generate_reading_summary(user, insights)
+    return insights
+
+
+async def get_recommendations(session: AsyncSession, user: User) -> Dict[str, Any]:
+    user_genres = await async_book_repo.genre_counts(session, user_id=user.id)
+
+    if not user_genres:
+        overall = await async_book_repo.genre_counts(session)
+        if not overall:
+            return {
+                "type": "recommendations",
+                "message": "No books in the library yet. Add some books to get recommendations!",
+                "books": [],
+            }
+        genre = overall[0][0]
+        recommended = await async_book_repo.books_in_genre(session, genre, user.id, 5)
+        return {
+            "type": "recommendations",
+            "based_on_genre": genre,
+            "strategy": "most_popular_genre",
+            "reason": f"Based on the most popular genre in the library: {genre}",
+            "books": [_book_brief(b) for b in recommended],
+        }
+
+    genre = user_genres[0][0]
+    recommended = await async_book_repo.books_in_genre(session, genre, user.id, 5)
+    if len(recommended) < 3:
+        recommended += await async_book_repo.recent_books_excluding(
+            session, user.id, [b.id for b in recommended], 5 - len(recommended)
+        )
+
+    return {
+        "type": "recommendations",
+        "based_on_genre": genre,
+        "strategy": "user_preference",
+        "reason": f"Based on your preference for {genre} genre",
+        "books": [_book_brief(b) for b in recommended[:5]],
+    }
+
+
+async def handle_ai_query(session: AsyncSession, question: str, user: User) -> Dict[str, Any]:
+    intent = parse_question(question)
+
+    scope_user_id = None if user.is_admin else user.id
+
+    if intent == "owner_with_most_books":
+        row = await async_book_repo.owner_with_most_books(session, scope_user_id)
+        if not row:
+            raise AIError("No books found.")
+        owner, count = row
+        return {
+            "type": "owner_with_most_books",
+            "user": {"id": owner.id, "name": owner.name, "email": owner.email},
+            "book_count": int(count),
+            "scope": "all_users" if user.is_admin else "your_books",
+        }
+
+    if intent == "most_popular_book":
+        row = await async_book_repo.most_popular_title(session, scope_user_id)
+        if not row:
+            raise AIError("No books found.")
+        title, count = row
+        sample = await async_book_repo.first_with_title(session, title, scope_user_id)
+        return {
+            "type": "most_popular_book",
+            "title": title,
+            "count": int(count),
+            "example": {
+                "author": sample.author if sample else None,
+                "genre": sample.genre if sample else None,
+            },
+            "scope": "all_books" if user.is_admin else "your_books",
+        }
+
+    books = await async_book_repo.most_expensive(session, 5, scope_user_id)
+    if not books:
+        raise AIError("No books with price information found.")
+    return {
+        "type": "five_most_expensive_books",
+        "books": [
+            {
+                "id": b.id,
+                "title": b.title,
+                "author": b.author,
+                "genre": b.genre,
+                "price": b.price,
+                "owner_id": b.user_id,
+            }
+            for b in books
+        ],
+        "scope": "all_books" if user.is_admin else "your_books",
+    }
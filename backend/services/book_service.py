@@ -1,10 +1,19 @@
 # services/book_service.py
-from typing import List, Optional
-from models import Book, User
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import book_events
+import book_writer
+import suggest
+from models import READING_STATUSES, Book, User
+from sharding import current_shard, on_user_shard, scatter, shard_count
 from repositories.book_repo import (
     get_books_for_user,
     get_all_books,
     get_book_by_id,
+    get_books_by_ids,
+    get_book_changes,
+    get_book_facets,
     create_book,
     delete_book,
     update_book,
@@ -16,61 +25,227 @@ class BookError(Exception):
 
 
 # Allowed reading statuses for validation
-ALLOWED_STATUSES = {"planned", "reading", "completed"}
+ALLOWED_STATUSES = set(READING_STATUSES)
 
 
 # -----------------------------------------------------------------------------
 # LISTING
 # -----------------------------------------------------------------------------
 
-def _filter_books(books: List[Book], genre: str = None, status: str = None) -> List[Book]:
-    """Helper to filter by genre and reading_status."""
-    if genre:
-        genre = genre.strip().lower()
-        if genre:  # Only filter if genre is not empty after stripping
-            books = [b for b in books if b.genre and (b.genre.lower() == genre)]
-
-    if status:
-        status = status.strip().lower()
-        if status and status in ALLOWED_STATUSES:
-            books = [
-                b for b in books
-                if b.reading_status and (b.reading_status.lower() == status)
-            ]
-    return books
+def _normalize_filters(
+    genre: str = None, status: str = None, author: str = None
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    The genre, reading_status and author to filter by, None for no filter:
+    blank names and unknown statuses are ignored. Names match
+    case-insensitively (see models.lookup_key).
+    """
+    genre = (genre or "").strip() or None
+    author = (author or "").strip() or None
+    status = (status or "").strip().lower()
+    return genre, (status if status in ALLOWED_STATUSES else None), author
 
 
-def list_books_for_user(user: User, genre: str = None, status: str = None) -> List[Book]:
+def list_books_for_user(user: User, genre: str = None, status: str = None, author: str = None) -> List[Book]:
     """
     If admin -> list ALL books
     If normal user -> list only their books
-    Optional filtering by genre & status for both.
+    Optional filtering by genre, status & author for both, in the query.
     """
+    genre, status, author = _normalize_filters(genre, status, author)
     if user.is_admin:
-        books = get_all_books()
-    else:
-        books = get_books_for_user(user.id)
-
-    return _filter_books(books, genre=genre, status=status)
+        return get_all_books(genre=genre, status=status, author=author)
+    return get_books_for_user(user.id, genre=genre, status=status, author=author)
 
 
 def list_books_for_admin(genre: str = None, status: str = None) -> List[Book]:
     """
     Admin-only listing. Used explicitly by admin routes if you want.
     """
-    books = get_all_books()
-    return _filter_books(books, genre=genre, status=status)
+    genre, status, _ = _normalize_filters(genre, status)
+    return get_all_books(genre=genre, status=status)
+
+
+# -----------------------------------------------------------------------------
+# FACETED SEARCH
+# -----------------------------------------------------------------------------
+
+BOOK_FACETS = ("genre", "status", "author")
+MAX_BOOKS_PAGE = 100
+FACET_VALUES = 50  # per facet, most books first
+
+
+def parse_facets(raw: Optional[str]) -> List[str]:
+    """`genre,status,author` (any subset, any order) as a list."""
+    facets = [part.strip().lower() for part in (raw or "").split(",") if part.strip()]
+    unknown = [facet for facet in facets if facet not in BOOK_FACETS]
+    if unknown:
+        raise BookError(f"Unknown facet: {unknown[0]}. Allowed: genre, status, author.")
+    return list(dict.fromkeys(facets))
+
+
+def search_books_for_user(
+    user: User,
+    genre: str = None,
+    status: str = None,
+    author: str = None,
+    facets: List[str] = (),
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> dict:
+    """
+    One page of the books list_books_for_user returns, with their total and
+    a count per value of each facet (see book_repo.get_book_facets). The
+    facets take one statement per shard; an admin's are summed over the
+    shards, where a value outside every shard's top FACET_VALUES can be
+    missing.
+    """
+    genre, status, author = _normalize_filters(genre, status, author)
+    limit, offset = page_bounds(limit, offset)
+    filters = {"genre": genre, "status": status, "author": author}
+
+    if user.is_admin:
+        books = get_all_books(**filters, limit=limit, offset=offset)
+        per_shard = scatter(get_book_facets, facets, None, **filters, top=FACET_VALUES)
+    else:
+        books = get_books_for_user(user.id, **filters, limit=limit, offset=offset)
+        with on_user_shard(user.id):
+            per_shard = [get_book_facets(facets, user.id, **filters, top=FACET_VALUES)]
+    return book_page(books, per_shard, facets, limit, offset)
+
+
+def page_bounds(limit: Optional[int], offset: Optional[int]) -> Tuple[int, int]:
+    """The limit (1 to MAX_BOOKS_PAGE, that by default) and offset of a page."""
+    return max(1, min(limit or MAX_BOOKS_PAGE, MAX_BOOKS_PAGE)), max(offset or 0, 0)
+
 
+def book_page(books: List[Book], per_shard: list, facets: List[str], limit: int, offset: int) -> dict:
+    """search_books_for_user's result from a page of books and get_book_facets per shard."""
+    merged = {}
+    for facet in facets:
+        counts = Counter()
+        for _, shard_facets in per_shard:
+            for value, count in shard_facets[facet]:
+                counts[value] += count
+        merged[facet] = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:FACET_VALUES]
 
+    return {
+        "books": books,
+        "total": sum(total for total, _ in per_shard),
+        "limit": limit,
+        "offset": offset,
+        "facets": merged,
+    }
+
+
+# -----------------------------------------------------------------------------
+# SUGGESTIONS (type-ahead, see suggest.py)
+# -----------------------------------------------------------------------------
+
+MAX_SUGGESTIONS = suggest.MEMO_SIZE
+
+
+def suggest_for_user(user: User, field: str, prefix: str = None, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+    """
+    (value, book count) of the titles, authors or genres starting with
+    `prefix`, case-insensitively, most books first. Values come from the
+    user's own books, by the rule of list_books_for_user: admins get every
+    book's.
+    """
+    field = (field or "").strip().lower()
+    if field not in suggest.FIELDS:
+        raise BookError("Unknown field. Allowed: title, author, genre.")
+    limit = max(1, min(limit or 10, MAX_SUGGESTIONS))
+    return suggest.lookup(None if user.is_admin else user.id, field, prefix or "", limit)
+
+
+
+
+# -----------------------------------------------------------------------------
+# CHANGES (incremental sync, see change_log.py)
+# -----------------------------------------------------------------------------
+
+MAX_CHANGES_PAGE = 1000
+
+
+def _decode_since(since: Optional[str], parts: int) -> List[int]:
+    """
+    A change-log cursor: one seq per shard it covers, dot-separated
+    ("120" unsharded or for one user's shard, "120.97.133" for an admin
+    across three shards). Empty means from the start.
+    """
+    if not since:
+        return [0] * parts
+    try:
+        values = [int(v) for v in since.split(".")]
+    except ValueError:
+        raise BookError("since must be a change sequence number.")
+    if len(values) != parts or any(v < 0 for v in values):
+        raise BookError("since is not a sequence number from this change log.")
+    return values
+
+
+def _changes_since(since: int, user_id: Optional[int], limit: int) -> Tuple[int, bool, List[Book], List[int]]:
+    entries = get_book_changes(since, user_id, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    # only the latest op per book matters to a client catching up
+    latest = {}
+    for entry in entries:
+        latest[entry.book_id] = entry.op
+    live_ids = [book_id for book_id, op in latest.items() if op != "delete"]
+    books = {b.id: b for b in get_books_by_ids(live_ids)}
+
+    seq = entries[-1].seq if entries else since
+    changed = [books[book_id] for book_id in live_ids if book_id in books]
+    # deleted later than this page reads: a tombstone now is as good
+    deleted = [book_id for book_id in latest if book_id not in books]
+    return seq, has_more, changed, deleted
+
+
+def list_book_changes_for_user(user: User, since: Optional[str] = None, limit: int = MAX_CHANGES_PAGE) -> dict:
+    """
+    Books changed after the cursor `since`, scoped like list_books_for_user:
+    admins see every book, others their own. Returns the changed books'
+    current state, the ids of deleted ones, the cursor to pass next time
+    and whether more changes are waiting.
+    """
+    limit = max(1, min(limit, MAX_CHANGES_PAGE))
+    if user.is_admin:
+        # one seq per shard; results come back in shard order
+        sinces = _decode_since(since, shard_count())
+        pages = scatter(lambda: _changes_since(sinces[current_shard() or 0], None, limit))
+    else:
+        with on_user_shard(user.id):
+            pages = [_changes_since(_decode_since(since, 1)[0], user.id, limit)]
+
+    seqs = [page[0] for page in pages]
+    return {
+        "seq": seqs[0] if len(seqs) == 1 else ".".join(str(seq) for seq in seqs),
+        "has_more": any(page[1] for page in pages),
+        "books": [book for page in pages for book in page[2]],
+        "deleted": [book_id for page in pages for book_id in page[3]],
+    }
+
+
+def open_book_stream_for_user(user: User) -> book_events.Subscription:
+    """
+    Live create/update/delete events, scoped like list_books_for_user.
+    """
+    subscription = book_events.subscribe(user.id, see_all=user.is_admin)
+    if subscription is None:
+        raise BookError("Too many open streams; try again later.")
+    return subscription
 
 
 # -----------------------------------------------------------------------------
 # CREATE
 # -----------------------------------------------------------------------------
 
-def create_book_for_user(user: User, data: dict) -> Book:
+def validate_new_book(data: dict) -> dict:
     """
-    Validates and creates a book for the given user.
+    Validates a create request; returns the book's fields.
     """
     title = (data.get("title") or "").strip()
     if not title:
@@ -101,16 +276,43 @@ def create_book_for_user(user: User, data: dict) -> Book:
         except ValueError:
             raise BookError("Pages must be an integer.")
 
-    # Create book
-    return create_book(
-        user_id=user.id,
-        title=title,
-        author=data.get("author"),
-        genre=genre,
-        price=price,
-        pages=pages,
-        reading_status=reading_status,
-    )
+    return {
+        "title": title,
+        "author": data.get("author"),
+        "genre": genre,
+        "price": price,
+        "pages": pages,
+        "reading_status": reading_status,
+    }
+
+
+def create_book_for_user(user: User, data: dict) -> Book:
+    """
+    Validates and creates a book for the given user.
+    """
+    return create_book(user_id=user.id, **validate_new_book(data))
+
+
+def submit_book_for_user(user: User, data: dict) -> Optional[str]:
+    """
+    Validates like create_book_for_user, then queues the insert for the
+    background writer. Returns the ticket, or None when the queue is full.
+    """
+    fields = validate_new_book(data)
+    return book_writer.submit(user.id, fields)
+
+
+def get_book_ticket_for_user(user: User, ticket: str) -> dict:
+    """
+    A queued create's outcome, with the book once created (None if it has
+    been deleted since). Only its owner or an admin can see it.
+    """
+    status = book_writer.status(ticket)
+    if status is None or (status["user_id"] != user.id and not user.is_admin):
+        raise BookError("Ticket not found.")
+    book_id = status.pop("book_id")
+    status["book"] = get_book_by_id(book_id) if book_id is not None else None
+    return status
 
 
 # -----------------------------------------------------------------------------
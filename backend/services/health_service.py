@@ -0,0 +1,48 @@
+# services/health_service.py
+import time
+from typing import Any, Dict
+
+from sqlalchemy import text
+
+from extensions import db
+
+
+def get_pool_status() -> Dict[str, Any]:
+    """Connection pool counters for the default engine (QueuePool exposes all of them)."""
+    pool = db.engine.pool
+
+    def _stat(name):
+        fn = getattr(pool, name, None)
+        return fn() if callable(fn) else None
+
+    return {
+        "class": type(pool).__name__,
+        "size": _stat("size"),
+        "checked_in": _stat("checkedin"),
+        "checked_out": _stat("checkedout"),
+        "overflow": _stat("overflow"),
+        "timeout": _stat("timeout"),
+        "recycle": pool._recycle,
+        "pre_ping": pool._pre_ping,
+    }
+
+
+def check_database() -> Dict[str, Any]:
+    """
+    Time a pool checkout and a `SELECT 1` round trip separately, so a
+    saturated pool shows up as checkout wait rather than as a slow database.
+    """
+    started = time.perf_counter()
+    try:
+        with db.engine.connect() as conn:
+            checked_out = time.perf_counter()
+            conn.execute(text("SELECT 1"))
+            finished = time.perf_counter()
+    except Exception as e:
+        return {"ok": False, "error": type(e).__name__}
+
+    return {
+        "ok": True,
+        "checkout_wait_ms": round((checked_out - started) * 1000, 3),
+        "ping_ms": round((finished - checked_out) * 1000, 3),
+    }
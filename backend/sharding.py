@@ -0,0 +1,317 @@
+# sharding.py
+"""
+Optional user-sharded book storage.
+
+With BOOK_SHARD_URLS set to N database URLs, the books table, its change
+log (book_changes), queued-create tickets (book_tickets) and its lookup
+tables (genres, authors) live on the binds
+books_0 .. books_{N-1} and users stay on the primary. Placement is by owner: all of a user's books are on shard
+user_id % N. Book ids are allocated so that book_id % N is the same shard,
+which keeps ids unique across shards (the session's identity map relies on
+that) and lets a book be found from its id alone.
+
+Code that works on one user's books runs inside on_user_shard(user_id) (or
+on_book_shard(book_id)); RoutingSession.get_bind sends every statement and
+flush touching the books table to that shard, and raises ShardRoutingError
+when there is none, so a missed path fails loudly instead of reading the
+primary's empty table. Code that needs every book calls scatter(fn): fn runs
+once per shard, in parallel threads with their own app context and session,
+and the caller merges the per-shard results (top-K, counts, group-bys).
+
+Without BOOK_SHARD_URLS all of this is a no-op: the contexts do nothing and
+scatter(fn) is [fn()].
+
+A user's books never span shards, so per-user aggregates stay single-shard.
+Writes touching several shards commit one after another, without two-phase
+commit.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional
+
+import click
+from flask import current_app, g, has_app_context, has_request_context
+from flask.cli import with_appcontext
+from sqlalchemy import Index, MetaData, event, func, select
+from sqlalchemy.sql.util import find_tables
+
+SHARD_BIND_PREFIX = "books_"
+BOOKS_TABLE = "books"
+# tables that live next to the books on each shard
+SHARDED_TABLES = {BOOKS_TABLE, "book_changes", "book_tickets", "genres", "authors"}
+
+_current_shard: ContextVar = ContextVar("book_shard", default=None)
+
+
+class ShardRoutingError(RuntimeError):
+    pass
+
+
+class BookShards:
+    def __init__(self, count: int, max_workers: Optional[int] = None):
+        self.count = count
+        self.max_workers = max_workers or count
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(index: int) -> str:
+        return f"{SHARD_BIND_PREFIX}{index}"
+
+    def for_user(self, user_id: int) -> int:
+        return int(user_id) % self.count
+
+    def for_book(self, book_id: int) -> int:
+        return int(book_id) % self.count
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # created on first use, so gunicorn workers don't inherit the master's threads
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix="book-shard"
+                    )
+        return self._executor
+
+
+def _shards() -> Optional[BookShards]:
+    return current_app.extensions.get("book_shards") if has_app_context() else None
+
+
+def is_sharded() -> bool:
+    return _shards() is not None
+
+
+def shard_count() -> int:
+    shards = _shards()
+    return shards.count if shards else 1
+
+
+def current_shard() -> Optional[int]:
+    """The shard this block is routed to; None outside a shard context or unsharded."""
+    return _current_shard.get()
+
+
+def shard_urls(config) -> List[str]:
+    urls = config.get("BOOK_SHARD_URLS") or []
+    if isinstance(urls, str):
+        urls = [url.strip() for url in urls.split(",") if url.strip()]
+    return list(urls)
+
+
+# -----------------------------------------------------------------------------
+# Routing
+# -----------------------------------------------------------------------------
+
+def _touches_books(mapper, clause) -> bool:
+    if mapper is not None and mapper.local_table.name in SHARDED_TABLES:
+        return True
+    if clause is None:
+        return False
+    tables = find_tables(clause, include_joins=True, include_crud=True, include_selects=True)
+    return any(getattr(t, "name", None) in SHARDED_TABLES for t in tables)
+
+
+def bind_for(engines, mapper=None, clause=None):
+    """The shard engine for a books (or change log) statement; None when unsharded or not about books."""
+    shards = _shards()
+    if shards is None or not _touches_books(mapper, clause):
+        return None
+    index = _current_shard.get()
+    if index is None:
+        raise ShardRoutingError(
+            "books statement outside on_user_shard(), on_book_shard() or scatter()"
+        )
+    return engines[shards.key(index)]
+
+
+@contextmanager
+def on_shard(index: Optional[int]):
+    token = _current_shard.set(index)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def on_user_shard(user_id: int):
+    """Route books statements in this block to user_id's shard."""
+    shards = _shards()
+    return on_shard(shards.for_user(user_id)) if shards else nullcontext()
+
+
+def on_book_shard(book_id: int):
+    shards = _shards()
+    return on_shard(shards.for_book(book_id)) if shards else nullcontext()
+
+
+def group_by_shard(items: Iterable, by: str = "user", key: Callable = None) -> Dict[Optional[int], list]:
+    """
+    {shard index: items on it} for user or book ids (or items whose `key` is
+    one); {None: items} when unsharded.
+    """
+    items = list(items)
+    shards = _shards()
+    if shards is None:
+        return {None: items} if items else {}
+    place = shards.for_user if by == "user" else shards.for_book
+    groups: Dict[Optional[int], list] = {}
+    for item in items:
+        groups.setdefault(place(key(item) if key else item), []).append(item)
+    return groups
+
+
+def scatter(fn: Callable, *args, **kwargs) -> list:
+    """fn(*args, **kwargs) on every shard in parallel; results in shard order."""
+    shards = _shards()
+    if shards is None:
+        return [fn(*args, **kwargs)]
+
+    app = current_app._get_current_object()
+    request_globals = g._get_current_object() if has_request_context() else None
+
+    def run(index):
+        # the app context gives this thread its own scoped session,
+        # removed again when the context ends
+        with app.app_context(), on_shard(index):
+            # count the statements toward the request (instrumentation.py, query_budget.py)
+            g.sql_counted_for = request_globals
+            return fn(*args, **kwargs)
+
+    return list(shards.executor.map(run, range(shards.count)))
+
+
+# -----------------------------------------------------------------------------
+# Book ids
+# -----------------------------------------------------------------------------
+
+def needs_book_ids(connection) -> bool:
+    """Whether new books on this shard connection take their ids from next_book_ids()."""
+    return is_sharded() and connection.dialect.name != "mysql"
+
+
+def next_book_ids(connection, index: int, count: int) -> List[int]:
+    """
+    `count` unused ids for shard `index` (congruent to it modulo the shard
+    count), above any id on the shard or already handed out on this
+    connection (rows of one flush get their ids before any is inserted).
+
+    Reading max(id) is only safe with one writer at a time, so this serves
+    the SQLite shards of the test suite; init_app() refuses other non-MySQL
+    shards.
+    """
+    shard_count = _shards().count
+    books = _shard_table()
+    highest = max(
+        connection.scalar(select(func.max(books.c.id))) or 0,
+        connection.info.get("last_book_id", 0),
+    )
+    first = highest + 1 + (index - highest - 1) % shard_count
+    ids = [first + i * shard_count for i in range(count)]
+    connection.info["last_book_id"] = ids[-1]
+    return ids
+
+
+def _assign_book_id(mapper, connection, target):
+    if target.id is not None or not needs_book_ids(connection):
+        return  # MySQL shards step AUTO_INCREMENT themselves, see _mysql_id_steps
+    target.id = next_book_ids(connection, _current_shard.get(), 1)[0]
+
+
+def _mysql_id_steps(index: int, count: int):
+    # auto_increment_offset must be 1..increment; offset `count` yields ids ≡ 0
+    offset = index or count
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(
+            f"SET SESSION auto_increment_increment = {count}, auto_increment_offset = {offset}"
+        )
+        cursor.close()
+
+    return on_connect
+
+
+# -----------------------------------------------------------------------------
+# Schema
+# -----------------------------------------------------------------------------
+
+_table_cache = {}
+
+
+def _shard_table():
+    """The books table without its owner's foreign key: users live on another database."""
+    if "books" not in _table_cache:
+        from models import Author, Book, BookChange, BookTicket, Genre
+
+        metadata = MetaData()
+        Genre.__table__.to_metadata(metadata)
+        Author.__table__.to_metadata(metadata)
+        table = Book.__table__.to_metadata(metadata)
+        for fk in list(table.foreign_keys):
+            if fk.target_fullname.startswith("users."):
+                table.constraints.discard(fk.constraint)
+                table.foreign_keys.discard(fk)
+                fk.parent.foreign_keys.discard(fk)
+        # every per-user path filters on the owner
+        Index("ix_books_user_id_created_at", table.c.user_id, table.c.created_at)
+        BookChange.__table__.to_metadata(metadata)
+        BookTicket.__table__.to_metadata(metadata)
+        _table_cache["books"] = table
+    return _table_cache["books"]
+
+
+def create_shard_tables(drop_first: bool = False) -> None:
+    """The books tables (books, book_changes, book_tickets, genres, authors) on every shard."""
+    from extensions import db
+
+    shards = _shards()
+    if shards is None:
+        return
+    metadata = _shard_table().metadata
+    for index in range(shards.count):
+        engine = db.engines[shards.key(index)]
+        if drop_first:
+            metadata.drop_all(engine)
+        metadata.create_all(engine)
+
+
+@click.command("create-shard-tables")
+@with_appcontext
+def create_shard_tables_command():
+    """Create the books, book_changes, book_tickets, genres and authors tables on every BOOK_SHARD_URLS database."""
+    if not is_sharded():
+        raise click.ClickException("BOOK_SHARD_URLS is not set.")
+    create_shard_tables()
+    click.echo(f"Created books tables on {_shards().count} shards.")
+
+
+def init_app(app) -> None:
+    """Call after db.init_app(app); configure_database added the shard binds."""
+    urls = shard_urls(app.config)
+    app.cli.add_command(create_shard_tables_command)
+    if not urls:
+        return
+
+    from extensions import db
+    from models import Book
+
+    shards = BookShards(len(urls), app.config.get("BOOK_SHARD_WORKERS"))
+    app.extensions["book_shards"] = shards
+
+    if not event.contains(Book, "before_insert", _assign_book_id):
+        event.listen(Book, "before_insert", _assign_book_id)
+    with app.app_context():
+        for index in range(shards.count):
+            engine = db.engines[shards.key(index)]
+            if engine.dialect.name == "mysql":
+                event.listen(engine, "connect", _mysql_id_steps(index, shards.count))
+            elif not app.testing:
+                # next_book_ids reads max(id); concurrent writers would take the same id
+                raise RuntimeError(
+                    f"BOOK_SHARD_URLS must be MySQL databases; shard {index} is {engine.dialect.name}."
+                )
@@ -0,0 +1,185 @@
+# slow_query.py
+"""
+Slow-query log.
+
+Cursor events on the app's engines time every SQL statement. One that takes
+at least SLOW_QUERY_THRESHOLD_MS is logged with:
+
+  * its shape (whitespace and IN lists collapsed, see query_budget) and a
+    hash of its parameters, so repeats are recognisable without logging
+    user data;
+  * the endpoint that ran it and the innermost services.* (or
+    repositories.*) function on the stack;
+  * the plan, from EXPLAIN run on the same connection right after the
+    statement, so it sees the same transaction and the same (replica or
+    primary) database. Only SELECTs are explained.
+
+Slow statements are also aggregated per shape; GET /api/admin/slow-queries
+lists the shapes with the most total time. Like the other metrics, the
+aggregate is per process.
+"""
+import hashlib
+import sys
+import threading
+import time
+
+from flask import has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+from instrumentation import metrics
+from query_budget import statement_shape
+
+EXPLAIN_PREFIX = {"sqlite": "EXPLAIN QUERY PLAN "}  # MySQL, PostgreSQL: plain EXPLAIN
+
+
+def params_hash(parameters) -> str:
+    return hashlib.sha256(repr(parameters).encode()).hexdigest()[:12]
+
+
+def _caller() -> str:
+    """Innermost service function on the current stack, else repository function."""
+    frame = sys._getframe(2)
+    found = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("services."):
+            return f"{module}.{frame.f_code.co_name}"
+        if found is None and module.startswith("repositories."):
+            found = f"{module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return found
+
+
+def _explain(conn, statement, parameters):
+    prefix = EXPLAIN_PREFIX.get(conn.dialect.name, "EXPLAIN ")
+    # a raw DB-API cursor: neither timed nor counted towards the request
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [[str(value) for value in row] for row in cursor.fetchall()]
+    except Exception as e:  # driver-specific; the plan is best effort
+        return [[f"EXPLAIN failed: {e}"]]
+    finally:
+        cursor.close()
+
+
+class _ShapeStats:
+    __slots__ = ("count", "total_ms", "max_ms", "sample")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sample = None
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, explain: bool = True, max_shapes: int = 500, logger=None):
+        self.threshold_ms = threshold_ms
+        self.explain = explain
+        self.max_shapes = max_shapes
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._shapes = {}
+
+    # ------------------------------------------------------------------
+    # Engine events
+    # ------------------------------------------------------------------
+
+    def attach(self, engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._discard_failed_statement)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+
+        explain = None
+        if self.explain and not executemany and statement.lstrip()[:6].upper().startswith(("SELECT", "WITH")):
+            explain = _explain(conn, statement, parameters)
+        self.record(statement, parameters, elapsed_ms, explain)
+
+    def _discard_failed_statement(self, exception_context):
+        conn = exception_context.connection
+        started = conn.info.get("slow_query_started") if conn is not None else None
+        if started:
+            started.pop()
+
+    # ------------------------------------------------------------------
+    # Log and aggregate
+    # ------------------------------------------------------------------
+
+    def record(self, statement, parameters, elapsed_ms, explain=None) -> None:
+        shape = statement_shape(statement)
+        sample = {
+            "params_hash": params_hash(parameters),
+            "duration_ms": round(elapsed_ms, 2),
+            "endpoint": request.endpoint if has_request_context() else None,
+            "route": request.url_rule.rule if has_request_context() and request.url_rule else None,
+            "service": _caller(),
+            "explain": explain,
+            "at": round(time.time(), 3),
+        }
+        metrics.inc("db_slow_statements_total")
+
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    cheapest = min(self._shapes, key=lambda s: self._shapes[s].total_ms)
+                    del self._shapes[cheapest]
+                stats = self._shapes[shape] = _ShapeStats()
+            stats.count += 1
+            stats.total_ms += elapsed_ms
+            if elapsed_ms >= stats.max_ms:
+                stats.max_ms = elapsed_ms
+                stats.sample = sample  # keep the worst occurrence
+
+        if self.logger is not None:
+            self.logger.warning(
+                "slow query %.1f ms endpoint=%s service=%s params=%s: %s; plan: %s",
+                elapsed_ms, sample["endpoint"], sample["service"], sample["params_hash"],
+                shape, explain,
+            )
+
+    def top(self, limit: int = 20) -> list:
+        """Shapes by total slow time, with the slowest occurrence of each."""
+        with self._lock:
+            ranked = sorted(self._shapes.items(), key=lambda kv: kv[1].total_ms, reverse=True)[:limit]
+            return [
+                {
+                    "shape": shape,
+                    "count": s.count,
+                    "total_ms": round(s.total_ms, 2),
+                    "mean_ms": round(s.total_ms / s.count, 2),
+                    "max_ms": round(s.max_ms, 2),
+                    "slowest": s.sample,
+                }
+                for shape, s in ranked
+            ]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._shapes.clear()
+
+
+def init_app(app) -> None:
+    """Call after db.init_app(app): listens on every bind's engine."""
+    if not app.config.get("SLOW_QUERY_LOG_ENABLED", True):
+        return
+    log = SlowQueryLog(
+        float(app.config.get("SLOW_QUERY_THRESHOLD_MS", 200)),
+        explain=app.config.get("SLOW_QUERY_EXPLAIN", True),
+        max_shapes=int(app.config.get("SLOW_QUERY_MAX_SHAPES", 500)),
+        logger=app.logger,
+    )
+    app.extensions["slow_query_log"] = log
+    with app.app_context():
+        for engine in db.engines.values():
+            log.attach(engine)
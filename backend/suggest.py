@@ -0,0 +1,240 @@
+# suggest.py
+"""
+Type-ahead for the add-book form: GET /api/books/suggest?field=author&prefix=fr.
+
+Each field (title, author, genre) is a sorted array of lookup keys (trimmed,
+case-folded) with a book count and display name per key. The keys starting
+with a prefix are one contiguous run, found with two binary searches, and
+ranked by count; runs longer than SCAN_LIMIT keys (the first letter or two)
+are ranked once and the top MEMO_SIZE kept per prefix, so no lookup scans
+more than SCAN_LIMIT keys.
+
+Users get suggestions from their own books, admins from every book, so
+there is an index per owner and field, built on its first lookup: one
+grouped query on the user's shard, or one per shard for admins. The write
+paths in book_repo.py keep them current by calling record() with the books
+they committed; bulk deletes in admin_service.py call forget(), which drops
+the indexes involved. Indexes are per process, so another worker's writes
+show once the index is rebuilt, SUGGEST_REFRESH_SECONDS after it was built.
+At most SUGGEST_MAX_OWNERS owners are kept, least recently used dropped.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import current_app, has_app_context
+
+from models import lookup_key
+from sharding import on_user_shard, scatter
+
+FIELDS = ("title", "author", "genre")
+SCAN_LIMIT = 256  # longer runs are ranked once and memoized
+MEMO_SIZE = 50  # suggestions kept per memoized prefix, the most one lookup returns
+_END = "\U0010ffff"  # sorts after any character in a key
+
+
+class FieldIndex:
+    """The values of one field, searchable by prefix."""
+
+    def __init__(self, counts: Iterable[Tuple[str, int]] = ()):
+        self.entries: Dict[str, list] = {}  # key -> [display name, book count]
+        for value, count in counts:
+            self._add(value, count)
+        self.keys = sorted(self.entries)
+        self._top: Dict[str, List[str]] = {}  # prefix -> its best keys, best first
+        self._lock = threading.Lock()
+
+    def _add(self, value: str, count: int) -> None:
+        entry = self.entries.get(lookup_key(value))
+        if entry is None:
+            self.entries[lookup_key(value)] = [value.strip(), count]
+        else:
+            entry[1] += count
+
+    def _rank(self, key: str):
+        return -self.entries[key][1], key
+
+    def lookup(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """(display name, book count) of the `limit` most common values starting with `prefix`."""
+        prefix = prefix.strip().casefold()
+        with self._lock:
+            top = self._top.get(prefix)
+            if top is None:
+                start = bisect_left(self.keys, prefix)
+                end = bisect_left(self.keys, prefix + _END, start)
+                if end - start > SCAN_LIMIT:
+                    top = self._top[prefix] = heapq.nsmallest(
+                        MEMO_SIZE, self.keys[start:end], key=self._rank
+                    )
+                else:
+                    top = heapq.nsmallest(limit, self.keys[start:end], key=self._rank)
+            return [tuple(self.entries[key]) for key in top[:limit]]
+
+    def update(self, deltas: Dict[str, int]) -> None:
+        """Add deltas[value] books to each value; values left with none are dropped."""
+        with self._lock:
+            for value, delta in deltas.items():
+                key = lookup_key(value)
+                entry = self.entries.get(key)
+                if entry is None:
+                    if delta <= 0:
+                        continue
+                    entry = self.entries[key] = [value.strip(), 0]
+                    insort(self.keys, key)
+                entry[1] += delta
+                self._rerank(key, delta)
+                if entry[1] <= 0:
+                    del self.entries[key]
+                    del self.keys[bisect_left(self.keys, key)]
+
+    def _rerank(self, key: str, delta: int) -> None:
+        # patch the memoized rankings of the key's prefixes rather than dropping them,
+        # so a steady stream of creates doesn't send "a" back to a full scan
+        gone = self.entries[key][1] <= 0
+        for i in range(len(key) + 1):
+            top = self._top.get(key[:i])
+            if top is None:
+                continue
+            if key in top and (gone or delta < 0) and len(top) == MEMO_SIZE:
+                # a key outside the memo may now outrank it
+                del self._top[key[:i]]
+                continue
+            if key in top:
+                top.remove(key)
+            if not gone:
+                top.append(key)
+                top.sort(key=self._rank)
+                del top[MEMO_SIZE:]
+
+
+class Suggestions:
+    """
+    FieldIndexes per owner (a user id, or None for every book), built lazily
+    and rebuilt every refresh_seconds. The least recently used owners are
+    dropped beyond max_owners. A build holds only its own owner and field's
+    lock, so it never stalls lookups of indexes already built.
+    """
+
+    def __init__(self, refresh_seconds: float = 60.0, max_owners: int = 1000):
+        self.refresh_seconds = refresh_seconds
+        self.max_owners = max_owners
+        self._owners: "OrderedDict[Optional[int], Dict[str, Tuple[FieldIndex, float]]]" = OrderedDict()
+        self._building: Dict[Tuple[Optional[int], str], threading.Lock] = {}
+        self._lock = threading.Lock()  # guards _owners and _building, never held over a query
+
+    def _fresh(self, owner: Optional[int], field: str) -> Optional[FieldIndex]:
+        built = self._owners.get(owner, {}).get(field)
+        if built is None or time.monotonic() - built[1] > self.refresh_seconds:
+            return None
+        return built[0]
+
+    def index(self, owner: Optional[int], field: str) -> FieldIndex:
+        key = (owner, field)
+        with self._lock:
+            built = self._owners.get(owner, {}).get(field)
+            if built is not None:
+                self._owners.move_to_end(owner)
+                if self._fresh(owner, field) is not None:
+                    return built[0]
+            building = self._building.setdefault(key, threading.Lock())
+
+        # one build per owner and field at a time; lookups of other owners go on,
+        # and while an index is rebuilt the old one keeps answering
+        if not building.acquire(blocking=built is None):
+            return built[0]
+        try:
+            with self._lock:
+                index = self._fresh(owner, field)
+            if index is None:
+                # writes committed while this runs may be counted twice or missed
+                # until the next rebuild
+                index = _build(owner, field)
+                with self._lock:
+                    self._owners.setdefault(owner, {})[field] = (index, time.monotonic())
+                    self._owners.move_to_end(owner)
+                    while len(self._owners) > self.max_owners:
+                        self._owners.popitem(last=False)
+            return index
+        finally:
+            with self._lock:
+                if self._building.get(key) is building:
+                    del self._building[key]
+            building.release()
+
+    def lookup(self, owner: Optional[int], field: str, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        return self.index(owner, field).lookup(prefix, limit)
+
+    def record(self, added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> None:
+        """Count committed books in or out of their owner's indexes and the global ones built so far."""
+        deltas: Dict[Tuple[Optional[int], str], Dict[str, int]] = {}
+        for books, sign in ((added, 1), (removed, -1)):
+            for book in books:
+                for owner in (None, book.get("user_id")):
+                    for field in FIELDS:
+                        value = book.get(field)
+                        if value and value.strip():
+                            counts = deltas.setdefault((owner, field), {})
+                            counts[value] = counts.get(value, 0) + sign
+        with self._lock:
+            for (owner, field), counts in deltas.items():
+                built = self._owners.get(owner, {}).get(field)
+                counts = {value: delta for value, delta in counts.items() if delta}
+                if built is not None and counts:
+                    built[0].update(counts)
+
+    def forget(self, owners: Iterable[int]) -> None:
+        """Drop the indexes of `owners` and the global ones, after writes record() didn't see."""
+        with self._lock:
+            for owner in (None, *owners):
+                self._owners.pop(owner, None)
+
+
+def _build(owner: Optional[int], field: str) -> FieldIndex:
+    from repositories.book_repo import get_value_counts  # book_repo calls record()
+
+    if owner is None:
+        return FieldIndex(row for rows in scatter(get_value_counts, field) for row in rows)
+    with on_user_shard(owner):
+        return FieldIndex(get_value_counts(field, owner))
+
+
+# -----------------------------------------------------------------------------
+# Entry points
+# -----------------------------------------------------------------------------
+
+def lookup(owner: Optional[int], field: str, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+    """Suggestions from the books of user `owner`, or from every book when owner is None."""
+    return current_app.extensions["suggest"].lookup(owner, field, prefix, limit)
+
+
+def book_values(book) -> dict:
+    """The indexed fields and owner of a Book, for record()."""
+    return {field: getattr(book, field) for field in FIELDS + ("user_id",)}
+
+
+def _suggestions() -> Optional[Suggestions]:
+    return current_app.extensions.get("suggest") if has_app_context() else None
+
+
+def record(added: Iterable[dict] = (), removed: Iterable[dict] = ()) -> None:
+    """Called by book_repo.py after committing: the field values and user_id of books created and removed."""
+    suggestions = _suggestions()
+    if suggestions is not None:
+        suggestions.record(added, removed)
+
+
+def forget(owners: Iterable[int]) -> None:
+    """Called after bulk deletes (admin_service.py) by the owners of the books they removed."""
+    suggestions = _suggestions()
+    if suggestions is not None:
+        suggestions.forget(owners)
+
+
+def init_app(app) -> None:
+    app.extensions["suggest"] = Suggestions(
+        refresh_seconds=float(app.config.get("SUGGEST_REFRESH_SECONDS", 60.0)),
+        max_owners=int(app.config.get("SUGGEST_MAX_OWNERS", 1000)),
+    )
@@ -1,11 +1,13 @@
 import os
 import sys
 import pytest
+from flask_jwt_extended import create_access_token
 
 # Add backend root to Python path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from extensions import db
+from instrumentation import metrics
 from services.auth_service import register_user
 from models import User
 
@@ -15,11 +17,14 @@ def app():
     # Important: create a fresh app for tests using sqlite in-memory
     from library_app import create_app
 
-    app = create_app("dev")
-    app.config.update(
-        TESTING=True,
-        SQLALCHEMY_DATABASE_URI="sqlite:///:memory:",
-        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    app = create_app(
+        "dev",
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            "METRICS_TOKEN": "test-metrics-token",
+        },
     )
 
     with app.app_context():
@@ -60,3 +65,50 @@ def regular_user(app, regular_user_id):
     """Return a fresh regular ORM object bound to the current session."""
     with app.app_context():
         return db.session.get(User, regular_user_id)
+
+
+@pytest.fixture
+def other_user_id(app):
+    """Return a second regular user id, for checks across owners."""
+    with app.app_context():
+        user = register_user("Other", "other@test.com", "Other123!@#")
+        db.session.commit()
+        return user.id
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Return a function building the Authorization header for a user id."""
+    def headers(user_id):
+        with app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"}
+
+    return headers
+
+
+@pytest.fixture
+def tokens(auth_headers, regular_user_id, admin_user_id):
+    """Return (regular user headers, admin headers)."""
+    return auth_headers(regular_user_id), auth_headers(admin_user_id)
+
+
+@pytest.fixture
+def owner_tokens(auth_headers, regular_user_id, admin_user_id, other_user_id):
+    """Return the headers of the regular user, the admin and a second user, by name."""
+    return {
+        name: auth_headers(uid)
+        for name, uid in (("user", regular_user_id), ("admin", admin_user_id), ("other", other_user_id))
+    }
+
+
+@pytest.fixture
+def client_headers(app, auth_headers, regular_user_id):
+    """Return a test client and the regular user's headers, with fresh metrics."""
+    metrics.reset()
+    return app.test_client(), auth_headers(regular_user_id)
+
+
+@pytest.fixture
+def metrics_headers(app):
+    """Return the headers a Prometheus scraper sends for /api/metrics."""
+    return {"Authorization": f"Bearer {app.config['METRICS_TOKEN']}"}
@@ -0,0 +1,150 @@
+import pytest
+from cache import bump_versions
+from extensions import db
+from models import Book, User
+from services.auth_service import register_user
+from services.admin_service import (
+    AdminError,
+    get_admin_summary,
+    list_users_admin,
+    bulk_update_role_admin,
+    bulk_delete_users_admin,
+    bulk_delete_books_admin,
+)
+
+
+@pytest.fixture
+def library(app, regular_user_id, admin_user_id):
+    with app.app_context():
+        db.session.add_all([
+            Book(title="Dune", genre="Sci-Fi", price=10, pages=400,
+                 reading_status="completed", user_id=regular_user_id),
+            Book(title="Emma", genre="Classic", price=20, pages=200,
+                 reading_status="reading", user_id=regular_user_id),
+            Book(title="Solaris", genre="Sci-Fi", pages=300,
+                 reading_status="reading", user_id=admin_user_id),
+        ])
+        db.session.commit()
+
+
+def test_admin_summary_totals(app, admin_user, library):
+    with app.app_context():
+        summary = get_admin_summary(admin_user)
+        assert summary["users"] == {"total": 2, "by_role": {"admin": 1, "user": 1}}
+        books = summary["books"]
+        assert books["total"] == 3
+        assert books["by_status"] == {"completed": 1, "reading": 2}
+        assert books["by_genre"] == {"Sci-Fi": 2, "Classic": 1}
+        assert books["total_price"] == 30.0
+        assert books["average_price"] == 15.0
+        assert books["average_pages"] == 300.0
+
+
+def test_admin_summary_invalidated_by_writes(app, admin_user, regular_user_id, library):
+    with app.app_context():
+        assert get_admin_summary(admin_user)["books"]["total"] == 3
+
+        db.session.add(Book(title="New", user_id=regular_user_id))
+        db.session.commit()
+        assert get_admin_summary(admin_user)["books"]["total"] == 4
+
+        Book.query.filter_by(title="New").delete()
+        db.session.commit()
+        assert get_admin_summary(admin_user)["books"]["total"] == 3
+
+
+def test_admin_summary_sees_other_workers_writes(app, admin_user, regular_user_id, library):
+    with app.app_context():
+        assert get_admin_summary(admin_user)["books"]["total"] == 3
+
+        # another worker's commit: the row lands without this process's session
+        # events, followed by that worker's bump of cache_versions
+        with db.engine.begin() as connection:
+            connection.execute(Book.__table__.insert(), {"title": "Elsewhere", "user_id": regular_user_id})
+        bump_versions([regular_user_id])
+        assert get_admin_summary(admin_user)["books"]["total"] == 4
+
+
+def test_admin_summary_requires_admin(app, regular_user):
+    with app.app_context():
+        with pytest.raises(AdminError):
+            get_admin_summary(regular_user)
+
+
+def test_list_users_with_book_counts(app, admin_user, library):
+    with app.app_context():
+        rows, next_cursor = list_users_admin(admin_user)
+        counts = {u.email: c for u, c in rows}
+        assert counts == {"user@test.com": 2, "admin@test.com": 1}
+        assert next_cursor is None
+
+
+def test_list_users_cursor_pagination_and_search(app, admin_user):
+    with app.app_context():
+        for i in range(5):
+            register_user(f"Reader {i}", f"reader{i}@test.com", "Reader123!@#")
+
+        seen = []
+        rows, cursor = list_users_admin(admin_user, limit=2, search="READER")
+        seen += [u.email for u, _ in rows]
+        while cursor:
+            rows, cursor = list_users_admin(admin_user, limit=2, cursor=cursor, search="reader")
+            seen += [u.email for u, _ in rows]
+
+        assert sorted(seen) == [f"reader{i}@test.com" for i in range(5)]
+        assert len(seen) == len(set(seen))
+
+        with pytest.raises(ValueError):
+            list_users_admin(admin_user, limit=2, cursor="not-a-cursor")
+
+
+def test_list_users_pages_past_users_without_created_at(app, admin_user):
+    with app.app_context():
+        for i in range(4):
+            register_user(f"Reader {i}", f"reader{i}@test.com", "Reader123!@#")
+        db.session.query(User).filter(User.email.in_(["reader1@test.com", "reader3@test.com"])).update(
+            {User.created_at: None}, synchronize_session=False
+        )
+        db.session.commit()
+
+        seen = []
+        rows, cursor = list_users_admin(admin_user, limit=1, search="reader")
+        seen += [u.email for u, _ in rows]
+        while cursor:
+            rows, cursor = list_users_admin(admin_user, limit=1, cursor=cursor, search="reader")
+            seen += [u.email for u, _ in rows]
+
+        assert seen[2:] == ["reader3@test.com", "reader1@test.com"]
+        assert sorted(seen) == [f"reader{i}@test.com" for i in range(4)]
+
+
+def test_bulk_role_update(app, admin_user, regular_user_id):
+    with app.app_context():
+        results = bulk_update_role_admin(
+            admin_user, [regular_user_id, admin_user.id, 9999], "admin"
+        )
+        assert [r["status"] for r in results] == ["updated", "skipped_self", "not_found"]
+        assert db.session.get(User, regular_user_id).role == "admin"
+
+        with pytest.raises(AdminError):
+            bulk_update_role_admin(admin_user, [regular_user_id], "owner")
+
+
+def test_bulk_delete_users_removes_their_books(app, admin_user, regular_user_id, library):
+    with app.app_context():
+        results = bulk_delete_users_admin(admin_user, [regular_user_id, admin_user.id])
+        assert [r["status"] for r in results] == ["deleted", "skipped_self"]
+        assert db.session.get(User, regular_user_id) is None
+        assert Book.query.filter_by(user_id=regular_user_id).count() == 0
+        assert Book.query.count() == 1
+
+
+def test_bulk_delete_books(app, admin_user, library):
+    with app.app_context():
+        ids = [b.id for b in Book.query.filter(Book.genre == "Sci-Fi").all()]
+        results = bulk_delete_books_admin(admin_user, ids + [ids[0], 9999])
+        assert [r["status"] for r in results] == ["deleted", "deleted", "not_found"]
+        assert Book.query.count() == 1
+
+        with pytest.raises(AdminError):
+            bulk_delete_books_admin(admin_user, [])
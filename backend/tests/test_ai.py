@@ -8,7 +8,7 @@ from services.ai_service import (
     get_recommendations,
     get_insights,
     _sanitize_input,
-    _parse_intent,
+    parse_intent,
 )
 
 @pytest.fixture
@@ -71,25 +71,25 @@ def test_sanitize_input(app):
 def test_parse_intent_valid_queries(app):
     """Test intent parsing for valid queries."""
     with app.app_context():
-        assert _parse_intent("Who owns the most books?") == "owner_with_most_books"
-        assert _parse_intent("Which is the most popular book?") == "most_popular_book"
-        assert _parse_intent("Show the five most expensive books") == "five_most_expensive_books"
-        assert _parse_intent("5 most expensive") == "five_most_expensive_books"
+        assert parse_intent("Who owns the most books?") == "owner_with_most_books"
+        assert parse_intent("Which is the most popular book?") == "most_popular_book"
+        assert parse_intent("Show the five most expensive books") == "five_most_expensive_books"
+        assert parse_intent("5 most expensive") == "five_most_expensive_books"
 
 
 def test_parse_intent_malicious_inputs(app):
     """Test intent parsing rejects malicious inputs."""
     with app.app_context():
         # SQL injection attempts
-        assert _parse_intent("'; DROP TABLE books; --") is None
-        assert _parse_intent("1' OR '1'='1") is None
+        assert parse_intent("'; DROP TABLE books; --") is None
+        assert parse_intent("1' OR '1'='1") is None
         
         # XSS attempts
-        assert _parse_intent("<script>alert('xss')</script>") is None
+        assert parse_intent("<script>alert('xss')</script>") is None
         
         # Invalid queries
-        assert _parse_intent("DELETE FROM books") is None
-        assert _parse_intent("SELECT * FROM users") is None
+        assert parse_intent("DELETE FROM books") is None
+        assert parse_intent("SELECT * FROM users") is None
 
 
 def test_ai_query_authorization(app, regular_user, admin_user, test_books):
@@ -127,6 +127,8 @@ def test_ai_query_malicious_prompts(app, regular_user):
             handle_ai_query("", regular_user)
         with pytest.raises(AIError):
             handle_ai_query("ab", regular_user)
+        with pytest.raises(AIError, match="too long"):
+            handle_ai_query("most popular book " + "x" * 500, regular_user)
 
 
 def test_recommendations_user_scope(app, regular_user, admin_user, test_books):
@@ -218,7 +220,7 @@ def test_parse_intent_enhanced_patterns(app):
     """Test enhanced intent patterns."""
     with app.app_context():
         # Test new variations
-        assert _parse_intent("biggest book collector") == "owner_with_most_books"
-        assert _parse_intent("most read book") == "most_popular_book"
-        assert _parse_intent("top 5 expensive") == "five_most_expensive_books"
-        assert _parse_intent("costliest books") == "five_most_expensive_books"
+        assert parse_intent("biggest book collector") == "owner_with_most_books"
+        assert parse_intent("most read book") == "most_popular_book"
+        assert parse_intent("top 5 expensive") == "five_most_expensive_books"
+        assert parse_intent("costliest books") == "five_most_expensive_books"
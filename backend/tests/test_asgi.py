@@ -0,0 +1,211 @@
+import asyncio
+import json
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from extensions import db
+from models import Book, User
+from services.auth_service import register_user
+
+pytest.importorskip("aiosqlite")
+
+
+def _call(asgi, method, path, token, body=b"", cookie=None):
+    """Drive one HTTP request through an ASGI app and return (status, json)."""
+    path, _, query = path.partition("?")
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": headers,
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        await asgi(scope, receive, send)
+        await asgi.dispose()
+
+    asyncio.run(run())
+    return sent[0]["status"], json.loads(sent[1]["body"])
+
+
+@pytest.fixture
+def shared_db(tmp_path):
+    """A Flask app and an ASGI app over the same SQLite file."""
+    from library_app import create_app
+    from asgi_app import create_asgi_app
+
+    overrides = {"TESTING": True, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'lib.db'}"}
+    app = create_app("dev", overrides)
+    with app.app_context():
+        db.create_all()
+        user = register_user("Reader", "reader@test.com", "Reader123!@#")
+        db.session.add_all([
+            Book(title="Dune", genre="Sci-Fi", pages=400, price=9.5,
+                 reading_status="completed", user_id=user.id),
+            Book(title="Emma", genre="Classic", pages=300,
+                 reading_status="reading", user_id=user.id),
+            Book(title="Solaris", genre="Sci-Fi", pages=200,
+                 reading_status="planned", user_id=user.id),
+        ])
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        yield app, create_asgi_app("dev", overrides), token
+        db.session.remove()
+
+
+@pytest.mark.parametrize("path", [
+    "/api/books/",
+    "/api/books/?genre=sci-fi",
+    "/api/books/?facets=genre,status&limit=2",
+    "/api/books/?facets=&genre=sci-fi&limit=1&offset=1",
+    "/api/books/?limit=x",
+    "/api/ai/insights",
+])
+def test_asgi_matches_flask(shared_db, path):
+    app, asgi, token = shared_db
+    flask_res = app.test_client().get(path, headers={"Authorization": f"Bearer {token}"})
+
+    status, body = _call(asgi, "GET", path, token)
+    assert status == flask_res.status_code == 200
+    assert body == flask_res.get_json()
+
+
+def test_asgi_ai_query(shared_db):
+    _, asgi, token = shared_db
+    status, body = _call(
+        asgi, "POST", "/api/ai/query", token,
+        json.dumps({"question": "Show the five most expensive books"}).encode(),
+    )
+    assert status == 200
+    assert [b["title"] for b in body["books"]] == ["Dune"]
+
+
+def test_asgi_ai_query_validates_like_flask(shared_db):
+    app, asgi, token = shared_db
+    question = "Show the five most expensive books " + "please " * 80
+    status, body = _call(asgi, "POST", "/api/ai/query", token, json.dumps({"question": question}).encode())
+    flask_res = app.test_client().post(
+        "/api/ai/query", json={"question": question}, headers={"Authorization": f"Bearer {token}"}
+    )
+    assert status == flask_res.status_code == 400
+    assert body == flask_res.get_json() == {"message": "Question is too long (max 500 characters)."}
+
+
+def test_asgi_rejects_bad_token(shared_db):
+    _, asgi, _ = shared_db
+    status, _ = _call(asgi, "GET", "/api/books/", "not-a-token")
+    assert status == 401
+
+
+def test_asgi_bad_facet_is_a_400(shared_db):
+    _, asgi, token = shared_db
+    status, body = _call(asgi, "GET", "/api/books/?facets=price", token)
+    assert status == 400 and body["message"].startswith("Unknown facet")
+
+
+def test_asgi_unhandled_error_is_a_500(shared_db, monkeypatch):
+    from repositories import async_book_repo
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    _, asgi, token = shared_db
+    monkeypatch.setattr(async_book_repo, "get_books_for_user", broken)
+    status, body = _call(asgi, "GET", "/api/books/", token)
+    assert status == 500 and body == {"message": "Internal server error."}
+
+
+def test_asgi_reads_the_replica_unless_the_client_just_wrote(tmp_path):
+    import time
+
+    from asgi_app import create_asgi_app
+    from db_routing import STICKY_COOKIE
+    from library_app import create_app
+
+    overrides = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "REPLICA_DATABASE_URL": f"sqlite:///{tmp_path / 'replica.db'}",
+    }
+    app = create_app("dev", overrides)
+    with app.app_context():
+        replica = db.engines["replica"]
+        db.create_all()
+        db.metadata.create_all(replica)
+        for engine, title in ((db.engine, "On primary"), (replica, "On replica")):
+            with engine.begin() as conn:
+                conn.execute(User.__table__.insert(), {"id": 1, "name": "R", "email": "r@test.com", "password_hash": "x"})
+                conn.execute(Book.__table__.insert(), {"title": title, "user_id": 1})
+        token = create_access_token(identity="1")
+    db.metadatas.pop("replica", None)
+
+    asgi = create_asgi_app("dev", overrides)
+    _, body = _call(asgi, "GET", "/api/books/", token)
+    assert [b["title"] for b in body] == ["On replica"]
+    _, body = _call(asgi, "GET", "/api/books/", token, cookie=f"{STICKY_COOKIE}=1:{time.time()}")
+    assert [b["title"] for b in body] == ["On primary"]
+
+
+def test_asgi_streams_book_events_written_through_flask(shared_db):
+    app, asgi, token = shared_db
+    asgi.book_events.backend.interval = 0.01
+    scope = {
+        "type": "http", "method": "GET", "path": "/api/books/stream", "query_string": b"",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+    }
+    sent = []
+
+    async def run():
+        gone = asyncio.Event()
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        stream = asyncio.ensure_future(asgi(scope, receive, send))
+        for _ in range(200):  # until the first poll has found where the log ends
+            if asgi.book_events.backend._cursor is not None:
+                break
+            await asyncio.sleep(0.01)
+        def write():
+            app.test_client().post("/api/books/", json={"title": "Live"}, headers={"Authorization": f"Bearer {token}"})
+
+        await asyncio.get_running_loop().run_in_executor(None, write)
+        for _ in range(200):
+            if len(sent) > 2:
+                break
+            await asyncio.sleep(0.01)
+        gone.set()
+        await stream
+        assert not asgi.book_events.listening
+        await asgi.dispose()
+
+    asyncio.run(run())
+    assert sent[0]["status"] == 200 and (b"content-type", b"text/event-stream") in sent[0]["headers"]
+    event = sent[2]["body"].decode().split("\n")
+    assert event[0] == "event: create" and json.loads(event[1][len("data: "):])["title"] == "Live"
+
+
+def test_asgi_streams_are_capped_and_admin_only(shared_db):
+    _, asgi, token = shared_db
+    assert _call(asgi, "GET", "/api/admin/books/stream", token) == (403, {"message": "Not authorized"})
+    asgi.book_events.max_clients = 0
+    assert _call(asgi, "GET", "/api/books/stream", token)[0] == 503
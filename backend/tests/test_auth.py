@@ -6,9 +6,10 @@ from services.auth_service import register_user, authenticate_user, AuthError
 @pytest.fixture
 def app():
     from library_app import create_app
-    app = create_app("dev")
-    app.config["TESTING"] = True
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app = create_app(
+        "dev",
+        {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:"},
+    )
     
     with app.app_context():
         db.create_all()
@@ -0,0 +1,84 @@
+import json
+
+from book_events import ChangeLogBackend
+
+
+def _events(response, count):
+    """The next `count` SSE events as (event, data) pairs."""
+    events = []
+    for chunk in response.response:
+        lines = chunk.decode().strip().split("\n")
+        if lines[0].startswith("event: "):
+            events.append((lines[0][len("event: "):], json.loads(lines[1][len("data: "):])))
+            if len(events) == count:
+                return events
+    return events
+
+
+def test_stream_pushes_the_callers_own_changes(app, owner_tokens):
+    user = owner_tokens["user"]
+    client = app.test_client()
+    stream = client.get("/api/books/stream", headers=user, buffered=False)
+    assert stream.mimetype == "text/event-stream"
+
+    client.post("/api/books/", json={"title": "Someone else's"}, headers=owner_tokens["other"])
+    book = client.post("/api/books/", json={"title": "Mine", "price": 12}, headers=user).get_json()
+    client.put(f"/api/books/{book['id']}", json={"reading_status": "completed"}, headers=user)
+    client.delete(f"/api/books/{book['id']}", headers=user)
+
+    events = _events(stream, 3)
+    assert [e for e, _ in events] == ["create", "update", "delete"]
+    assert events[0][1]["title"] == "Mine" and events[0][1]["price"] == 12
+    assert events[1][1]["reading_status"] == "completed"
+    assert events[2][1] == {"id": book["id"], "user_id": book["user_id"]}
+    stream.close()
+
+
+def test_admin_stream_sees_every_owner_and_bulk_deletes(app, owner_tokens):
+    client = app.test_client()
+    assert client.get("/api/admin/books/stream", headers=owner_tokens["user"]).status_code == 403
+    stream = client.get("/api/admin/books/stream", headers=owner_tokens["admin"], buffered=False)
+
+    ids = [
+        client.post("/api/books/", json={"title": name}, headers=owner_tokens[name]).get_json()["id"]
+        for name in ("user", "other")
+    ]
+    client.post("/api/admin/books/bulk-delete", json={"ids": ids}, headers=owner_tokens["admin"])
+
+    events = _events(stream, 4)
+    assert [(e, d["id"]) for e, d in events] == [
+        ("create", ids[0]), ("create", ids[1]), ("delete", ids[0]), ("delete", ids[1]),
+    ]
+    stream.close()
+
+
+def test_streams_per_worker_are_capped(app, owner_tokens):
+    client = app.test_client()
+    open_streams = [client.get("/api/books/stream", headers=owner_tokens["user"], buffered=False) for _ in range(2)]
+    refused = client.get("/api/books/stream", headers=owner_tokens["user"])
+    assert refused.status_code == 503 and refused.headers["Retry-After"]
+
+    open_streams[0].close()  # closing releases the slot, even before any event was read
+    again = client.get("/api/books/stream", headers=owner_tokens["user"], buffered=False)
+    assert again.status_code == 200
+    again.close()
+    open_streams[1].close()
+
+
+def test_change_log_backend_replays_writes_from_any_process(app, owner_tokens, regular_user_id):
+    backend = ChangeLogBackend(app)
+    client = app.test_client()
+    client.post("/api/books/", json={"title": "Before"}, headers=owner_tokens["user"])
+    with app.app_context():
+        assert backend.poll() == []  # the first poll only finds the end of the log
+
+    book_id = client.post("/api/books/", json={"title": "After"}, headers=owner_tokens["user"]).get_json()["id"]
+    with app.app_context():
+        assert [(c["op"], c["book"]["title"]) for c in backend.poll()] == [("create", "After")]
+
+    client.put(f"/api/books/{book_id}", json={"pages": 10}, headers=owner_tokens["user"])
+    client.delete(f"/api/books/{book_id}", headers=owner_tokens["user"])
+    with app.app_context():
+        # the update's book is gone by the time of the poll; only the delete is sent
+        assert backend.poll() == [{"op": "delete", "book": {"id": book_id, "user_id": regular_user_id}}]
+        assert backend.poll() == []
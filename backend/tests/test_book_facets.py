@@ -0,0 +1,56 @@
+import pytest
+
+from services.book_service import create_book_for_user
+
+
+@pytest.fixture
+def library(app, auth_headers, regular_user, admin_user):
+    with app.app_context():
+        for title, genre, status, author in [
+            ("Dune", "Sci-Fi", "completed", "Frank Herbert"),
+            ("Children of Dune", "sci-fi", "reading", "Frank Herbert"),
+            ("Solaris", "Sci-Fi", "planned", "Stanislaw Lem"),
+            ("Emma", "Classic", "reading", "Jane Austen"),
+            ("Persuasion", "Classic", "reading", "Jane Austen"),
+            ("Notes", None, "planned", None),
+        ]:
+            create_book_for_user(
+                regular_user,
+                {"title": title, "genre": genre, "reading_status": status, "author": author},
+            )
+        create_book_for_user(admin_user, {"title": "Admin's", "genre": "Horror"})
+    return {"user": auth_headers(regular_user.id), "admin": auth_headers(admin_user.id)}
+
+
+def _facet(body, name):
+    return {entry["value"]: entry["count"] for entry in body["facets"][name]}
+
+
+def test_facets_count_the_other_filters(app, library):
+    client = app.test_client()
+    res = client.get("/api/books/?genre=SCI-FI&status=reading&facets=genre,status,author", headers=library["user"])
+    assert res.status_code == 200
+    body = res.get_json()
+
+    assert [b["title"] for b in body["items"]] == ["Children of Dune"]
+    assert body["total"] == 1
+    # each facet ignores its own filter: other genres among reading books,
+    # other statuses among sci-fi books
+    assert _facet(body, "genre") == {"Sci-Fi": 1, "Classic": 2}
+    assert _facet(body, "status") == {"completed": 1, "reading": 1, "planned": 1}
+    assert _facet(body, "author") == {"Frank Herbert": 1}
+
+
+def test_facets_page_and_totals(app, library):
+    client = app.test_client()
+    body = client.get("/api/books/?facets=status&limit=2&offset=1", headers=library["user"]).get_json()
+    assert (body["total"], body["limit"], body["offset"]) == (6, 2, 1)
+    assert [b["title"] for b in body["items"]] == ["Persuasion", "Emma"]  # newest first
+    assert body["facets"]["status"][0] == {"value": "reading", "count": 3}
+
+    admin = client.get("/api/books/?facets=genre", headers=library["admin"]).get_json()
+    assert admin["total"] == 7 and _facet(admin, "genre")["Horror"] == 1
+
+    # the plain list is unchanged without facets or limit
+    assert len(client.get("/api/books/?author=jane austen", headers=library["user"]).get_json()) == 2
+    assert client.get("/api/books/?facets=price", headers=library["user"]).status_code == 400
@@ -0,0 +1,127 @@
+import threading
+import time
+
+import pytest
+
+from services.book_service import create_book_for_user, delete_book_for_user, update_book_for_user
+import suggest
+from suggest import MEMO_SIZE, SCAN_LIMIT, FieldIndex, Suggestions
+
+
+@pytest.fixture
+def library(app, auth_headers, regular_user, admin_user):
+    with app.app_context():
+        for title, author, genre in [
+            ("Dune", "Frank Herbert", "Sci-Fi"),
+            ("Dune Messiah", "Frank Herbert", "sci-fi"),
+            ("Children of Dune", "Frank Herbert", "Sci-Fi"),
+            ("Frankenstein", "Mary Shelley", "Horror"),
+            ("Emma", "Jane Austen", "Classic"),
+        ]:
+            create_book_for_user(regular_user, {"title": title, "author": author, "genre": genre})
+        create_book_for_user(admin_user, {"title": "Fahrenheit 451", "author": "Ray Bradbury", "genre": "Sci-Fi"})
+    return {"user": auth_headers(regular_user.id), "admin": auth_headers(admin_user.id)}
+
+
+def _suggest(client, headers, query):
+    res = client.get(f"/api/books/suggest?{query}", headers=headers)
+    assert res.status_code == 200
+    return [(s["value"], s["count"]) for s in res.get_json()["suggestions"]]
+
+
+def test_suggestions_rank_values_by_book_count(app, library):
+    client = app.test_client()
+    user = library["user"]
+    # names match case-insensitively and show as first written
+    assert _suggest(client, user, "field=genre&prefix=S") == [("Sci-Fi", 3)]
+    assert _suggest(client, user, "field=author&prefix=fr") == [("Frank Herbert", 3)]
+    assert _suggest(client, user, "field=title&prefix=du") == [("Dune", 1), ("Dune Messiah", 1)]
+    assert _suggest(client, user, "field=author&prefix=")[:2] == [("Frank Herbert", 3), ("Jane Austen", 1)]
+    # users only see their own books' values, admins every book's
+    assert _suggest(client, user, "field=title&prefix=f") == [("Frankenstein", 1)]
+    assert _suggest(client, library["admin"], "field=title&prefix=f&limit=1") == [("Fahrenheit 451", 1)]
+    assert _suggest(client, library["admin"], "field=genre&prefix=S") == [("Sci-Fi", 4)]
+
+    assert client.get("/api/books/suggest?field=price&prefix=1", headers=user).status_code == 400
+
+
+def test_writes_update_built_indexes(app, library, regular_user):
+    client = app.test_client()
+    library = library["user"]
+    assert _suggest(client, library, "field=author&prefix=m") == [("Mary Shelley", 1)]
+    assert _suggest(client, library, "field=genre&prefix=h") == [("Horror", 1)]
+
+    with app.app_context():
+        book = create_book_for_user(regular_user, {"title": "The Last Man", "author": "mary shelley", "genre": "Horror"})
+        book_id = book.id
+    assert _suggest(client, library, "field=author&prefix=m") == [("Mary Shelley", 2)]
+
+    with app.app_context():
+        update_book_for_user(regular_user, book_id, {"author": "Matthew Lewis"})
+    assert _suggest(client, library, "field=author&prefix=m") == [("Mary Shelley", 1), ("Matthew Lewis", 1)]
+
+    with app.app_context():
+        delete_book_for_user(regular_user, book_id)
+    assert _suggest(client, library, "field=author&prefix=m") == [("Mary Shelley", 1)]
+    assert _suggest(client, library, "field=genre&prefix=h") == [("Horror", 1)]
+
+
+def test_bulk_deletes_drop_their_values(app, library):
+    client = app.test_client()
+    frankenstein = next(b["id"] for b in client.get("/api/books/", headers=library["user"]).get_json()
+                        if b["title"] == "Frankenstein")
+    assert _suggest(client, library["user"], "field=author&prefix=m") == [("Mary Shelley", 1)]
+    assert _suggest(client, library["admin"], "field=author&prefix=m") == [("Mary Shelley", 1)]
+
+    res = client.post("/api/admin/books/bulk-delete", json={"ids": [frankenstein]}, headers=library["admin"])
+    assert res.status_code == 200
+    assert _suggest(client, library["user"], "field=author&prefix=m") == []
+    assert _suggest(client, library["admin"], "field=author&prefix=m") == []
+
+
+def test_wide_prefixes_keep_their_ranking_current():
+    index = FieldIndex((f"a{i:04d}", 1) for i in range(SCAN_LIMIT * 2))
+    assert len(index.lookup("a", MEMO_SIZE)) == MEMO_SIZE  # ranked once and memoized
+
+    index.update({"a0300": 5, "A0400": 3, "b": 1})
+    assert index.lookup("a", 3) == [("a0300", 6), ("a0400", 4), ("a0000", 1)]
+
+    # dropping a memoized value re-ranks the prefix from the array
+    index.update({"a0300": -6, "a0000": -1})
+    assert index.lookup("a", 3) == [("a0400", 4), ("a0001", 1), ("a0002", 1)]
+    assert index.lookup("a03", 1) == [("a0301", 1)]
+
+
+def test_a_slow_build_blocks_only_its_own_index(monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def build(owner, field):
+        if owner == 1:
+            started.set()
+            release.wait(5)
+        return FieldIndex([(f"{field} of {owner}", 1)])
+
+    monkeypatch.setattr(suggest, "_build", build)
+    suggestions = Suggestions(refresh_seconds=0.05)
+    slow = threading.Thread(target=suggestions.lookup, args=(1, "title", "t"))
+    slow.start()
+    assert started.wait(5)
+
+    # other owners are built and looked up meanwhile, and writes recorded
+    assert suggestions.lookup(2, "title", "t") == [("title of 2", 1)]
+    suggestions.record(added=[{"title": "two", "user_id": 2}])
+    assert suggestions.lookup(2, "title", "tw") == [("two", 1)]
+    release.set()
+    slow.join(5)
+    assert suggestions.lookup(1, "title", "t") == [("title of 1", 1)]
+
+    # an expired index keeps answering while another thread rebuilds it
+    started.clear()
+    release.clear()
+    time.sleep(0.1)
+    slow = threading.Thread(target=suggestions.lookup, args=(1, "title", "t"))
+    slow.start()
+    assert started.wait(5)
+    assert suggestions.lookup(1, "title", "t") == [("title of 1", 1)]
+    release.set()
+    slow.join(5)
@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import book_writer
+
+
+@pytest.fixture
+def writer(app):
+    writer = app.extensions["book_writer"]
+    yield writer
+    assert writer.wait(timeout=5)
+
+
+def test_async_creates_are_written_in_one_batch(app, writer, tokens, regular_user_id):
+    user, admin = tokens
+    writer.batch_size = 5
+    writer.max_delay = 10  # the batch closes when full, not on time
+    commits = []
+
+    def committed(session):
+        commits.append(session)
+
+    event.listen(Session, "after_commit", committed)
+
+    client = app.test_client()
+    tickets = []
+    for n in range(5):
+        res = client.post("/api/books/?async=1", json={"title": f"Book {n}", "price": "9.5"}, headers=user)
+        assert res.status_code == 202
+        assert res.headers["Location"].endswith(res.get_json()["ticket"])
+        tickets.append(res.get_json()["ticket"])
+    assert writer.wait(timeout=5)
+
+    event.remove(Session, "after_commit", committed)
+    assert len(commits) == 1  # one transaction for the whole batch
+    statuses = [client.get(f"/api/books/tickets/{t}", headers=user).get_json() for t in tickets]
+    assert [s["status"] for s in statuses] == ["created"] * 5
+    assert statuses[0]["book"]["title"] == "Book 0" and statuses[0]["book"]["user_id"] == regular_user_id
+
+    listed = client.get("/api/books/", headers=user).get_json()
+    assert sorted(b["id"] for b in listed) == sorted(s["book"]["id"] for s in statuses)
+    assert client.get(f"/api/books/tickets/{tickets[0]}", headers=admin).status_code == 200
+
+
+def test_async_create_validates_up_front(app, writer, tokens):
+    user, _ = tokens
+    client = app.test_client()
+    res = client.post("/api/books/?async=1", json={"title": "X", "reading_status": "lost"}, headers=user)
+    assert res.status_code == 400
+    assert client.get("/api/books/tickets/nope", headers=user).status_code == 404
+
+
+def test_a_failing_row_fails_only_its_ticket(app, writer, tokens, auth_headers, regular_user_id, other_user_id):
+    user, admin = tokens
+    writer.batch_size = 2
+    writer.max_delay = 10
+    with app.app_context():
+        good = writer.submit(regular_user_id, {"title": "Fine"})
+        bad = writer.submit(regular_user_id, {"title": None})  # NOT NULL violation
+    assert writer.wait(timeout=5)
+
+    client = app.test_client()
+    assert client.get(f"/api/books/tickets/{good}", headers=user).get_json()["status"] == "created"
+    failed = client.get(f"/api/books/tickets/{bad}", headers=user).get_json()
+    assert failed["status"] == "failed" and failed["error"]
+    assert [b["title"] for b in client.get("/api/books/", headers=user).get_json()] == ["Fine"]
+
+    other = auth_headers(other_user_id)
+    assert client.get(f"/api/books/tickets/{good}", headers=admin).status_code == 200
+    assert client.get(f"/api/books/tickets/{good}", headers=other).status_code == 404
+
+
+def test_any_worker_can_read_a_ticket(app, writer, tokens, regular_user_id, monkeypatch):
+    user, _ = tokens
+    client = app.test_client()
+    ticket = client.post("/api/books/?async=1", json={"title": "Shared"}, headers=user).get_json()["ticket"]
+    assert writer.wait(timeout=5)
+
+    # another worker: its own writer, which never saw the ticket
+    other = book_writer.BookWriter(app)
+    monkeypatch.setitem(app.extensions, "book_writer", other)
+    body = client.get(f"/api/books/tickets/{ticket}", headers=user).get_json()
+    assert body["status"] == "created" and body["book"]["title"] == "Shared"
+    assert client.get(f"/api/books/tickets/{ticket[:-2]}xx", headers=user).status_code == 404
+
+    # signed but not written yet: queued, until it has waited too long
+    pending = other._signer.dumps({"id": "0" * 32, "user_id": regular_user_id})
+    assert client.get(f"/api/books/tickets/{pending}", headers=user).get_json()["status"] == "queued"
+    monkeypatch.setattr(book_writer, "PENDING_SECONDS", -1)
+    assert client.get(f"/api/books/tickets/{pending}", headers=user).get_json()["status"] == "failed"
@@ -1,6 +1,12 @@
 import pytest
-from models import Book
-from services.book_service import create_book_for_user, delete_book_for_user
+from extensions import db
+from models import Author, Book, Genre
+from services.book_service import (
+    create_book_for_user,
+    delete_book_for_user,
+    list_books_for_user,
+    update_book_for_user,
+)
 
 
 def test_create_book(app, regular_user):
@@ -23,3 +29,37 @@ def test_delete_book(app, regular_user):
         book = create_book_for_user(regular_user, {"title": "Test Book"})
         delete_book_for_user(regular_user, book.id)
         assert Book.query.get(book.id) is None
+
+
+def test_genres_and_authors_are_stored_once_per_key(app, regular_user, admin_user):
+    with app.app_context():
+        first = create_book_for_user(regular_user, {"title": "Dune", "genre": "Sci-Fi", "author": "Frank Herbert"})
+        create_book_for_user(regular_user, {"title": "Solaris", "genre": " sci-fi", "reading_status": "reading"})
+        create_book_for_user(admin_user, {"title": "Emma", "genre": "Classic", "author": "FRANK HERBERT "})
+
+        assert Genre.query.count() == 2 and Author.query.count() == 1
+        assert first.genre == "Sci-Fi" and first.author == "Frank Herbert"
+        assert {b.genre for b in Book.query} == {"Sci-Fi", "Classic"}  # as first written
+        # reading_status is a small integer in the table
+        assert sorted(db.session.execute(db.text("SELECT reading_status FROM books")).scalars()) == [0, 0, 1]
+
+        mine = list_books_for_user(regular_user, genre="SCI-FI", status="reading")
+        assert [b.title for b in mine] == ["Solaris"]
+        assert len(list_books_for_user(admin_user, genre="sci-fi")) == 2
+        assert list_books_for_user(admin_user, genre="horror") == []
+
+        update_book_for_user(regular_user, first.id, {"genre": "classic"})
+        assert first.genre == "Classic" and Genre.query.count() == 2
+
+
+def test_lookup_keys_compare_accents_on_mysql(app, regular_user):
+    from sqlalchemy.dialects import mysql
+    from sqlalchemy.schema import CreateTable
+
+    # MySQL's default collation would make these one key, and the second insert fail
+    for table in (Genre.__table__, Author.__table__):
+        assert "`key` VARCHAR({}) COLLATE utf8mb4_bin".format(table.c.key.type.length) in str(CreateTable(table).compile(dialect=mysql.dialect()))
+    with app.app_context():
+        create_book_for_user(regular_user, {"title": "A", "author": "Émile Zola"})
+        create_book_for_user(regular_user, {"title": "B", "author": "Emile Zola"})
+        assert sorted(a.name for a in Author.query) == ["Emile Zola", "Émile Zola"]
@@ -0,0 +1,73 @@
+import gzip
+import json
+
+import pytest
+from flask import Response
+
+from extensions import db
+from models import Book
+
+
+@pytest.fixture(autouse=True)
+def many_books(app, regular_user_id):
+    with app.app_context():
+        db.session.add_all([
+            Book(title=f"Book {i}", author="Author", genre="Fiction", user_id=regular_user_id)
+            for i in range(50)
+        ])
+        db.session.commit()
+
+
+def test_large_listing_is_gzipped(client_headers, metrics_headers):
+    client, headers = client_headers
+    res = client.get("/api/books/", headers={**headers, "Accept-Encoding": "gzip"})
+
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["Vary"]
+    books = json.loads(gzip.decompress(res.data))
+    assert len(books) == 50
+    assert int(res.headers["Content-Length"]) == len(res.data)
+
+    text = client.get("/api/metrics", headers=metrics_headers).get_data(as_text=True)
+    before = float(text.split('http_response_bytes_uncompressed_total{encoding="gzip"} ')[1].split()[0])
+    after = float(text.split('http_response_bytes_compressed_total{encoding="gzip"} ')[1].split()[0])
+    assert after < before
+
+
+def test_small_or_unaccepted_responses_stay_identity(client_headers):
+    client, headers = client_headers
+    small = client.get("/api/auth/me", headers={**headers, "Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in small.headers
+
+    plain = client.get("/api/books/", headers=headers)
+    assert "Content-Encoding" not in plain.headers
+
+    refused = client.get("/api/books/", headers={**headers, "Accept-Encoding": "gzip;q=0"})
+    assert "Content-Encoding" not in refused.headers
+
+
+def test_streamed_response_compressed_incrementally(app):
+    @app.get("/test/stream")
+    def stream():
+        return Response((json.dumps({"row": i}) + "\n" for i in range(100)),
+                        mimetype="application/json")
+
+    res = app.test_client().get("/test/stream", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Content-Length" not in res.headers
+    lines = gzip.decompress(res.data).decode().splitlines()
+    assert [json.loads(line)["row"] for line in lines] == list(range(100))
+
+
+@pytest.mark.parametrize("encoding,module", [("br", "brotli"), ("zstd", "zstandard")])
+def test_optional_encodings_preferred_when_installed(client_headers, encoding, module):
+    lib = pytest.importorskip(module)
+    client, headers = client_headers
+    res = client.get("/api/books/", headers={**headers, "Accept-Encoding": f"gzip, {encoding}"})
+
+    assert res.headers["Content-Encoding"] == encoding
+    if encoding == "br":
+        body = lib.decompress(res.data)
+    else:
+        body = lib.ZstdDecompressor().decompressobj().decompress(res.data)
+    assert len(json.loads(body)) == 50
@@ -0,0 +1,61 @@
+import os
+import runpy
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import text
+
+from extensions import db
+
+CONF = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py"))
+
+
+@pytest.fixture(autouse=True)
+def events_backend_env(monkeypatch):
+    # gunicorn.conf.py may set BOOK_EVENTS_BACKEND; setenv first so it is restored
+    monkeypatch.setenv("BOOK_EVENTS_BACKEND", "")
+    monkeypatch.delenv("BOOK_EVENTS_BACKEND")
+
+
+def test_sizing_from_env(monkeypatch):
+    monkeypatch.setenv("GUNICORN_WORKERS", "3")
+    monkeypatch.setenv("GUNICORN_THREADS", "1")
+    monkeypatch.setenv("GUNICORN_MAX_REQUESTS", "1000")
+    conf = runpy.run_path(CONF)
+
+    assert conf["workers"] == 3
+    assert conf["worker_class"] == "sync"
+    assert conf["preload_app"] is True
+    assert (conf["max_requests"], conf["max_requests_jitter"]) == (1000, 100)
+    assert conf["wsgi_app"] == "library_app:create_app()"
+
+
+def test_several_workers_share_book_events(monkeypatch):
+    monkeypatch.setenv("GUNICORN_WORKERS", "1")
+    runpy.run_path(CONF)
+    assert "BOOK_EVENTS_BACKEND" not in os.environ
+
+    monkeypatch.setenv("GUNICORN_WORKERS", "3")
+    runpy.run_path(CONF)
+    assert os.environ["BOOK_EVENTS_BACKEND"] == "changelog"
+
+    monkeypatch.setenv("BOOK_EVENTS_BACKEND", "local")  # an explicit choice stands
+    runpy.run_path(CONF)
+    assert os.environ["BOOK_EVENTS_BACKEND"] == "local"
+
+
+def test_post_fork_gives_worker_fresh_pools(tmp_path):
+    from library_app import create_app
+
+    app = create_app("prod", {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'fork.db'}"})
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        inherited = db.engine.pool
+        assert inherited.checkedin() == 1
+
+        conf = runpy.run_path(CONF)
+        conf["post_fork"](SimpleNamespace(app=SimpleNamespace(callable=app)), worker=None)
+
+        assert db.engine.pool is not inherited
+        assert db.engine.pool.checkedin() == 0
@@ -0,0 +1,15 @@
+def test_health_shallow(app):
+    client = app.test_client()
+    assert client.get("/api/health").get_json() == {"status": "ok"}
+
+
+def test_health_deep_reports_database_and_pool(app):
+    client = app.test_client()
+    res = client.get("/api/health?deep=1")
+    body = res.get_json()
+
+    assert res.status_code == 200
+    assert body["status"] == "ok"
+    assert body["database"]["ok"] is True
+    assert body["database"]["ping_ms"] >= 0
+    assert "checked_out" in body["pool"]
@@ -0,0 +1,34 @@
+def test_metrics_record_latency_status_and_sql(client_headers, metrics_headers):
+    client, headers = client_headers
+    client.post("/api/books/", json={"title": "Dune"}, headers=headers)
+    client.get("/api/books/", headers=headers)
+    client.get("/api/books/", headers=headers)
+
+    text = client.get("/api/metrics", headers=metrics_headers).get_data(as_text=True)
+
+    assert 'http_request_duration_seconds_count{endpoint="books.list_books"} 2' in text
+    assert 'http_requests_total{endpoint="books.list_books",status="200"} 2' in text
+    assert 'http_requests_total{endpoint="books.create_book_route",status="201"} 1' in text
+    assert 'http_request_duration_seconds_bucket{endpoint="books.list_books",le="+Inf"} 2' in text
+
+    sql_line = next(l for l in text.splitlines()
+                    if l.startswith('db_statements_total{endpoint="books.list_books"}'))
+    assert int(sql_line.split()[-1]) >= 4  # user lookup + listing, twice
+
+
+def test_metrics_require_the_scrape_token(client_headers):
+    client, headers = client_headers
+
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers=headers).status_code == 401  # a user's JWT is not enough
+    res = client.get("/api/metrics", headers={"Authorization": "Bearer wrong"})
+    assert res.status_code == 401
+    assert res.headers["WWW-Authenticate"] == "Bearer"
+
+
+def test_metrics_unmounted_without_a_token():
+    from library_app import create_app
+
+    app = create_app("dev", {"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                             "METRICS_TOKEN": None})
+    assert app.test_client().get("/api/metrics").status_code == 404
@@ -0,0 +1,47 @@
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+import json_provider
+from extensions import db
+from models import Book
+
+
+@pytest.fixture
+def admin_client(app, auth_headers, admin_user_id):
+    with app.app_context():
+        db.session.add(Book(title="Dune", price=Decimal("10.99"), user_id=admin_user_id))
+        db.session.commit()
+    return app.test_client(), auth_headers(admin_user_id)
+
+
+def test_decimal_and_datetime_encoded_natively():
+    data = json_provider.loads(json_provider.dumps_bytes({
+        "price": Decimal("10.99"),
+        "created_at": datetime(2024, 5, 1, 12, 30, 0, 250000),
+        None: 3,
+    }))
+    assert data == {"price": 10.99, "created_at": "2024-05-01T12:30:00.250000", "null": 3}
+
+
+def test_model_values_serialized_in_responses(admin_client):
+    client, headers = admin_client
+    books = client.get("/api/books/", headers=headers).get_json()
+    assert books[0]["price"] == 10.99
+
+    users = client.get("/api/admin/users", headers=headers).get_json()
+    assert datetime.fromisoformat(users[0]["created_at"])
+
+
+def test_msgpack_negotiation(admin_client):
+    msgpack = pytest.importorskip("msgpack")
+    client, headers = admin_client
+
+    res = client.get("/api/books/", headers={**headers, "Accept": "application/msgpack"})
+    assert res.mimetype == "application/msgpack"
+    assert msgpack.unpackb(res.data)[0]["price"] == 10.99
+    assert "Accept" in res.headers["Vary"]
+
+    res = client.get("/api/books/", headers={**headers, "Accept": "*/*"})
+    assert res.mimetype == "application/json"
@@ -0,0 +1,45 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def _upgrade(db_path, revision):
+    env = dict(os.environ, APP_ENV="dev", DATABASE_URL=f"sqlite:///{db_path}")
+    subprocess.run([sys.executable, "-m", "flask", "--app", "library_app", "db", "upgrade", revision],
+                   cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True)
+
+
+def test_lookup_migration_keeps_every_spelling(tmp_path):
+    db_path = tmp_path / "library.db"
+    _upgrade(db_path, "8d41b6e0c2a5")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("INSERT INTO users (id, name, email, password_hash) VALUES (1, 'A', 'a@test.com', 'x')")
+        conn.executemany(
+            "INSERT INTO books (id, title, author, genre, reading_status, user_id) VALUES (?, ?, ?, ?, ?, 1)",
+            [
+                (1, "Germinal", "Emile Zola", "Roman", "reading"),
+                (2, "Nana", "Émile Zola", "roman ", "Completed"),
+                (3, "L'Assommoir", "emile zola ", "Román", "lost"),
+                (4, "Untitled", "  ", None, None),
+            ],
+        )
+    _upgrade(db_path, "5e2b7c1d9a30")
+
+    with sqlite3.connect(db_path) as conn:
+        authors = dict(conn.execute("SELECT key, name FROM authors"))
+        genres = dict(conn.execute("SELECT key, name FROM genres"))
+        books = conn.execute(
+            "SELECT b.id, a.key, g.key, b.reading_status FROM books b "
+            "LEFT JOIN authors a ON a.id = b.author_id LEFT JOIN genres g ON g.id = b.genre_id ORDER BY b.id"
+        ).fetchall()
+    assert authors == {"emile zola": "Emile Zola", "émile zola": "Émile Zola"}
+    assert genres == {"roman": "Roman", "román": "Román"}
+    assert books == [
+        (1, "emile zola", "roman", 1),
+        (2, "émile zola", "roman", 2),
+        (3, "emile zola", "román", None),
+        (4, None, None, None),
+    ]
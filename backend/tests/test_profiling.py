@@ -0,0 +1,75 @@
+import pstats
+
+import pytest
+
+from profiling import parse_modes
+
+
+@pytest.fixture
+def profiler(app, tmp_path):
+    profiler = app.extensions["profiler"]
+    profiler.directory = str(tmp_path)
+    return profiler
+
+
+def test_parse_modes():
+    assert parse_modes("memory, CPU") == ("cpu", "memory")
+    assert parse_modes("1") == ("cpu",)
+    assert parse_modes("all") == ("cpu", "memory")
+    assert parse_modes("nonsense") == ()
+    assert parse_modes(None) == ()
+
+
+def test_admin_flag_profiles_request_and_serves_files(app, profiler, tokens, tmp_path):
+    _, admin = tokens
+    client = app.test_client()
+    res = client.get("/api/books/", headers={**admin, "X-Profile": "cpu,memory"})
+    profile_id = res.headers["X-Profile-Id"]
+
+    listing = client.get("/api/admin/profiles", headers=admin).get_json()
+    meta = listing["profiles"][0]
+    assert meta["id"] == profile_id
+    assert meta["endpoint"] == "books.list_books"
+    assert meta["modes"] == ["cpu", "memory"]
+    assert sorted(meta["files"]) == sorted(
+        profile_id + ext for ext in (".prof", ".cpu.txt", ".tracemalloc", ".mem.txt")
+    )
+
+    stats = pstats.Stats(str(tmp_path / f"{profile_id}.prof"))
+    assert any(func[2] == "list_books" for func in stats.stats)
+
+    download = client.get(f"/api/admin/profiles/{profile_id}.mem.txt", headers=admin)
+    assert download.status_code == 200
+    assert download.data.startswith(b"peak traced:")
+    assert client.get("/api/admin/profiles/../conftest.py", headers=admin).status_code == 404
+
+
+def test_flag_ignored_for_non_admins(app, profiler, tokens, tmp_path):
+    user, admin = tokens
+    client = app.test_client()
+    res = client.get("/api/books/?_profile=cpu", headers=user)
+    assert res.status_code == 200
+    assert "X-Profile-Id" not in res.headers
+    assert "X-Profile-Id" not in client.get("/api/books/?_profile=cpu").headers
+    assert list(tmp_path.iterdir()) == []
+
+    assert client.get("/api/admin/profiles", headers=user).status_code == 403
+
+
+def test_sampling_and_rotation(app, profiler, tokens, tmp_path):
+    user, admin = tokens
+    profiler.sample_endpoint = "books.list_books"
+    profiler.sample_every = 3
+    profiler.keep = 2
+    client = app.test_client()
+
+    sampled = [
+        "X-Profile-Id" in client.get("/api/books/", headers=user).headers
+        for _ in range(9)
+    ]
+    assert sampled == [True, False, False] * 3
+
+    profiles = client.get("/api/admin/profiles", headers=admin).get_json()["profiles"]
+    assert len(profiles) == 2
+    assert {p["requested_by"] for p in profiles} == {"sampling"}
+    assert len(list(tmp_path.iterdir())) == 2 * 3  # .json, .prof, .cpu.txt each
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from models import User
+from query_budget import QueryBudgetExceeded, query_budget, statement_shape
+
+
+@pytest.fixture
+def n_plus_one_app(app, regular_user_id, admin_user_id):
+    @app.get("/test/n-plus-one")
+    @query_budget(1)
+    def n_plus_one():
+        for user_id in (regular_user_id, admin_user_id, regular_user_id + 100):
+            User.query.filter_by(id=user_id).first()
+        return {"ok": True}
+
+    return app
+
+
+def test_statement_shape_collapses_in_lists():
+    assert statement_shape("SELECT a\n FROM t WHERE id IN (?, ?, ?)") == "SELECT a FROM t WHERE id IN (?)"
+
+
+def test_budget_overrun_raises_in_tests(n_plus_one_app):
+    with pytest.raises(QueryBudgetExceeded, match=r"ran 3 SQL statements \(budget 1\); repeated: 3x SELECT"):
+        n_plus_one_app.test_client().get("/test/n-plus-one")
+
+
+def test_budget_overrun_logged_in_log_mode(n_plus_one_app, caplog):
+    n_plus_one_app.config["QUERY_BUDGET_MODE"] = "log"
+    with caplog.at_level(logging.WARNING):
+        res = n_plus_one_app.test_client().get("/test/n-plus-one")
+
+    assert res.status_code == 200
+    assert "budget 1" in caplog.text
+    assert "FROM users" in caplog.text
+
+
+def test_per_shard_budget_scales_with_shards(app, regular_user_id, monkeypatch):
+    import query_budget as budgets
+
+    @app.get("/test/scatter")
+    @query_budget(1, per_shard=1)
+    def scatter_like():
+        for _ in range(4):  # the user, then one query on each of three shards
+            User.query.filter_by(id=regular_user_id).first()
+        return {"ok": True}
+
+    monkeypatch.setattr(budgets, "shard_count", lambda: 3)
+    assert app.test_client().get("/test/scatter").status_code == 200
+    monkeypatch.setattr(budgets, "shard_count", lambda: 2)
+    with pytest.raises(QueryBudgetExceeded, match=r"budget 3"):
+        app.test_client().get("/test/scatter")
+
+
+def test_ai_views_stay_within_budget(app, auth_headers, regular_user_id):
+    client = app.test_client()
+    headers = auth_headers(regular_user_id)
+    client.post("/api/books/", json={"title": "Dune", "genre": "Sci-Fi", "pages": 300}, headers=headers)
+
+    assert client.get("/api/ai/insights", headers=headers).status_code == 200
+    assert client.get("/api/ai/recommendations", headers=headers).status_code == 200
+    res = client.post("/api/ai/query", json={"question": "most popular book"}, headers=headers)
+    assert res.status_code == 200
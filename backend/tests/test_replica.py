@@ -0,0 +1,80 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+import db_routing
+from extensions import db
+from models import User, Book
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """Two SQLite files standing in for the primary and its replica."""
+    from library_app import create_app
+
+    app = create_app(
+        "dev",
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "REPLICA_DATABASE_URL": f"sqlite:///{tmp_path / 'replica.db'}",
+        },
+    )
+    with app.app_context():
+        replica = db.engines["replica"]
+        db.create_all()
+        db.metadata.create_all(replica)
+
+        # same user on both sides, as replication would leave it
+        for engine in (db.engine, replica):
+            with engine.begin() as conn:
+                conn.execute(
+                    User.__table__.insert(),
+                    {"id": 1, "name": "Reader", "email": "r@test.com",
+                     "password_hash": "x", "role": "user"},
+                )
+        with replica.begin() as conn:
+            conn.execute(Book.__table__.insert(), {"title": "Only on replica", "user_id": 1})
+
+        token = create_access_token(identity="1")
+    # requests push their own app context, so `g` doesn't outlive each one
+    yield app, {"Authorization": f"Bearer {token}"}
+    with app.app_context():
+        db.session.remove()
+        # init_app registered a metadata for the bind on the shared `db`;
+        # drop it so later apps without a replica can still create_all()
+        db.metadatas.pop("replica", None)
+
+
+def test_reads_go_to_replica(replica_app):
+    app, headers = replica_app
+    res = app.test_client().get("/api/books/", headers=headers)
+    assert [b["title"] for b in res.get_json()] == ["Only on replica"]
+
+
+def test_writer_reads_own_writes_from_primary(replica_app):
+    app, headers = replica_app
+    client = app.test_client()
+
+    res = client.post("/api/books/", json={"title": "Fresh"}, headers=headers)
+    assert res.status_code == 201
+
+    # replica has not caught up; the sticky window keeps this user on the primary
+    res = client.get("/api/books/", headers=headers)
+    assert [b["title"] for b in res.get_json()] == ["Fresh"]
+
+
+def test_stickiness_travels_with_the_client(replica_app):
+    app, headers = replica_app
+    res = app.test_client().post("/api/books/", json={"title": "Fresh"}, headers=headers)
+    cookie = res.headers["Set-Cookie"]
+    assert cookie.startswith(f"{db_routing.STICKY_COOKIE}=1:")
+
+    # no state is kept in the worker: a client without the cookie reads the replica
+    res = app.test_client().get("/api/books/", headers=headers)
+    assert [b["title"] for b in res.get_json()] == ["Only on replica"]
+
+    # and one carrying it reads the primary, whichever worker serves it
+    client = app.test_client()
+    client.set_cookie(db_routing.STICKY_COOKIE, cookie.split(";")[0].split("=", 1)[1])
+    res = client.get("/api/books/", headers=headers)
+    assert [b["title"] for b in res.get_json()] == ["Fresh"]
@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import event
+
+from cache import ResponseCache, bump_versions
+from extensions import db
+from models import Book
+
+
+@pytest.fixture
+def statements(app):
+    seen = []
+    with app.app_context():
+        engine = db.engine
+
+    def listener(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", listener)
+    yield seen
+    event.remove(engine, "before_cursor_execute", listener)
+
+
+def test_hit_skips_view_and_sql(app, tokens, statements):
+    user, _ = tokens
+    client = app.test_client()
+    client.post("/api/books/", json={"title": "Dune", "genre": "Sci-Fi"}, headers=user)
+
+    first = client.get("/api/books/?genre=Sci-Fi&status=", headers=user)
+    assert first.headers["X-Cache"] == "MISS"
+
+    statements.clear()
+    second = client.get("/api/books/?status=&genre=Sci-Fi", headers=user)
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == first.get_json()
+    assert len(statements) == 1 and "FROM cache_versions" in statements[0]  # only the version check
+
+
+def test_writes_invalidate_and_users_do_not_share(app, tokens):
+    user, admin = tokens
+    client = app.test_client()
+    client.get("/api/ai/insights", headers=user)
+    assert client.get("/api/books/", headers=user).get_json() == []
+    assert client.get("/api/books/", headers=admin).headers["X-Cache"] == "MISS"
+
+    client.post("/api/books/", json={"title": "Emma"}, headers=user)
+
+    res = client.get("/api/books/", headers=user)
+    assert res.headers["X-Cache"] == "MISS"
+    assert [b["title"] for b in res.get_json()] == ["Emma"]
+    assert client.get("/api/ai/insights", headers=user).get_json()["total_books"] == 1
+
+
+def test_versions_are_shared_between_workers(app, tokens, regular_user_id):
+    user, _ = tokens
+    client = app.test_client()
+    assert client.get("/api/books/", headers=user).headers["X-Cache"] == "MISS"
+    assert client.get("/api/books/", headers=user).headers["X-Cache"] == "HIT"
+
+    # what another worker's commit leaves behind: a bumped row in cache_versions
+    with app.app_context():
+        bump_versions([regular_user_id])
+    assert client.get("/api/books/", headers=user).headers["X-Cache"] == "MISS"
+
+
+def test_versions_are_scoped_by_owner_and_bumped_once_per_request(app, tokens, admin_user_id, statements):
+    user, admin = tokens
+
+    @app.post("/test/two-writes")
+    def two_writes():
+        for title in ("One", "Two"):
+            db.session.add(Book(title=title, user_id=admin_user_id))
+            db.session.commit()
+        return {"ok": True}
+
+    client = app.test_client()
+    for headers in tokens:
+        assert client.get("/api/books/", headers=headers).headers["X-Cache"] == "MISS"
+
+    statements.clear()
+    client.post("/test/two-writes")
+    assert len([s for s in statements if s.startswith("UPDATE cache_versions")]) == 1
+
+    # the admin's own books: the user's listing stays cached, the admin's doesn't
+    assert client.get("/api/books/", headers=user).headers["X-Cache"] == "HIT"
+    assert client.get("/api/books/", headers=admin).headers["X-Cache"] == "MISS"
+
+
+def test_errors_are_not_cached(app, tokens):
+    user, _ = tokens
+    client = app.test_client()
+    for _ in range(2):
+        res = client.get("/api/admin/books", headers=user)
+        assert res.status_code == 400
+        assert res.headers["X-Cache"] == "MISS"
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(max_entries=2, max_bytes=10)
+    cache.put("a", (1,), 60, (b"aaaa", "application/json", None))
+    cache.put("b", (1,), 60, (b"bbbb", "application/json", None))
+    assert cache.get("a", (1,)) is not None  # "b" is now least recently used
+
+    cache.put("c", (1,), 60, (b"cccc", "application/json", None))
+    assert cache.get("b", (1,)) is None
+    assert len(cache) == 2
+
+    cache.put("d", (1,), 60, (b"dddddddd", "application/json", None))
+    assert len(cache) == 1  # over the byte budget: only the newest fits
+    assert cache.get("d", (2,)) is None  # stale versions are dropped on read
+    assert len(cache) == 0
@@ -0,0 +1,26 @@
+from models import User, Book, BookChange, Genre
+from seed import GENRES, seed_library
+
+
+def test_seed_library_bulk_inserts(app):
+    with app.app_context():
+        counts = seed_library(users=30, books=400, batch_size=64)
+
+        assert counts == {"users": 30, "books": 400}
+        assert User.query.count() == 30
+        assert Book.query.count() == 400
+        assert User.query.filter_by(role="admin").count() == 1
+        assert {b.reading_status for b in Book.query} <= {"planned", "reading", "completed"}
+        # names are stored once, in the lookup tables
+        assert 0 < Genre.query.count() <= len(GENRES)
+        assert {b.genre for b in Book.query} - {None} <= set(GENRES)
+        assert Book.query.filter(Book.author_id.isnot(None)).count() == 400
+
+
+def test_seed_library_can_run_twice(app):
+    with app.app_context():
+        seed_library(users=5, books=10)
+        seed_library(users=5, books=10, seed=1)
+        assert User.query.count() == 10
+        # each seeded book is logged once, as created
+        assert sorted(c.book_id for c in BookChange.query) == sorted(b.id for b in Book.query)
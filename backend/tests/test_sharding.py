@@ -0,0 +1,184 @@
+import sqlite3
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from extensions import db
+from models import Book
+from services.auth_service import register_user
+from sharding import ShardRoutingError, create_shard_tables
+
+SHARDS = 3
+
+
+@pytest.fixture
+def sharded(tmp_path):
+    from library_app import create_app
+
+    shard_files = [tmp_path / f"books_{i}.db" for i in range(SHARDS)]
+    app = create_app(
+        "dev",
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "BOOK_SHARD_URLS": [f"sqlite:///{path}" for path in shard_files],
+        },
+    )
+    with app.app_context():
+        db.create_all()
+        create_shard_tables()
+        admin = register_user("Admin", "admin@test.com", "Admin123!@#")
+        admin.role = "admin"
+        users = [register_user(f"Reader {i}", f"r{i}@test.com", "User123!@#") for i in range(3)]
+        db.session.commit()
+        ids = [u.id for u in users]
+        headers = {
+            uid: {"Authorization": f"Bearer {create_access_token(identity=str(uid))}"}
+            for uid in [admin.id] + ids
+        }
+        yield app, admin.id, ids, headers, shard_files
+        db.session.remove()
+        # like the replica test: later apps without these binds must still create_all()
+        for i in range(SHARDS):
+            db.metadatas.pop(f"books_{i}", None)
+
+
+def _shard_rows(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT id, user_id FROM books").fetchall()
+
+
+def test_books_live_on_their_owners_shard(sharded):
+    app, _, users, headers, shard_files = sharded
+    client = app.test_client()
+    for uid in users:
+        for title in ("Dune", f"Own {uid}"):
+            assert client.post("/api/books/", json={"title": title}, headers=headers[uid]).status_code == 201
+
+    for index, path in enumerate(shard_files):
+        rows = _shard_rows(path)
+        assert rows and all(uid % SHARDS == index and bid % SHARDS == index for bid, uid in rows)
+    with app.app_context():
+        assert db.session.execute(db.text("SELECT COUNT(*) FROM books")).scalar() == 0  # primary
+
+    uid = users[0]
+    mine = client.get("/api/books/", headers=headers[uid]).get_json()
+    assert sorted(b["title"] for b in mine) == ["Dune", f"Own {uid}"]
+
+    book_id = mine[0]["id"]
+    res = client.put(f"/api/books/{book_id}", json={"reading_status": "completed"}, headers=headers[uid])
+    assert res.get_json()["reading_status"] == "completed"
+    assert client.delete(f"/api/books/{book_id}", headers=headers[uid]).status_code == 200
+    assert len(client.get("/api/books/", headers=headers[uid]).get_json()) == 1
+
+
+def test_queued_creates_are_batched_per_shard(sharded):
+    app, _, users, headers, shard_files = sharded
+    writer = app.extensions["book_writer"]
+    writer.batch_size = 6
+    writer.max_delay = 10
+    client = app.test_client()
+    tickets = [
+        client.post("/api/books/?async=1", json={"title": f"T{n}"}, headers=headers[uid]).get_json()["ticket"]
+        for uid in users for n in range(2)
+    ]
+    assert writer.wait(timeout=5)
+
+    statuses = [client.get(f"/api/books/tickets/{t}", headers=headers[users[0]]) for t in tickets[:2]]
+    assert all(r.get_json()["status"] == "created" for r in statuses)
+    for index, path in enumerate(shard_files):
+        rows = _shard_rows(path)
+        assert len(rows) == 2 and all(bid % SHARDS == index for bid, _ in rows)
+
+
+def test_admin_and_ai_reads_merge_all_shards(sharded):
+    app, admin, users, headers, _ = sharded
+    client = app.test_client()
+    prices = {users[0]: [5, 50, 7], users[1]: [40, 1], users[2]: [30, 20, 10, 60]}
+    for uid, values in prices.items():
+        for n, price in enumerate(values):
+            title = "Dune" if n == 0 else f"Book {uid}-{n}"
+            client.post("/api/books/", json={"title": title, "price": price, "genre": "Sci-Fi"},
+                        headers=headers[uid])
+
+    listing = client.get("/api/admin/books", headers=headers[admin]).get_json()
+    assert len(listing) == 9
+    page = client.get("/api/books/?facets=genre&limit=4&offset=2", headers=headers[admin]).get_json()
+    assert page["total"] == 9 and page["facets"]["genre"] == [{"value": "Sci-Fi", "count": 9}]
+    newest = client.get("/api/books/", headers=headers[admin]).get_json()
+    assert [b["id"] for b in page["items"]] == [b["id"] for b in newest[2:6]]
+    summary = client.get("/api/admin/summary", headers=headers[admin]).get_json()
+    assert summary["books"]["total"] == 9 and summary["books"]["by_genre"] == {"Sci-Fi": 9}
+    counts = {u["id"]: u["book_count"] for u in client.get("/api/admin/users", headers=headers[admin]).get_json()}
+    assert counts == {admin: 0, users[0]: 3, users[1]: 2, users[2]: 4}
+
+    def ask(question, uid=admin):
+        return client.post("/api/ai/query", json={"question": question}, headers=headers[uid]).get_json()
+
+    assert ask("Who owns the most books?")["user"]["id"] == users[2]
+    assert ask("Who owns the most books?", users[1])["book_count"] == 2
+    popular = ask("Which is the most popular book?")
+    assert (popular["title"], popular["count"]) == ("Dune", 3)  # one copy on each shard
+    suggested = client.get("/api/books/suggest?field=title&prefix=d", headers=headers[admin]).get_json()
+    assert suggested["suggestions"] == [{"value": "Dune", "count": 3}]
+    suggested = client.get("/api/books/suggest?field=title&prefix=d", headers=headers[users[1]]).get_json()
+    assert suggested["suggestions"] == [{"value": "Dune", "count": 1}]
+    expensive = ask("Show the five most expensive books")["books"]
+    assert [float(b["price"]) for b in expensive] == [60, 50, 40, 30, 20]
+
+    recommended = client.get("/api/ai/recommendations", headers=headers[users[1]]).get_json()
+    assert recommended["books"] and all(b["id"] % SHARDS != users[1] % SHARDS for b in recommended["books"])
+    insights = client.get("/api/ai/insights", headers=headers[users[2]]).get_json()
+    assert insights["total_books"] == 4 and insights["most_popular_genre_overall"] == "Sci-Fi"
+
+
+def test_admin_deletes_span_shards(sharded):
+    app, admin, users, headers, shard_files = sharded
+    client = app.test_client()
+    ids = [
+        client.post("/api/books/", json={"title": "T"}, headers=headers[uid]).get_json()["id"]
+        for uid in users
+    ]
+
+    res = client.post("/api/admin/books/bulk-delete", json={"ids": ids[:2] + [999]}, headers=headers[admin])
+    assert [r["status"] for r in res.get_json()["results"]] == ["deleted", "deleted", "not_found"]
+
+    assert client.delete(f"/api/admin/users/{users[2]}", headers=headers[admin]).status_code == 200
+    assert all(_shard_rows(path) == [] for path in shard_files)
+
+
+def test_change_log_cursor_has_a_seq_per_shard(sharded):
+    app, admin, users, headers, _ = sharded
+    client = app.test_client()
+    for uid in users:
+        client.post("/api/books/", json={"title": f"T{uid}"}, headers=headers[uid])
+
+    everything = client.get("/api/books/changes", headers=headers[admin]).get_json()
+    assert everything["seq"] == "1.1.1" and len(everything["books"]) == 3
+
+    book_id = client.get("/api/books/", headers=headers[users[1]]).get_json()[0]["id"]
+    client.delete(f"/api/books/{book_id}", headers=headers[users[1]])
+    since = client.get(f"/api/books/changes?since={everything['seq']}", headers=headers[admin]).get_json()
+    assert since["deleted"] == [book_id] and since["seq"] != everything["seq"]
+
+    own = client.get("/api/books/changes?since=1", headers=headers[users[1]]).get_json()
+    assert own["deleted"] == [book_id] and own["seq"] == 2
+    assert client.get("/api/books/changes?since=1", headers=headers[admin]).status_code == 400
+
+
+def test_unrouted_book_query_fails_loudly(sharded):
+    app = sharded[0]
+    with app.app_context():
+        with pytest.raises(ShardRoutingError):
+            Book.query.all()
+
+
+def test_non_mysql_shards_are_refused_outside_tests(tmp_path):
+    from library_app import create_app
+
+    with pytest.raises(RuntimeError, match="must be MySQL"):
+        create_app("dev", {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+            "BOOK_SHARD_URLS": [f"sqlite:///{tmp_path / 'books_0.db'}"],
+        })
+    db.metadatas.pop("books_0", None)
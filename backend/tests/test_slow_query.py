@@ -0,0 +1,54 @@
+from extensions import db
+from models import Book
+from slow_query import SlowQueryLog
+
+
+def test_every_statement_over_a_zero_threshold_is_logged_with_plan(app, tokens, regular_user_id):
+    user, admin = tokens
+    with app.app_context():
+        db.session.add(Book(title="Secret Title", genre="Fantasy", user_id=regular_user_id))
+        db.session.commit()
+    log = app.extensions["slow_query_log"]
+    log.threshold_ms = 0
+    log.reset()
+
+    client = app.test_client()
+    client.get("/api/books/?genre=Fantasy", headers=user)
+    res = client.get("/api/admin/slow-queries", headers=admin)
+    shapes = res.get_json()["shapes"]
+
+    totals = [s["total_ms"] for s in shapes]
+    assert totals == sorted(totals, reverse=True)
+
+    book_select = next(s for s in shapes if "FROM books" in s["shape"])
+    slowest = book_select["slowest"]
+    assert slowest["endpoint"] == "books.list_books"
+    assert slowest["route"] == "/api/books/"
+    assert slowest["service"] == "services.book_service.list_books_for_user"
+    assert any("books" in " ".join(row) for row in slowest["explain"])
+    assert "Secret" not in str(shapes)  # parameters are only ever hashed
+
+    assert client.delete("/api/admin/slow-queries", headers=admin).status_code == 200
+    shapes = client.get("/api/admin/slow-queries", headers=admin).get_json()["shapes"]
+    assert [(s["count"], "FROM users" in s["shape"]) for s in shapes] == [(1, True)]
+
+
+def test_fast_statements_are_not_logged_and_non_admins_refused(app, tokens):
+    user, admin = tokens
+    client = app.test_client()
+    client.get("/api/books/", headers=user)
+
+    assert client.get("/api/admin/slow-queries", headers=user).status_code == 403
+    assert client.get("/api/admin/slow-queries", headers=admin).get_json()["shapes"] == []
+
+
+def test_keeps_the_costliest_shapes():
+    log = SlowQueryLog(threshold_ms=0, max_shapes=2)
+    log.record("SELECT 1", (), 50.0)
+    log.record("SELECT 2", (), 10.0)
+    log.record("SELECT 1", (), 30.0)
+    log.record("SELECT 3", (), 20.0)  # evicts SELECT 2, the cheapest
+
+    top = log.top()
+    assert [s["shape"] for s in top] == ["SELECT 1", "SELECT 3"]
+    assert top[0]["count"] == 2 and top[0]["max_ms"] == 50.0 and top[0]["mean_ms"] == 40.0
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from config import config_name_from_env
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def test_config_chosen_from_app_env(monkeypatch):
+    monkeypatch.delenv("APP_ENV", raising=False)
+    assert config_name_from_env() == "prod"
+    monkeypatch.setenv("APP_ENV", "dev")
+    assert config_name_from_env() == "dev"
+    monkeypatch.setenv("APP_ENV", "staging")
+    with pytest.raises(ValueError):
+        config_name_from_env()
+
+
+def test_worker_boot_skips_cli_only_imports(tmp_path):
+    """Importing the module builds no app, and create_app() never loads alembic."""
+    code = (
+        "import sys, library_app\n"
+        "assert not hasattr(library_app, 'app')\n"
+        "app = library_app.create_app()\n"
+        "assert not app.debug\n"
+        "print(sorted(m for m in ('alembic', 'flask_migrate') if m in sys.modules))\n"
+    )
+    env = dict(os.environ, APP_ENV="prod", DATABASE_URL=f"sqlite:///{tmp_path / 'boot.db'}")
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         check=True, capture_output=True, text=True).stdout
+    assert out.strip() == "[]"
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from extensions import db
+from models import User
+from seed import seed_library
+from benchmarks.loadtest import WSGITarget, _login
+from benchmarks.replay import Replayer, load_recording, synthesize
+
+
+@pytest.fixture
+def recording_app(tmp_path):
+    from library_app import create_app
+
+    log = tmp_path / "traffic.jsonl"
+    app = create_app(
+        "dev",
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'library.db'}",
+            "TRAFFIC_RECORD_PATH": str(log),
+            "TRAFFIC_SAMPLE_RATE": 1.0,
+        },
+    )
+    with app.app_context():
+        db.create_all()
+        seed_library(users=3, books=30)
+        users = [tuple(r) for r in db.session.query(User.id, User.email, User.role)]
+        yield app, log, users
+        db.session.remove()
+
+
+def test_recorder_keeps_shapes_not_content(recording_app):
+    app, log, users = recording_app
+    target = WSGITarget(app)
+    token = _login(target, users[1][1])
+    target.request("POST", "/api/books/", {"title": "Secret Diary", "price": 9.5,
+                                           "reading_status": "reading"}, token=token)
+    target.request("POST", "/api/ai/query", {"question": "Who owns the most books?"}, token=token)
+    target.request("GET", "/api/books/?genre=Fantasy&q=private", token=token)
+
+    text = log.read_text()
+    assert "Secret" not in text and "Seed123" not in text and users[1][1] not in text
+
+    login, create, query, listing = load_recording(str(log))
+    assert login["r"] == "/api/auth/login" and login["u"] is None
+    assert login["b"] == {"email": f"str:{len(users[1][1])}", "password": "str:10"}
+    assert create["b"] == {"title": "str:12", "price": "float", "reading_status": "reading"}
+    assert create["s"] == 201 and create["ms"] > 0
+    assert query["b"] == {"question": "intent:owner_with_most_books"}
+    assert listing["q"] == {"genre": "str:7", "q": "str:7"}
+    # same user, same pseudonym, and not the raw id
+    assert create["u"] == query["u"] == listing["u"] != str(users[1][0])
+
+
+def test_replay_reissues_recorded_requests(recording_app):
+    app, log, users = recording_app
+    target = WSGITarget(app)
+    token = _login(target, users[1][1])
+    book = json.loads(target.request("POST", "/api/books/", {"title": "Dune"}, token=token)[1])
+    target.request("PUT", f"/api/books/{book['id']}", {"pages": 412}, token=token)
+    target.request("GET", "/api/ai/insights", token=token)
+
+    replayer = Replayer(target, load_recording(str(log)), users)
+    replayer.prepare()
+    samples = replayer.run(speed=0, concurrency=2)
+
+    assert set(samples) == {"POST /api/auth/login", "POST /api/books/",
+                            "PUT /api/books/<int:book_id>", "GET /api/ai/insights"}
+    assert all(ok for rows in samples.values() for _, ok in rows)
+
+
+def test_synthesize_inverts_shapes():
+    import random
+    rng = random.Random(0)
+    body = synthesize({"title": "str:5", "ids": "list:int:3", "role": "admin",
+                       "question": "intent:most_popular_book"}, rng)
+    assert len(body["title"]) == 5 and len(body["ids"]) == 3 and body["role"] == "admin"
+    assert body["question"] == "Which is the most popular book?"
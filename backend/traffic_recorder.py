@@ -0,0 +1,151 @@
+# traffic_recorder.py
+"""
+Opt-in recorder of real request traffic for replay benchmarks.
+
+When TRAFFIC_RECORD_PATH is set, a TRAFFIC_SAMPLE_RATE fraction of API
+requests is appended to that file as one compact JSON line each:
+
+    {"t":1760000000.123,"m":"POST","r":"/api/books/","q":{},"b":{"title":"str:9"},
+     "u":"3fa2c1d09e7b","s":201,"ms":12.41}
+
+Nothing identifying is kept: the path is the route template, free-text query
+values and JSON bodies are reduced to their shape (types and lengths), and
+user ids become keyed hashes, so one user maps to the same pseudonym
+throughout a recording without revealing who it was. benchmarks/replay.py
+turns the shapes back into requests against a seeded instance.
+
+Each line is a single O_APPEND write, so several gunicorn workers can share
+one file.
+"""
+import hashlib
+import hmac
+import json
+import os
+import random
+import threading
+import time
+
+from flask import g, request
+
+from services.ai_service import parse_intent
+
+# Values recorded verbatim: closed vocabularies and numbers, not user content.
+SAFE_QUERY_KEYS = {"status", "limit", "deep"}
+SAFE_BODY_KEYS = {"reading_status", "role"}
+
+SKIPPED_ENDPOINTS = {"prometheus_metrics"}
+
+
+def value_shape(value):
+    """Type-and-size stand-in for a JSON value, e.g. "str:12" or "list:int:3"."""
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, int):
+        return "int"
+    if isinstance(value, float):
+        return "float"
+    if isinstance(value, str):
+        return f"str:{len(value)}"
+    if isinstance(value, list):
+        item = value_shape(value[0]) if value else "null"
+        return f"list:{item.split(':')[0]}:{len(value)}"
+    if isinstance(value, dict):
+        return body_shape(value)
+    return type(value).__name__
+
+
+def body_shape(data):
+    if not isinstance(data, dict):
+        return None if data is None else value_shape(data)
+    shape = {}
+    for key, value in data.items():
+        if key in SAFE_BODY_KEYS and isinstance(value, str):
+            shape[key] = value
+        elif key == "question" and isinstance(value, str):
+            # the intent decides which query runs; the wording is the user's
+            intent = parse_intent(value)
+            shape[key] = f"intent:{intent}" if intent else value_shape(value)
+        else:
+            shape[key] = value_shape(value)
+    return shape
+
+
+def query_shape(args):
+    return {
+        key: value if key in SAFE_QUERY_KEYS else value_shape(value)
+        for key, value in args.items()
+    }
+
+
+class TrafficRecorder:
+    def __init__(self, path: str, sample_rate: float, secret: str):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._secret = secret.encode()
+        self._lock = threading.Lock()
+        self._fd = None
+
+    def pseudonym(self, user_id) -> str:
+        return hmac.new(self._secret, str(user_id).encode(), hashlib.sha256).hexdigest()[:12]
+
+    def write(self, entry: dict) -> None:
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            os.write(self._fd, line)
+
+    # ------------------------------------------------------------------
+    # Request hooks
+    # ------------------------------------------------------------------
+
+    def before_request(self):
+        if request.method != "OPTIONS" and random.random() < self.sample_rate:
+            g.traffic_record = (time.time(), time.perf_counter())
+
+    def after_request(self, response):
+        started = g.pop("traffic_record", None)
+        if started is None or request.url_rule is None:
+            return response
+        if request.endpoint and request.endpoint.rsplit(".", 1)[-1] in SKIPPED_ENDPOINTS:
+            return response
+
+        wall, perf = started
+        try:
+            self.write({
+                "t": round(wall, 3),
+                "m": request.method,
+                "r": request.url_rule.rule,
+                "q": query_shape(request.args),
+                "b": body_shape(request.get_json(silent=True)) if request.is_json else None,
+                "u": self._current_user(),
+                "s": response.status_code,
+                "ms": round((time.perf_counter() - perf) * 1000, 2),
+            })
+        except OSError:
+            pass  # recording must never fail the request
+        return response
+
+    def _current_user(self):
+        # only present when the view verified a JWT; never decodes one itself
+        jwt_data = g.get("_jwt_extended_jwt")
+        if not jwt_data or "sub" not in jwt_data:
+            return None
+        return self.pseudonym(jwt_data["sub"])
+
+
+def init_app(app) -> None:
+    path = app.config.get("TRAFFIC_RECORD_PATH")
+    if not path:
+        return
+
+    recorder = TrafficRecorder(
+        path,
+        float(app.config.get("TRAFFIC_SAMPLE_RATE", 0.1)),
+        app.config.get("SECRET_KEY") or "",
+    )
+    app.extensions["traffic_recorder"] = recorder
+    app.before_request(recorder.before_request)
+    app.after_request(recorder.after_request)